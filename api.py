@@ -0,0 +1,168 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# 읽기 전용 명단 HTTP API (방송 오버레이 / 관리자 도구용 — Discord 에 요청을 보내지 않음)
+#   GET /guilds                         서버 목록과 현재 ETag
+#   GET /guilds/{gid}/roster            JSON (참가자/대기자/판수/닉네임/티어)
+#   GET /guilds/{gid}/roster.txt        상태 메시지와 같은 텍스트
+#   GET /guilds/{gid}/events            SSE — 바뀔 때마다 JSON 한 건 (Last-Event-ID 지원)
+#  - ETag 는 명단 버전에서 만듦 → If-None-Match 가 같으면 304
+#  - ?wait=N (최대 max_wait 초): 같은 버전이면 바뀔 때까지 기다렸다가 응답 (long-poll), 끝까지 안 바뀌면 304
+#  - token 이 있으면 Authorization: Bearer <token> 또는 ?token= 필요
+# ────────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import json
+import logging
+import time
+
+
+def _dumps(v):
+    return json.dumps(v, ensure_ascii=False)
+
+
+def _matches(header, etag):
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+class RosterAPI:
+    def __init__(self, view, guilds, token=None, min_interval=0.5, heartbeat=15.0, max_wait=60.0):
+        # view(gid) → (etag, dict, text) 또는 None / guilds() → gid 목록
+        self.view = view
+        self.guilds = guilds
+        self.token = token
+        self.min_interval = min_interval    # SSE 로 보내는 최소 간격 (몰려오는 변경은 묶음)
+        self.heartbeat = heartbeat
+        self.max_wait = max_wait
+        self._events = {}                   # gid → asyncio.Event (바뀌면 set 하고 버림)
+        self._closing = False
+        self.stats = {"requests": 0, "not_modified": 0, "long_polls": 0, "sse_clients": 0, "sse_sent": 0}
+
+    # ─── 변경 알림 ────────────────────────────────────────────────────────
+    def changed(self, gid=None):
+        # gid 가 None 이면 전부 (닉네임 변경 등)
+        if gid is None:
+            events, self._events = list(self._events.values()), {}
+        else:
+            ev = self._events.pop(gid, None)
+            events = [ev] if ev is not None else []
+        for ev in events:
+            ev.set()
+
+    async def _wait(self, gid, timeout):
+        ev = self._events.get(gid)
+        if ev is None:
+            ev = self._events[gid] = asyncio.Event()
+        try:
+            await asyncio.wait_for(ev.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    # ─── 핸들러 ───────────────────────────────────────────────────────────
+    def _check(self, request):
+        from aiohttp import web
+
+        self.stats["requests"] += 1
+        if self.token and request.headers.get("Authorization") != f"Bearer {self.token}" \
+                and request.query.get("token") != self.token:
+            raise web.HTTPUnauthorized()
+
+    async def list_guilds(self, request):
+        from aiohttp import web
+
+        self._check(request)
+        out = []
+        for gid in self.guilds():
+            v = self.view(gid)
+            if v is not None:
+                out.append({"guild_id": gid, "etag": v[0]})
+        return web.json_response(out, dumps=_dumps)
+
+    async def roster(self, request):
+        from aiohttp import web
+
+        self._check(request)
+        gid = request.match_info["gid"]
+        as_text = request.path.endswith(".txt")
+        v = self.view(gid)
+        if v is None:
+            raise web.HTTPNotFound()
+        since = request.headers.get("If-None-Match") or request.query.get("since")
+        try:
+            wait = min(float(request.query.get("wait", 0)), self.max_wait)
+        except ValueError:
+            raise web.HTTPBadRequest(text="wait 는 초 단위 숫자")
+        if wait > 0 and _matches(since, v[0]):
+            self.stats["long_polls"] += 1
+            end = time.monotonic() + wait
+            while _matches(since, v[0]) and time.monotonic() < end and not self._closing:
+                await self._wait(gid, end - time.monotonic())
+                v = self.view(gid)
+                if v is None:
+                    raise web.HTTPNotFound()
+        etag, body, text = v
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _matches(since, etag):
+            self.stats["not_modified"] += 1
+            return web.Response(status=304, headers=headers)
+        if as_text:
+            return web.Response(text=text, content_type="text/plain", charset="utf-8", headers=headers)
+        return web.json_response(body, headers=headers, dumps=_dumps)
+
+    async def events(self, request):
+        from aiohttp import web
+
+        self._check(request)
+        gid = request.match_info["gid"]
+        if self.view(gid) is None:
+            raise web.HTTPNotFound()
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache",
+                                           "X-Accel-Buffering": "no"})
+        await resp.prepare(request)
+        last = request.headers.get("Last-Event-ID") or request.query.get("since")
+        self.stats["sse_clients"] += 1
+        try:
+            while not self._closing:
+                v = self.view(gid)
+                if v is None:
+                    await resp.write(b"event: gone\ndata: {}\n\n")
+                    break
+                etag, body, _ = v
+                if etag != last:
+                    await resp.write(f"id: {etag}\nevent: roster\ndata: {_dumps(body)}\n\n".encode())
+                    self.stats["sse_sent"] += 1
+                    last = etag
+                    await asyncio.sleep(self.min_interval)
+                    continue
+                if not await self._wait(gid, self.heartbeat):
+                    await resp.write(b": ping\n\n")
+        except ConnectionResetError:
+            pass
+        finally:
+            self.stats["sse_clients"] -= 1
+        return resp
+
+    # ─── 서버 ─────────────────────────────────────────────────────────────
+    async def _shutdown(self, app):
+        # 끝날 때 기다리는 요청/SSE 를 깨워서 스스로 끝나게 (안 그러면 cleanup 이 끝없이 기다림)
+        self._closing = True
+        self.changed()
+
+    async def serve(self, host="127.0.0.1", port=8787):
+        from aiohttp import web
+
+        self._closing = False
+        app = web.Application()
+        app.on_shutdown.append(self._shutdown)
+        app.router.add_get("/guilds", self.list_guilds)
+        app.router.add_get("/guilds/{gid}/roster", self.roster)
+        app.router.add_get("/guilds/{gid}/roster.txt", self.roster)
+        app.router.add_get("/guilds/{gid}/events", self.events)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        logging.getLogger(__name__).info("명단 API: http://%s:%s/guilds", host, port)
+        return runner
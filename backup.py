@@ -0,0 +1,137 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# 명단 백업
+#  - 내용 해시가 바뀌었을 때만 backups/backup_<gid>.txt 에 추가
+#  - 크기 / 날짜가 넘어가면 .gz 로 묶어서 돌리고, 서버별로 BACKUP_KEEP 개만 보관
+#  - history(): 첫 스냅샷 + 이후 변경분(diff)만 모은 짧은 기록 (!백업기록)
+# ────────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import difflib
+import glob
+import gzip
+import hashlib
+import os
+import re
+import shutil
+from datetime import datetime
+
+HEADER = "====== {} ======"
+HEADER_RE = re.compile(r"^====== (.+) ======$")
+
+
+def _hash(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _blocks(raw):
+    # 백업 파일 내용 → [(시각, 텍스트), ...]
+    out = []
+    ts, lines = None, []
+    for line in raw.splitlines():
+        m = HEADER_RE.match(line)
+        if m:
+            if ts is not None:
+                out.append((ts, "\n".join(lines).strip("\n")))
+            ts, lines = m.group(1), []
+        elif ts is not None:
+            lines.append(line)
+    if ts is not None:
+        out.append((ts, "\n".join(lines).strip("\n")))
+    return out
+
+
+class BackupWriter:
+    def __init__(self, directory, max_bytes=1 << 20, keep=14):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self._last = {}    # gid -> 마지막으로 쓴 텍스트 해시
+        self.stats = {"written": 0, "skipped": 0, "rotated": 0, "bytes": 0}
+
+    def path(self, gid):
+        return os.path.join(self.directory, f"backup_{gid}.txt")
+
+    def archives(self, gid):
+        return sorted(glob.glob(os.path.join(self.directory, f"backup_{gid}.*.txt.gz")))
+
+    # ─── 쓰기 ─────────────────────────────────────────────────────────────
+    async def snapshot(self, gid, text, force=False):
+        gid = str(gid)
+        if gid not in self._last:
+            self._last[gid] = await asyncio.to_thread(self._seed, gid)
+        h = _hash(text.strip("\n"))
+        if not force and self._last[gid] == h:
+            self.stats["skipped"] += 1
+            return False
+        self._last[gid] = h
+        await asyncio.to_thread(self._write, gid, text)
+        return True
+
+    def _seed(self, gid):
+        # 재시작 직후 같은 내용을 또 쓰지 않도록 파일 마지막 스냅샷 해시로 시작
+        try:
+            with open(self.path(gid), "r", encoding="utf-8") as f:
+                blocks = _blocks(f.read())
+        except FileNotFoundError:
+            return None
+        return _hash(blocks[-1][1]) if blocks else None
+
+    def _write(self, gid, text):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(gid)
+        self._rotate_if_needed(gid, path)
+        block = f"\n{HEADER.format(f'{datetime.now():%Y-%m-%d %H:%M:%S}')}\n{text}\n"
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(block)
+        self.stats["written"] += 1
+        self.stats["bytes"] += len(block.encode("utf-8"))
+
+    def _rotate_if_needed(self, gid, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return
+        day = datetime.fromtimestamp(st.st_mtime).date()
+        if st.st_size < self.max_bytes and day == datetime.now().date():
+            return
+        stamp = f"{datetime.now():%Y%m%d-%H%M%S}"
+        dest = os.path.join(self.directory, f"backup_{gid}.{stamp}.txt.gz")
+        n = 1
+        while os.path.exists(dest):
+            dest = os.path.join(self.directory, f"backup_{gid}.{stamp}_{n}.txt.gz")
+            n += 1
+        with open(path, "rb") as src, gzip.open(dest, "wb") as out:
+            shutil.copyfileobj(src, out)
+        os.remove(path)
+        self.stats["rotated"] += 1
+        for old in self.archives(gid)[:-self.keep]:
+            os.remove(old)
+
+    # ─── 기록 ─────────────────────────────────────────────────────────────
+    def _read_all(self, gid):
+        raw = []
+        for arc in self.archives(gid):
+            with gzip.open(arc, "rt", encoding="utf-8") as f:
+                raw.append(f.read())
+        try:
+            with open(self.path(gid), "r", encoding="utf-8") as f:
+                raw.append(f.read())
+        except FileNotFoundError:
+            pass
+        return _blocks("\n".join(raw))
+
+    def history(self, gid, limit=200):
+        # 첫 스냅샷은 전체, 이후는 바뀐 줄만 (+ 추가 / - 삭제)
+        blocks = self._read_all(str(gid))[-limit:]
+        if not blocks:
+            return None
+        ts, prev = blocks[0]
+        out = [HEADER.format(ts), prev]
+        for ts, text in blocks[1:]:
+            diff = [l for l in difflib.unified_diff(prev.splitlines(), text.splitlines(), lineterm="", n=0)
+                    if l[:1] in "+-" and not l.startswith(("+++", "---"))]
+            if diff:
+                out.append(HEADER.format(ts))
+                out.extend(diff)
+            prev = text
+        return "\n".join(out) + "\n"
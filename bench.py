@@ -0,0 +1,424 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# 오프라인 부하 테스트 / 벤치마크 (가짜 게이트웨이)
+#
+#   python bench.py                          # 500개 반응 버스트
+#   python bench.py --events 2000 --users 800 --latency 0.05 --unregistered 0.1
+#   python bench.py --json > bench_output.txt
+#   python bench.py --scenario sharded --workers 2 --guilds 8
+#   python bench.py --scenario startup --guilds 4 --members 20000 --users 300
+#   python bench.py --scenario render
+#
+# on_raw_reaction_add → 반응 큐 → 명단 반영 → update_status 전 과정을 실제 코드로 돌리고
+#  events/sec, 참가→상태메시지 반영 p50/p99, 이벤트당 REST 호출 수, 디스크 기록 바이트를 보고
+# sharded: 프로세스 N 개가 샤드를 나눠 같은 SQLite 파일을 쓰고, 끝나고 나서 전체 상태를 검증
+# startup: 멤버 전체 받기(기본) vs LAZY_MEMBERS=1 을 각각 새 프로세스로 띄워 준비까지 시간과 RSS 비교
+# render: 명단 10/100/1000명 텍스트 만들기 — 줄 캐시 없이(cold) / 그대로(warm) / 한 명 판수만 바뀜
+# ────────────────────────────────────────────────────────────────────────────────
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import gc
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(xs, p):
+    if not xs:
+        return None
+    xs = sorted(xs)
+    k = min(len(xs) - 1, max(0, int(round(p / 100 * (len(xs) - 1)))))
+    return xs[k]
+
+
+def dir_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            total += os.path.getsize(os.path.join(root, f))
+    return total
+
+
+def import_god(workdir):
+    # 데이터 파일(DB/백업)이 임시 폴더에 생기도록 cwd 를 옮긴 뒤 import
+    os.chdir(workdir)
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    import god
+    return god
+
+
+async def reaction_burst(args):
+    god = import_god(args.workdir)
+    from fakegateway import FakeGateway
+
+    god.STATUS_EDIT_WINDOW = args.window
+    god.load_data()
+    gw = await FakeGateway(god, latency=args.latency).install()
+    guild = gw.add_guild()
+    sig = gw.setup_signup(guild)
+
+    rnd = random.Random(args.seed)
+    users = []
+    for i in range(args.users):
+        uid = 500_000_000_000_000_000 + i
+        name = f"u{i:06d}"
+        guild.add_member(uid, name)
+        if rnd.random() >= args.unregistered:
+            god.user_nicknames[str(uid)] = f"n{i}#KR1"
+        users.append((uid, name))
+
+    pending = {}      # uid -> (보낸 시각, 표시 이름)
+    latencies = []
+    last_render = [0.0]
+
+    def on_edit(msg, content):
+        # 상태 메시지는 여러 페이지일 수 있음 (같은 채널의 edit/send 로 판단)
+        if msg.channel is not sig.channel:
+            return
+        now = time.perf_counter()
+        last_render[0] = now
+        for uid, (t0, name) in list(pending.items()):
+            if name in content:
+                latencies.append(now - t0)
+                del pending[uid]
+
+    gw.rest.edit_hooks.append(on_edit)
+    expected = set()
+
+    t_start = time.perf_counter()
+    for i in range(args.events):
+        uid, name = users[i % len(users)]
+        emoji = rnd.choice(["1️⃣", "2️⃣", "3️⃣"])
+        t0 = gw.dispatch_reaction(guild, sig.viewer, uid, emoji)
+        if str(uid) in god.user_nicknames and uid not in expected:
+            expected.add(uid)
+            pending[uid] = (t0, name)
+        if args.rate:
+            await asyncio.sleep(1 / args.rate)
+
+    def handled():
+        queues_empty = all(q.empty() for q in god.reaction_queues.values())
+        in_flight = [t for t in asyncio.all_tasks() if t.get_name().startswith("discord.py:") and not t.done()]
+        return queues_empty and not in_flight
+
+    await gw.settle(handled)
+    t_handled = time.perf_counter()
+    await gw.settle(lambda: not pending or not god.status_dirty and all(t.done() for t in god.status_tasks.values()))
+    await god.STORE.drain()
+    t_end = time.perf_counter()
+    # 리액션 정리/안내처럼 뒤로 밀린 REST 요청까지 다 나간 뒤에 셈
+    await gw.settle(lambda: god.REST.queued() == 0 and god.REST.snapshot()["inflight"] == 0)
+    rest_calls = gw.rest.total
+    rest_by_route = dict(gw.rest.calls)
+    await god.EXPIRY.close()
+    await god.REST.close()
+    return {
+        "scenario": "reaction_burst",
+        "events": args.events,
+        "users": args.users,
+        "latency_ms": args.latency * 1000,
+        "window_s": args.window,
+        "events_per_sec": round(args.events / max(t_handled - t_start, 1e-9), 1),
+        "join_to_render_p50_ms": round((percentile(latencies, 50) or 0) * 1000, 2),
+        "join_to_render_p99_ms": round((percentile(latencies, 99) or 0) * 1000, 2),
+        "joins_rendered": len(latencies),
+        "joins_missing": len(pending),
+        "total_s": round(max(t_end, last_render[0]) - t_start, 3),
+        "rest_calls": rest_calls,
+        "rest_calls_per_event": round(rest_calls / args.events, 3),
+        "rest_by_route": rest_by_route,
+        "store_bytes": god.STORE.stats["bytes"],
+        "store_commits": god.STORE.stats["commits"],
+        "disk_bytes": dir_bytes(args.workdir),
+    }
+
+
+GUILD_BASE = 1_000_000
+
+
+def shard_guild_ids(n):
+    # (id >> 22) 가 0,1,2,... 이 되도록 → 샤드에 고르게 퍼짐
+    return [(GUILD_BASE + i) << 22 for i in range(n)]
+
+
+async def shard_worker(args):
+    # 자식 프로세스 하나: 맡은 서버만 가짜 게이트웨이에 붙이고 반응을 흘림
+    god = import_god(args.workdir)
+    import fakegateway
+    from fakegateway import FakeGateway
+
+    fakegateway.seed_ids(god.SHARDS.worker)
+    god.STATUS_EDIT_WINDOW = args.window
+    god.load_data()
+    gw = await FakeGateway(god, latency=args.latency).install()
+    owned = [gid for gid in shard_guild_ids(args.guilds) if god.SHARDS.owns(gid)]
+    sigs = []
+    for gid in owned:
+        guild = gw.add_guild(gid)
+        for i in range(args.users):
+            guild.add_member(500_000_000_000_000_000 + i, f"u{i:06d}")
+        sigs.append((guild, gw.setup_signup(guild)))
+    god.save_data()
+
+    # 닉네임은 프로세스마다 나눠서 등록 → 다른 프로세스 것까지 동기화될 때까지 대기
+    workers = int(os.getenv("WORKER_COUNT", "1"))
+    for i in range(args.users):
+        if i % workers == god.SHARDS.worker:
+            god.user_nicknames.set(500_000_000_000_000_000 + i, f"n{i}#KR1")
+    sync = asyncio.create_task(god.user_nicknames.sync_forever(0.05))
+    t0 = time.perf_counter()
+    await gw.settle(lambda: len(god.user_nicknames) >= args.users)
+    t_sync = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for guild, sig in sigs:
+        for i in range(args.users):
+            gw.dispatch_reaction(guild, sig.viewer, 500_000_000_000_000_000 + i, "1️⃣")
+    await gw.settle(lambda: all(q.empty() for q in god.reaction_queues.values())
+                    and not [t for t in asyncio.all_tasks() if t.get_name().startswith("discord.py:") and not t.done()])
+    elapsed = time.perf_counter() - t0
+    await gw.settle(lambda: not god.status_dirty and all(t.done() for t in god.status_tasks.values()))
+    god.save_data()
+    await god.STORE.drain()
+    await god.user_nicknames.drain()
+    sync.cancel()
+    await gw.settle(lambda: god.REST.queued() == 0 and god.REST.snapshot()["inflight"] == 0)
+    return {
+        "worker": god.SHARDS.worker,
+        "shards": god.SHARDS.ids,
+        "guilds": len(owned),
+        "events": len(owned) * args.users,
+        "events_per_sec": round(len(owned) * args.users / max(elapsed, 1e-9), 1),
+        "nickname_sync_ms": round(t_sync * 1000, 1),
+        "rest_calls": gw.rest.total,
+        "store_commits": god.STORE.stats["commits"],
+    }
+
+
+def sharded(args):
+    # 부모: 자식 N 개를 띄우고, 끝나면 DB 를 처음부터 읽어 모든 서버가 제대로 저장됐는지 확인
+    from shards import assign, worker_env
+
+    t0 = time.perf_counter()
+    procs = []
+    for w, ids in enumerate(assign(args.workers, args.workers)):
+        env = worker_env(args.workers, ids, w)
+        env["WORKER_COUNT"] = str(args.workers)
+        cmd = [sys.executable, os.path.join(HERE, "bench.py"), "--shard-worker", "--json",
+               "--workdir", args.workdir, "--guilds", str(args.guilds), "--users", str(args.users),
+               "--latency", str(args.latency), "--window", str(args.window)]
+        procs.append(subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, text=True))
+    workers = [json.loads(p.communicate()[0]) for p in procs]
+    elapsed = time.perf_counter() - t0
+    if any(p.returncode for p in procs):
+        raise SystemExit("shard worker 실패")
+
+    sys.path.insert(0, HERE)
+    from storage import GuildStore
+    from nicknames import NicknameStore
+    db = os.path.join(args.workdir, "bot_state.db")
+    saved = GuildStore(db).load()
+    nicks = NicknameStore(db).load()
+    limit = 9
+    ok = [gid for gid in map(str, shard_guild_ids(args.guilds))
+          if gid in saved and len(saved[gid]["participants"]) == min(limit, args.users)
+          and len(saved[gid]["participants"]) + len(saved[gid]["waitlist"]) == args.users]
+    return {
+        "scenario": "sharded",
+        "workers": args.workers,
+        "guilds": args.guilds,
+        "users": args.users,
+        "total_s": round(elapsed, 3),
+        "events_per_wall_sec": round(sum(w["events"] for w in workers) / max(elapsed, 1e-9), 1),
+        "guilds_saved_ok": len(ok),
+        "nicknames_saved": len(nicks),
+        "per_worker": workers,
+    }
+
+
+def rss_mb():
+    # 지금 RSS (리눅스), 없으면 최대 RSS
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+async def startup_worker(args):
+    # 자식 프로세스 하나: 서버 접속 → (기본 모드면 멤버 전체 받기) → 모든 서버 상태 메시지 그리기까지
+    os.environ["LAZY_MEMBERS"] = "1" if args.mode == "lazy" else "0"
+    god = import_god(args.workdir)
+    from fakegateway import FakeGateway
+
+    rss_base = rss_mb()
+    god.load_data()
+    gw = await FakeGateway(god, latency=args.latency).install()
+    base = 500_000_000_000_000_000
+    t0 = time.perf_counter()
+    guilds = []
+    for _ in range(args.guilds):
+        guild = gw.add_guild()
+        guild.populate(args.members, base)
+        gw.setup_signup(guild)
+        roster = god.GUILD_DATA[str(guild.id)]["roster"]
+        for i in range(min(args.users, args.members)):
+            roster.join(base + i, 1, 9)
+        guilds.append(guild)
+    if args.mode == "eager":
+        # chunk_guilds_at_startup=True 와 같은 일: 준비 전에 서버마다 전체 멤버
+        await asyncio.gather(*(g.chunk(latency=args.chunk_latency) for g in guilds))
+    await asyncio.gather(*(god.update_status(str(g.id), force=True) for g in guilds))
+    t_ready = time.perf_counter() - t0
+    gc.collect()
+    # 명단 전원이 이름으로 그려졌는지 (못 가져오면 "알수없음(uid)")
+    rendered = 0
+    for g in guilds:
+        ch = g.channels[0]
+        pages = [ch.messages[mid].content for mid in god.status_page_ids(god.GUILD_DATA[str(g.id)]) if mid in ch.messages]
+        rendered += bool(pages) and not any("알수없음" in p for p in pages)
+    await god.STORE.drain()
+    return {
+        "mode": args.mode,
+        "ready_ms": round(t_ready * 1000, 1),
+        "rss_mb": rss_mb(),
+        "rss_growth_mb": round(rss_mb() - rss_base, 1),
+        "cached_members": sum(len(g._members) for g in guilds) + god.MEMBER_FETCH.size(),
+        "guilds_rendered_ok": rendered,
+        "gateway_requests": {k: v for k, v in gw.rest.calls.items() if k.startswith("GATEWAY") or k == "GET /members"},
+    }
+
+
+def startup(args):
+    # 모드마다 새 프로세스 (RSS 가 섞이지 않게)
+    out = {"scenario": "startup", "guilds": args.guilds, "members_per_guild": args.members, "roster": args.users}
+    for mode in ("eager", "lazy"):
+        cmd = [sys.executable, os.path.join(HERE, "bench.py"), "--startup-worker", "--mode", mode, "--json",
+               "--guilds", str(args.guilds), "--members", str(args.members), "--users", str(args.users),
+               "--latency", str(args.latency), "--chunk-latency", str(args.chunk_latency)]
+        with tempfile.TemporaryDirectory() as tmp:
+            p = subprocess.run(cmd + ["--workdir", tmp], stdout=subprocess.PIPE, text=True, check=True)
+        out[mode] = json.loads(p.stdout)
+    out["ready_speedup"] = round(out["eager"]["ready_ms"] / max(out["lazy"]["ready_ms"], 1e-9), 1)
+    out["rss_saved_mb"] = round(out["eager"]["rss_mb"] - out["lazy"]["rss_mb"], 1)
+    return out
+
+
+def per_call_us(fn, min_time=0.2):
+    # min_time 초 이상 돌려서 한 번에 걸린 µs
+    n, total = 1, 0.0
+    while total < min_time:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            fn()
+        total = time.perf_counter() - t0
+        n *= 2
+    return round(total / (n // 2) * 1e6, 1)
+
+
+async def render(args):
+    god = import_god(args.workdir)
+    from fakegateway import FakeGateway, FakeRole
+
+    god.load_data()
+    gw = await FakeGateway(god).install()
+    out = {"scenario": "render"}
+    for size in args.sizes:
+        guild = gw.add_guild()
+        gw.setup_signup(guild, max_participants=10)
+        data = god.GUILD_DATA[str(guild.id)]
+        roles = [FakeRole(t) for t in god.TIERS]
+        for i in range(size):
+            uid = 600_000_000_000_000_000 + i
+            guild.add_member(uid, f"member{i:05d}", roles=[roles[i % len(roles)]])
+            god.user_nicknames[str(uid)] = f"riot{i}#KR1"
+            data["roster"].join(uid, random.choice([1, 2, 3, float("inf")]), 10)
+        cache = god.line_cache[guild.id]
+        text = god.build_participant_text_fast(data, guild)
+
+        def cold():
+            cache.clear()
+            god.build_participant_text_fast(data, guild)
+
+        def warm():
+            god.build_participant_text_fast(data, guild)
+
+        victim = 600_000_000_000_000_000 + size // 2
+
+        def one_change():
+            data["roster"].set_rounds(victim, data["roster"].rounds_left[victim] % 3 + 1)
+            god.build_participant_text_fast(data, guild)
+
+        assert text == god.build_participant_text_fast(data, guild)
+        r = {"cold_us": per_call_us(cold), "warm_us": per_call_us(warm), "one_change_us": per_call_us(one_change)}
+        r["speedup"] = round(r["cold_us"] / max(r["warm_us"], 1e-9), 1)
+        out[f"roster_{size}"] = r
+    return out
+
+
+def print_report(r):
+    width = max(len(k) for k in r)
+    for k, v in r.items():
+        print(f"{k:<{width}}  {v}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="가짜 게이트웨이 벤치마크")
+    ap.add_argument("--scenario", choices=["reaction_burst", "sharded", "startup", "render"], default="reaction_burst")
+    ap.add_argument("--workers", type=int, default=2, help="sharded: 프로세스 수 (= 샤드 수)")
+    ap.add_argument("--guilds", type=int, default=8, help="sharded: 서버 수")
+    ap.add_argument("--shard-worker", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--startup-worker", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--mode", choices=["eager", "lazy"], default="eager", help=argparse.SUPPRESS)
+    ap.add_argument("--members", type=int, default=20000, help="startup: 서버당 멤버 수")
+    ap.add_argument("--sizes", type=lambda v: [int(x) for x in v.split(",")], default=[10, 100, 1000],
+                    help="render: 명단 크기들 (쉼표)")
+    ap.add_argument("--chunk-latency", type=float, default=0.005, help="startup: 멤버 1000명 chunk 당 지연 (초)")
+    ap.add_argument("--events", type=int, default=500)
+    ap.add_argument("--users", type=int, default=500)
+    ap.add_argument("--unregistered", type=float, default=0.0, help="닉네임 미등록 유저 비율")
+    ap.add_argument("--latency", type=float, default=0.0, help="가짜 REST 호출 지연 (초)")
+    ap.add_argument("--window", type=float, default=1.5, help="STATUS_EDIT_WINDOW")
+    ap.add_argument("--rate", type=float, default=0.0, help="초당 이벤트 수 (0이면 한 번에)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", action="store_true")
+    ap.add_argument("--workdir", default=None, help="DB/백업 쓸 폴더 (기본: 임시 폴더)")
+    args = ap.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # 봇 쪽 print 는 stderr 로 (stdout 은 보고서만)
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(sys.stderr):
+        args.workdir = os.path.abspath(args.workdir or tmp)
+        if args.shard_worker:
+            report = asyncio.run(shard_worker(args))
+        elif args.startup_worker:
+            report = asyncio.run(startup_worker(args))
+        elif args.scenario == "startup":
+            report = startup(args)
+        elif args.scenario == "render":
+            report = asyncio.run(render(args))
+        elif args.scenario == "sharded":
+            report = sharded(args)
+        else:
+            report = asyncio.run(reaction_burst(args))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
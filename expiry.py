@@ -0,0 +1,153 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# 잠깐 뜨는 봇 메시지 자동 삭제 (delete_after 대신)
+#  - 메시지마다 sleep 태스크 하나 대신 힙 하나 + 작업자 하나
+#  - 같은 때 만료되는 메시지는 채널별로 모아 bulk-delete 한 번
+#  - SQLite 에 남겨 두어 재시작해도 남은 안내 메시지를 지움
+# ────────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import heapq
+import logging
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS expiring (message_id INTEGER PRIMARY KEY, channel_id INTEGER, expires REAL);
+"""
+
+
+class ExpiryWheel:
+    def __init__(self, path, delete, slack=0.5):
+        # delete(channel_id, [message_id, ...]) — 실제 삭제 요청 (REST 스케줄러로)
+        self.path = path
+        self.delete = delete
+        self.slack = slack          # 이만큼 안에 만료될 메시지는 같이 지움
+        self._conn = None
+        self._lock = threading.Lock()
+        self._heap = []             # (만료 시각 time.time(), 채널 id, 메시지 id)
+        self._pending = {}          # 메시지 id → (채널 id, 만료 시각) 또는 None (DB 에서 지움)
+        self._task = None
+        self._flush_task = None
+        self._wakeup = None
+        self.stats = {"scheduled": 0, "deleted": 0, "batches": 0}
+
+    # ─── 연결 / 불러오기 ──────────────────────────────────────────────────
+    def connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def load(self, keep=None):
+        # 재시작 전에 남아 있던 것 (이미 지난 것은 작업자가 바로 지움)
+        # keep(channel_id): 여러 프로세스일 때 내 채널 것만
+        conn = self.connect()
+        with self._lock:
+            rows = conn.execute("SELECT expires, channel_id, message_id FROM expiring").fetchall()
+        self._heap = [tuple(r) for r in rows if keep is None or keep(r[1])]
+        heapq.heapify(self._heap)
+        return self
+
+    @property
+    def pending(self):
+        return len(self._heap)
+
+    # ─── 예약 ─────────────────────────────────────────────────────────────
+    def schedule(self, channel_id, message_id, after):
+        expires = time.time() + after
+        heapq.heappush(self._heap, (expires, channel_id, message_id))
+        self._pending[message_id] = (channel_id, expires)
+        self.stats["scheduled"] += 1
+        self.start()
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._worker())
+        if self._pending and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = loop.create_task(self._flusher())
+
+    # ─── 작업자 ───────────────────────────────────────────────────────────
+    async def _worker(self):
+        while self._heap:
+            wait = self._heap[0][0] - time.time()
+            if wait > 0:
+                self._wakeup.clear()
+                # wait_for 는 취소를 삼킬 수 있음 (3.11) → asyncio.timeout
+                try:
+                    async with asyncio.timeout(wait):
+                        await self._wakeup.wait()
+                except TimeoutError:
+                    pass
+                continue
+            due = defaultdict(list)
+            limit = time.time() + self.slack
+            while self._heap and self._heap[0][0] <= limit:
+                _, cid, mid = heapq.heappop(self._heap)
+                due[cid].append(mid)
+                self._pending[mid] = None
+            for cid, mids in due.items():
+                try:
+                    self.delete(cid, mids)
+                except Exception:
+                    logging.exception("[자동삭제] 삭제 요청 실패")
+                self.stats["deleted"] += len(mids)
+                self.stats["batches"] += 1
+            self.start()
+
+    # ─── DB 반영 (스레드에서, 모아서 한 트랜잭션) ────────────────────────────
+    async def _flusher(self):
+        while self._pending:
+            pending, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(self._commit, pending)
+            except Exception:
+                logging.exception("[자동삭제] 커밋 실패")
+                self._pending = {**pending, **self._pending}
+                await asyncio.sleep(1)
+
+    def _commit(self, pending):
+        conn = self.connect()
+        with self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for mid, v in pending.items():
+                    if v is None:
+                        conn.execute("DELETE FROM expiring WHERE message_id=?", (mid,))
+                    else:
+                        conn.execute("INSERT OR REPLACE INTO expiring VALUES (?,?,?)", (mid, v[0], v[1]))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def flush_sync(self):
+        if self._pending:
+            pending, self._pending = self._pending, {}
+            self._commit(pending)
+
+    async def drain(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+        self.flush_sync()
+
+    async def close(self):
+        # 작업자를 멈추고 DB 를 비움 (남은 메시지는 재시작 후 load 에서 다시)
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self.drain()
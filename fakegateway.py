@@ -0,0 +1,294 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# 오프라인 테스트용 가짜 Discord 게이트웨이 / REST
+#  - 실제 연결 없이 god.bot 에 가짜 서버·채널·메시지·멤버를 붙이고
+#    RawReactionActionEvent 를 bot.dispatch 로 흘려보냄 (실제 게이트웨이와 같은 경로)
+#  - REST 호출은 route 별로 세고, 지연(latency)을 흉내 낼 수 있음
+#  - populate() 로 "서버 쪽" 멤버 목록을 (만들지 않고) 잡아 두면 chunk() / query_members() /
+#    fetch_member() 로 시작 시 전체 받기 vs 필요할 때 가져오기를 흉내 냄
+# ────────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import itertools
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import discord
+
+# 지금 시각의 snowflake 부터 (메시지 나이로 bulk-delete 가능 여부를 가리므로)
+_BASE = discord.utils.time_snowflake(discord.utils.utcnow())
+_ids = itertools.count(_BASE)
+
+
+def snowflake():
+    return next(_ids)
+
+
+def seed_ids(worker):
+    # 여러 프로세스가 같은 DB 를 쓸 때 메시지/채널 id 가 겹치지 않게
+    global _ids
+    _ids = itertools.count(_BASE + worker * 1_000_000_000_000)
+
+
+class FakeREST:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.edit_hooks = []    # (message, content) 를 받는 콜백 — edit / send 때 (렌더 시각 측정용)
+
+    async def call(self, route):
+        self.calls[route] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    @property
+    def total(self):
+        return sum(self.calls.values())
+
+
+class FakeRole:
+    def __init__(self, name):
+        self.id = snowflake()
+        self.name = name
+
+
+class FakeMember:
+    def __init__(self, guild, uid, display_name, roles=(), admin=False):
+        self.guild = guild
+        self.id = uid
+        self.display_name = display_name
+        self.name = display_name.lower()
+        self.roles = list(roles)
+        self.bot = False
+        self.mention = f"<@{uid}>"
+        self.guild_permissions = SimpleNamespace(administrator=admin)
+
+
+class FakeMessage:
+    def __init__(self, channel, content="", author_id=None):
+        self.id = snowflake()
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+        self.author_id = author_id
+        self.reactions = []
+        self.deleted = False
+
+    @property
+    def _rest(self):
+        return self.channel.guild.gateway.rest
+
+    async def edit(self, content=None, **kw):
+        await self._rest.call("PATCH /messages")
+        if content is not None:
+            self.content = content
+        for hook in self._rest.edit_hooks:
+            hook(self, self.content)
+        return self
+
+    async def delete(self, **kw):
+        await self._rest.call("DELETE /messages")
+        self.deleted = True
+        self.channel.messages.pop(self.id, None)
+
+    async def add_reaction(self, emoji):
+        await self._rest.call("PUT /reactions/@me")
+
+    async def remove_reaction(self, emoji, member):
+        await self._rest.call("DELETE /reactions/user")
+
+    async def clear_reactions(self):
+        await self._rest.call("DELETE /reactions")
+
+    async def clear_reaction(self, emoji):
+        await self._rest.call("DELETE /reactions/emoji")
+
+
+class FakeChannel:
+    def __init__(self, guild, name="시참"):
+        self.id = snowflake()
+        self.guild = guild
+        self.name = name
+        self.messages = {}
+
+    @property
+    def _rest(self):
+        return self.guild.gateway.rest
+
+    async def send(self, content=None, delete_after=None, **kw):
+        await self._rest.call("POST /messages")
+        msg = FakeMessage(self, content or "")
+        self.messages[msg.id] = msg
+        for hook in self._rest.edit_hooks:
+            hook(msg, msg.content)
+        if delete_after is not None:
+            async def _later():
+                await asyncio.sleep(delete_after)
+                if not msg.deleted:
+                    await msg.delete()
+            asyncio.get_running_loop().create_task(_later())
+        return msg
+
+    def seed(self, content=""):
+        # REST 호출 없이 미리 깔아두는 메시지
+        msg = FakeMessage(self, content)
+        self.messages[msg.id] = msg
+        return msg
+
+    async def fetch_message(self, mid):
+        await self._rest.call("GET /messages")
+        try:
+            return self.messages[mid]
+        except KeyError:
+            raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown Message")
+
+    def get_partial_message(self, mid):
+        return self.messages.get(mid) or FakeMessage(self)
+
+    async def delete_messages(self, messages):
+        await self._rest.call("POST /messages/bulk-delete")
+        for m in messages:
+            self.messages.pop(m.id, None)
+
+
+class FakeGuild:
+    def __init__(self, gateway, gid=None):
+        self.gateway = gateway
+        self.id = gid or snowflake()
+        self.name = f"guild-{self.id}"
+        self._members = {}
+        self.channels = []
+        self.population = 0         # 서버 쪽 멤버 수 (uid = member_base + i, 이름 u000000)
+        self.member_base = 0
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+    def get_member(self, uid):
+        return self._members.get(uid)
+
+    # ─── 서버 쪽 멤버 목록 (캐시와 별개) ─────────────────────────────────────
+    def populate(self, count, base=500_000_000_000_000_000):
+        self.population = count
+        self.member_base = base
+
+    def remote(self, uid):
+        m = self._members.get(uid)
+        if m is None and 0 <= uid - self.member_base < self.population:
+            m = FakeMember(self, uid, f"u{uid - self.member_base:06d}")
+        return m
+
+    async def chunk(self, size=1000, latency=0.0):
+        # 시작할 때 전체 멤버 받기 (GUILD_MEMBERS_CHUNK 1000명씩)
+        for i in range(0, self.population, size):
+            await self.gateway.rest.call("GATEWAY request_guild_members")
+            if latency:
+                await asyncio.sleep(latency)
+            for uid in range(self.member_base + i, self.member_base + min(i + size, self.population)):
+                self._members[uid] = FakeMember(self, uid, f"u{uid - self.member_base:06d}")
+
+    async def query_members(self, query=None, *, limit=5, user_ids=None, presences=False, cache=True):
+        await self.gateway.rest.call("GATEWAY query_members")
+        if user_ids is not None:
+            found = [m for m in map(self.remote, user_ids) if m is not None]
+        else:
+            q = (query or "").lower()
+            found = [m for m in self._members.values() if m.name.startswith(q)]
+            found += [self.remote(self.member_base + i) for i in range(self.population)
+                      if self.member_base + i not in self._members and f"u{i:06d}".startswith(q)][:limit]
+        found = found[:limit]
+        if cache:
+            for m in found:
+                self._members[m.id] = m
+        return found
+
+    async def fetch_member(self, uid):
+        await self.gateway.rest.call("GET /members")
+        m = self.remote(uid)
+        if m is None:
+            raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown Member")
+        return m
+
+    def add_member(self, uid, display_name, roles=(), admin=False):
+        m = FakeMember(self, uid, display_name, roles, admin)
+        self._members[uid] = m
+        return m
+
+    def add_channel(self, name="시참"):
+        ch = FakeChannel(self, name)
+        self.channels.append(ch)
+        self.gateway.channels[ch.id] = ch
+        return ch
+
+
+class FakeGateway:
+    BOT_ID = 1
+
+    def __init__(self, god, latency=0.0):
+        self.god = god
+        self.rest = FakeREST(latency)
+        self.guilds = {}
+        self.channels = {}
+
+    async def install(self):
+        bot = self.god.bot
+        await bot._async_setup_hook()
+        bot._connection.user = SimpleNamespace(id=self.BOT_ID, name="bot", mention=f"<@{self.BOT_ID}>")
+        bot.get_guild = self.guilds.get
+        bot.get_channel = self.channels.get
+        return self
+
+    def add_guild(self, gid=None):
+        g = FakeGuild(self, gid)
+        self.guilds[g.id] = g
+        return g
+
+    def setup_signup(self, guild, max_participants=9, signup_open=True):
+        # !등록 + !관리자 를 실행한 것과 같은 상태를 REST 없이 만듦
+        ch = guild.add_channel()
+        viewer = ch.seed("1️⃣ 일반 2️⃣ 1티어구독 3️⃣ 2티어구독 ❤️고정권")
+        status = ch.seed(f"{self.god.CUSTOM_EMOJI} 참가자 목록:\n(아직 없음)")
+        admin = ch.seed("🎮로테이션 ▶️시참시작 🛑시참정지 🎲랜덤맵")
+        self.god.GUILD_DATA[str(guild.id)] = {
+            "viewer_channel_id": ch.id,
+            "viewer_msg_id": viewer.id,
+            "viewer_status_msg_id": status.id,
+            "admin_channel_id": ch.id,
+            "admin_msg_id": admin.id,
+            "roster": self.god.Roster(),
+            "max_participants": max_participants,
+            "locked_participants": None,
+            "signup_open": signup_open,
+            "last_map_msg_id": None,
+            "party_code": None,
+            "party_code_msg_id": None,
+        }
+        self.god.index_routes()
+        return SimpleNamespace(channel=ch, viewer=viewer, status=status, admin=admin)
+
+    def reaction(self, guild, message, uid, emoji):
+        data = {
+            "message_id": message.id,
+            "channel_id": message.channel.id,
+            "user_id": uid,
+            "guild_id": guild.id,
+            "type": 0,
+        }
+        raw = discord.RawReactionActionEvent(data, discord.PartialEmoji(name=emoji), "REACTION_ADD")
+        # 실제 게이트웨이도 서버 안 반응 추가에는 Member 를 같이 보냄
+        raw.member = guild.remote(uid)
+        return raw
+
+    def dispatch_reaction(self, guild, message, uid, emoji):
+        # 실제 게이트웨이처럼 이벤트마다 태스크 하나
+        self.god.bot.dispatch("raw_reaction_add", self.reaction(guild, message, uid, emoji))
+        return time.perf_counter()
+
+    async def settle(self, done, timeout=60.0, poll=0.005):
+        # done() 가 참이 될 때까지 이벤트 루프를 돌림
+        end = time.perf_counter() + timeout
+        while not done():
+            if time.perf_counter() > end:
+                raise TimeoutError("fake gateway: 처리가 끝나지 않음")
+            await asyncio.sleep(poll)
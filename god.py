@@ -4,7 +4,7 @@
 # This software may not be copied, modified, or distributed without permission.
 # ────────────────────────────────────────────────────────────────────────────────
 
-import glob
+import io
 import os
 import random
 import logging
@@ -12,31 +12,68 @@ import discord
 from datetime import datetime
 from discord.ext import commands, tasks
 import asyncio
-from collections import defaultdict, deque
+from collections import Counter, defaultdict
+from functools import partial
 import re
-import json
-from discord.utils import find
-
-DATA_FILE = "session_data.json"
+import time
+from storage import GuildStore
+from roster import PriorityPolicy, Roster
+from teams import split_teams
+from indexes import MemberFetcher, MemberIndex, NameIndex, NO_TIER
+from backup import BackupWriter
+from nicknames import NicknameStore
+from expiry import ExpiryWheel
+from history import RosterHistory
+from api import RosterAPI
+from rest import RestScheduler, ROSTER, ANNOUNCE, CLEANUP, NOTICE, PRIORITY_NAMES
+from shards import ShardConfig, main_or_launch
+from metrics import Registry, configure_logging
+
+DATA_FILE = "session_data.json"   # 예전 형식, 처음 실행 때 DB로 한 번만 이전
+DB_FILE = os.getenv("DB_FILE", "bot_state.db")
+# SHARD_COUNT/SHARD_IDS 로 띄우면 맡은 샤드의 서버만 읽고 씀 (DB 파일은 프로세스끼리 같이 씀)
+SHARDS = ShardConfig.from_env()
+STORE = GuildStore(DB_FILE, legacy_json=DATA_FILE, owns=SHARDS.owns)
+# 로테이션 기록 (되돌리기/다시하기) — GUILD_DATA 와 따로 저장, 서버별 HISTORY_MAX 개
+HISTORY = RosterHistory(DB_FILE, maxlen=int(os.getenv("HISTORY_MAX", "20")))
 
 def save_data():
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(GUILD_DATA, f, ensure_ascii=False, indent=2)
+    # 변경분만 모아서 스레드에서 커밋 (이벤트 루프 안 막음)
+    STORE.save(GUILD_DATA)
 
 def load_data():
-    global GUILD_DATA
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            GUILD_DATA = json.load(f)
-
-
-logging.basicConfig(level=logging.INFO)
+    GUILD_DATA.clear()
+    for gid, data in STORE.load().items():
+        # 저장된 리스트 → Roster (rounds_left 키는 int 로 통일)
+        data["roster"] = Roster.from_dict(data)
+        for k in ("participants", "waitlist", "rounds_left"):
+            data.pop(k, None)
+        # 예전 한 단계 되돌리기 사본은 HISTORY 로 대체 (다음 저장 때 DB 에서도 빠짐)
+        for k in ("prev_roster", "prev_participants", "prev_waitlist", "prev_rounds_left"):
+            data.pop(k, None)
+        GUILD_DATA[gid] = data
+    HISTORY.load(owns=SHARDS.owns)
+    index_routes()
+
+
+# LOG_LEVEL=DEBUG 로 자세히, LOG_FORMAT=json 이면 한 줄 JSON
+configure_logging()
+log = logging.getLogger("god")
 
 intents = discord.Intents.default()
 intents.message_content = True
 intents.reactions = True
 intents.members = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+# LAZY_MEMBERS=1: 시작할 때 멤버 전체를 받지 않고 (chunk 안 함, 멤버 캐시 없음)
+#  명단에 들어온 사람만 MEMBER_FETCH 가 모아서 가져와 LRU 로 보관 — 큰 서버에서 시작 시간/메모리 절약
+LAZY_MEMBERS = os.getenv("LAZY_MEMBERS", "0") == "1"
+member_opts = {}
+if LAZY_MEMBERS:
+    member_opts = {"chunk_guilds_at_startup": False, "member_cache_flags": discord.MemberCacheFlags.none()}
+if SHARDS.sharded:
+    bot = commands.AutoShardedBot(command_prefix="!", intents=intents, shard_count=SHARDS.count, shard_ids=SHARDS.ids, **member_opts)
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents, **member_opts)
 
 MAX_PARTICIPANTS = 9
 NEXT_ROUND_MAX = None
@@ -47,41 +84,30 @@ EMOJI_OPEN        = "▶️"
 EMOJI_RANDOM_MAP  = "🎲"
 EMOJI_DELETE      = "🗑️"
 EMOJI_ROTATE      = "🎮"
+EMOJI_TEAMS       = "⚖️"
 MAP_LIST = ["바인드","헤이븐","스플릿","어센트","아이스박스","펄","프랙처","로터스","어비스","선셋","무무가 원하는 맵","코로드"]
 BACKUP_DIR = "backups"
-auto_backup_enabled = {}
+BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", "10"))
+# 내용이 바뀐 경우에만 기록, 1MB / 하루 단위로 .gz 회전, 서버별 14개 보관
+BACKUPS = BackupWriter(BACKUP_DIR, max_bytes=int(os.getenv("BACKUP_MAX_BYTES", str(1 << 20))), keep=int(os.getenv("BACKUP_KEEP", "14")))
 
 CUSTOM_EMOJI = "<:24:1386641516155375687>"
 
-user_nicknames = {}
-pending_warnings = {}
-
-def save_user_nicknames():
-    with open("valo_nicknames.json","w",encoding="utf-8") as f:
-        json.dump(user_nicknames, f, ensure_ascii=False, indent=2)
-    view = {}
-    for uid_str, nick in user_nicknames.items():
-        try: uid = int(uid_str)
-        except: continue
-        for g in bot.guilds:
-            m = g.get_member(uid)
-            if m:
-                view[m.display_name] = nick
-                break
-        else:
-            view[f"알수없음(ID:{uid})"] = nick
-    with open("valo_nicknames_view.json","w",encoding="utf-8") as vf:
-        json.dump(view, vf, ensure_ascii=False, indent=2)
-
-def load_user_nicknames():
-    global user_nicknames
-    try:
-        with open("valo_nicknames.json","r",encoding="utf-8") as f:
-            user_nicknames = json.load(f)
-    except FileNotFoundError:
-        user_nicknames = {}
-
-load_user_nicknames()
+# uid → 발로란트 닉네임 (Riot ID). 등록/수정/삭제는 한 줄씩 DB 에, 보기용 파일은 모아서
+def nickname_display_name(uid):
+    for g in bot.guilds:
+        m = get_member(g, uid)
+        if m:
+            return m.display_name
+    return None
+
+# 보기용 파일은 첫 번째 프로세스만 씀
+user_nicknames = NicknameStore(DB_FILE, legacy_json="valo_nicknames.json",
+                               view_path="valo_nicknames_view.json" if SHARDS.primary else None,
+                               view_delay=float(os.getenv("NICKNAME_VIEW_DELAY", "30"))).load()
+user_nicknames.resolve_name = nickname_display_name
+NICKNAME_SYNC_INTERVAL = float(os.getenv("NICKNAME_SYNC_INTERVAL", "1"))
+nickname_sync_task = None
 
 def get_current_limit(data):
     if data.get("locked_participants") is not None:
@@ -90,178 +116,646 @@ def get_current_limit(data):
         return NEXT_ROUND_MAX
     return data.get("max_participants") or MAX_PARTICIPANTS
 
+# 대기열에서 올릴 사람: fifo(줄 선 순서, 기본) / priority(구독 단계·기다린 분·한 판 수 가중치 점수)
+WAITLIST_POLICY = os.getenv("WAITLIST_POLICY", "fifo")
+if WAITLIST_POLICY == "priority":
+    Roster.policy_factory = partial(PriorityPolicy,
+        w_tier=float(os.getenv("PRIORITY_W_TIER", "1")),
+        w_wait=float(os.getenv("PRIORITY_W_WAIT", "0.1")),
+        w_played=float(os.getenv("PRIORITY_W_PLAYED", "1")),
+    )
+
 TIER_WEIGHT = {tier:wt for tier,wt in zip(TIERS, range(len(TIERS),0,-1))}
-guild_locks = defaultdict(asyncio.Lock)
-reaction_queues = defaultdict(deque)
+# 티어 역할이 없는 사람은 가운데 티어로 침
+NO_TIER_WEIGHT = (len(TIERS) + 1) // 2
 GUILD_DATA = {}
 
-MEMBER_CACHE = defaultdict(dict)
-def get_member_fast(guild, uid):
-    cache = MEMBER_CACHE[guild.id]
-    if uid in cache:
-        return cache[uid]
-    m = guild.get_member(uid)
-    if m:
-        cache[uid] = m
-    return m
-
-def get_tier_cached(member):
-    if member is None:
-        return "티어 없음"
-    for r in member.roles:
-        if r.name in TIERS:
-            return r.name
-    return "티어 없음"
-
-def build_participant_text_fast(data, guild):
-    parts = data["participants"]
-    waits = data["waitlist"]
-    rl    = data["rounds_left"]
-    lines = [f"{CUSTOM_EMOJI} 참가자 목록:"]
-    if parts:
-        for uid in parts:
-            m = get_member_fast(guild, uid)
-            tier = get_tier_cached(m)
-            left = rl.get(uid, 0)
-            suffix = " (고정)" if left==float('inf') else (f" ({left}판)" if left>1 else (" (1판)" if left==1 else ""))
-            nick = user_nicknames.get(str(uid), "")
-            fmt  = f" / `{nick}`" if nick else ""
-            name = m.display_name if m else f"알수없음({uid})"
-            lines.append(f"{name}{fmt} [{tier}]{suffix}")
+FIXED_ROLE = "고정룰렛권"
+MEMBER_INDEX_MAX = int(os.getenv("MEMBER_INDEX_MAX", "2000"))
+# uid → (표시 이름, 티어, 고정룰렛권) — 멤버/역할 이벤트로 갱신, 렌더링은 dict 조회만
+MEMBERS = MemberIndex(TIERS, FIXED_ROLE, maxsize=MEMBER_INDEX_MAX)
+MEMBER_FETCH = MemberFetcher(maxsize=MEMBER_INDEX_MAX, ttl=float(os.getenv("MEMBER_TTL", "600")))
+if LAZY_MEMBERS:
+    MEMBERS.source = MEMBER_FETCH.get
+
+def get_member(guild, uid):
+    # 지연 모드면 가져와 둔 것까지 (I/O 없음)
+    return MEMBER_FETCH.get(guild, uid) if LAZY_MEMBERS else guild.get_member(uid)
+
+def member_refreshed(member):
+    # 지연 모드: 게이트웨이에서 다시 받은 멤버 정보가 달라졌으면 인덱스/줄 캐시 갱신 (on_member_update 대신)
+    NAMES.update(member)
+    if MEMBERS.update(member):
+        drop_lines(member.guild.id, member.id)
+        data = GUILD_DATA.get(str(member.guild.id))
+        if data and member.id in data["roster"]:
+            mark_dirty(str(member.guild.id))
+
+if LAZY_MEMBERS:
+    MEMBER_FETCH.on_fetch = member_refreshed
+
+async def ensure_members(data, guild):
+    # 렌더링 전에 명단 멤버를 모아서 가져옴 (지연 모드에서만)
+    if LAZY_MEMBERS and guild is not None:
+        snap = data["roster"].snapshot()
+        await MEMBER_FETCH.ensure(guild, [*snap.participants, *snap.waitlist])
+# display_name / name → uid — 명령어에서 guild.members 전체를 훑지 않게
+NAMES = NameIndex()
+
+async def resolve_member(ctx, query, delete_after=2):
+    # 이름이 그대로 맞는 한 명이면 Member, 아니면 안내 보내고 None
+    # 접두어/유사 이름은 한 명뿐이어도 고르지 않고 후보로만 보여 줌 (엉뚱한 사람을 바꾸지 않게)
+    found = NAMES.lookup(ctx.guild, query)
+    if not found.exact and LAZY_MEMBERS:
+        # 캐시에 없으면 게이트웨이에 이름으로 물어봄
+        for m in await MEMBER_FETCH.search(ctx.guild, query, NAMES.max_candidates + 1):
+            NAMES.update(m)
+        found = NAMES.lookup(ctx.guild, query)
+    members = [m for m in (get_member(ctx.guild, u) for u in found.uids) if m]
+    if len(members) == 1 and found.exact:
+        return members[0]
+    if not members:
+        notify(ctx.channel, f"⚠️ '{query}' 님을 찾을 수 없습니다.", delete_after)
+        return None
+    more = " …" if len(members) > NAMES.max_candidates else ""
+    names = ", ".join(f"{m.display_name}({m.name})" for m in members[:NAMES.max_candidates])
+    if found.exact:
+        notify(ctx.channel, f"⚠️ '{query}' 에 해당하는 멤버가 여러 명입니다: {names}{more}\n정확한 이름으로 다시 입력해주세요.", max(delete_after, 5))
     else:
-        lines.append("(아직 없음)")
-    if waits:
+        notify(ctx.channel, f"⚠️ '{query}' 와 정확히 같은 이름이 없습니다. 혹시: {names}{more}\n정확한 이름으로 다시 입력해주세요.", max(delete_after, 5))
+    return None
+
+# 상태 메시지 한 개에 넣을 최대 글자 수 (Discord 2000자 제한보다 여유 있게)
+STATUS_PAGE_CHARS = int(os.getenv("STATUS_PAGE_CHARS", "1900"))
+
+# 길드 id → {uid: (판수, 완성된 줄)}
+#  판수는 렌더링 때 비교, 닉네임·표시 이름·티어가 바뀌면 이벤트에서 그 사람 줄만 버림 (drop_lines)
+line_cache = defaultdict(dict)
+line_stats = {"hits": 0, "misses": 0}
+
+def drop_lines(guild_id, uid=None):
+    if uid is None:
+        line_cache.pop(guild_id, None)
+    elif guild_id in line_cache:
+        line_cache[guild_id].pop(uid, None)
+    member_changed(str(guild_id), uid)
+
+def drop_nickname_lines(uid_str):
+    uid = int(uid_str)
+    for cache in line_cache.values():
+        cache.pop(uid, None)
+    for gid in list(GUILD_DATA):
+        member_changed(gid, uid)
+
+user_nicknames.on_change = drop_nickname_lines
+
+def member_line(cache, guild, uid, left):
+    c = cache.get(uid)
+    if c is not None and c[0] == left:
+        line_stats["hits"] += 1
+        return c[1]
+    line_stats["misses"] += 1
+    info = MEMBERS.get(guild, uid)
+    tier = info.tier if info else NO_TIER
+    suffix = " (고정)" if left==float('inf') else (f" ({left}판)" if left>1 else (" (1판)" if left==1 else ""))
+    nick = user_nicknames.get(str(uid), "")
+    fmt  = f" / `{nick}`" if nick else ""
+    name = info.display_name if info else f"알수없음({uid})"
+    line = f"{name}{fmt} [{tier}]{suffix}"
+    # 아직 못 찾은 멤버는 캐시하지 않음 (나중에 가져오면 이름이 생김)
+    if info is not None:
+        cache[uid] = (left, line)
+    return line
+
+def build_status_lines(data, guild):
+    # 읽기 전용 스냅샷만 봄 (그리는 도중 액터가 명단을 바꿔도 섞이지 않음)
+    snap  = data["roster"].snapshot()
+    rl    = snap.rounds_left
+    cache = line_cache[guild.id if guild else None]
+    lines = [f"{CUSTOM_EMOJI} 참가자 목록:"]
+    lines += [member_line(cache, guild, uid, rl.get(uid, 0)) for uid in snap.participants] or ["(아직 없음)"]
+    if snap.waitlist:
         lines.append("🔼 대기자:")
-        for uid in waits:
-            m = get_member_fast(guild, uid)
-            tier = get_tier_cached(m)
-            left = rl.get(uid, 0)
-            suffix = " (고정)" if left==float('inf') else (f" ({left}판)" if left>1 else (" (1판)" if left==1 else ""))
-            nick = user_nicknames.get(str(uid), "")
-            fmt  = f" / `{nick}`" if nick else ""
-            name = m.display_name if m else f"알수없음({uid})"
-            lines.append(f"{name}{fmt} [{tier}]{suffix}")
-    return "\n".join(lines)
+        lines += [member_line(cache, guild, uid, rl.get(uid, 0)) for uid in snap.waitlist]
+    # 명단에서 빠진 사람 줄은 가끔 한 번에 정리
+    if len(cache) > 2 * (len(snap.participants) + len(snap.waitlist)) + 64:
+        keep = set(snap.participants) | set(snap.waitlist)
+        for uid in [u for u in cache if u not in keep]:
+            del cache[uid]
+    return lines
+
+def paginate(lines, limit=STATUS_PAGE_CHARS):
+    # 앞에서부터 줄 단위로 채움 → 대기열 끝에 한 줄 붙으면 마지막 페이지만 바뀜
+    pages, cur, size = [], [], 0
+    for line in lines:
+        line = line[:limit]
+        if cur and size + 1 + len(line) > limit:
+            pages.append("\n".join(cur))
+            cur, size = [], 0
+        size += len(line) + (1 if cur else 0)
+        cur.append(line)
+    if cur:
+        pages.append("\n".join(cur))
+    return pages
+
+def build_status_pages(data, guild):
+    return paginate(build_status_lines(data, guild))
 
-async def update_status(gid_str, force=False):
-    data = GUILD_DATA[gid_str]
+def build_participant_text_fast(data, guild):
+    # 백업용 전체 텍스트 (페이지 나누지 않음)
+    return "\n".join(build_status_lines(data, guild))
+
+# ─── 나가는 REST 요청 ──────────────────────────────────────────────────────────
+# 모든 edit/삭제/안내를 한 스케줄러로: 명단 수정 > 공지 > 리액션 정리 > 잠깐 뜨는 안내
+REST = RestScheduler(max_inflight=int(os.getenv("REST_MAX_INFLIGHT", "4")))
+
+def notify(channel, text, delete_after=2):
+    # 잠깐 뜨는 안내 — 가장 낮은 우선순위, 사라질 시간까지 못 보내면 버림
+    # 삭제는 delete_after 대신 EXPIRY 가 채널별로 모아서
+    async def send():
+        msg = await channel.send(text)
+        EXPIRY.schedule(channel.id, msg.id, delete_after)
+        return msg
+    return REST.submit(NOTICE, ("send", channel.id), send, ttl=delete_after)
+
+def announce(channel, text):
+    return REST.submit(ANNOUNCE, ("send", channel.id), lambda: channel.send(text))
+
+def delete_message(channel_id, message_id, priority=CLEANUP):
+    ch = bot.get_channel(channel_id)
+    if not ch or not message_id: return None
+    return REST.submit(priority, ("delete", channel_id), lambda: ch.get_partial_message(message_id).delete(),
+                       key=("delete", message_id))
+
+# bulk-delete 는 14일 넘은 메시지가 하나라도 섞이면 통째로 실패 → 그런 건 하나씩 (1시간 여유)
+BULK_DELETE_MAX_AGE = 14 * 24 * 3600 - 3600
+# 메시지 관리 권한이 없는 채널 — bulk-delete 대신 하나씩 (봇 자기 메시지는 권한 없이도 지워짐)
+no_bulk_channels = set()
+
+def delete_messages(channel_id, message_ids, priority=CLEANUP):
+    # 한 채널의 여러 메시지를 bulk-delete 한 번으로 (100개씩)
+    ch = bot.get_channel(channel_id)
+    if not ch: return
+    cutoff = discord.utils.time_snowflake(datetime.fromtimestamp(time.time() - BULK_DELETE_MAX_AGE))
+    one_by_one = channel_id in no_bulk_channels
+    for m in message_ids:
+        if one_by_one or m < cutoff:
+            delete_message(channel_id, m, priority)
+    if one_by_one:
+        return
+    message_ids = [m for m in message_ids if m >= cutoff]
+
+    async def bulk(chunk):
+        try:
+            await ch.delete_messages([ch.get_partial_message(m) for m in chunk])
+        except discord.Forbidden:
+            log.warning("[삭제] 채널 %s 에 메시지 관리 권한이 없어 하나씩 지웁니다 (%d개)", channel_id, len(chunk))
+            no_bulk_channels.add(channel_id)
+            for m in chunk:
+                delete_message(channel_id, m, priority)
+
+    for i in range(0, len(message_ids), 100):
+        REST.submit(priority, ("delete", channel_id), partial(bulk, message_ids[i:i + 100]))
+
+# 잠깐 뜨는 메시지 자동 삭제 (재시작해도 DB 에 남은 것부터 지움)
+EXPIRY = ExpiryWheel(DB_FILE, delete_messages)
+
+# ─── 지표 ──────────────────────────────────────────────────────────────────────
+# METRICS_PORT 가 있으면 /metrics, METRICS_FILE 이 있으면 METRICS_INTERVAL 초마다 파일로
+METRICS = Registry("sicham_")
+M_REACTIONS = METRICS.counter("reactions_processed_total", "반응 큐에서 처리한 이벤트 수")
+M_BATCH = METRICS.histogram("reaction_batch_size", "소비자가 한 번에 꺼낸 이벤트 수", buckets=(1, 2, 5, 10, 20, 50))
+M_RENDER = METRICS.histogram("status_render_seconds", "명단 텍스트 만드는 데 걸린 시간")
+M_EDITS = METRICS.counter("status_edits_total", "상태 메시지 갱신 시도 (result=edited/unchanged/missing/error)")
+M_REST = METRICS.histogram("rest_seconds", "Discord REST 요청 시간")
+M_SAVE = METRICS.histogram("store_commit_seconds", "저장소 커밋 시간")
+M_SAVE_ROWS = METRICS.counter("store_rows_total", "저장소에 쓴 행 수")
+METRICS.gauge("reaction_queue_depth", "길드별 반응 큐 길이", fn=lambda: {g: q.qsize() for g, q in reaction_queues.items()}, label="gid")
+METRICS.counter("reaction_queue_blocked_total", "큐가 가득 차서 기다린 반응 수", fn=lambda: {g: st["blocked"] for g, st in reaction_stats.items()}, label="gid")
+METRICS.gauge("reaction_queue_max_depth", "반응 큐 최대 길이", fn=lambda: {g: st["max_depth"] for g, st in reaction_stats.items()}, label="gid")
+METRICS.counter("reactions_enqueued_total", "반응 큐에 넣은 이벤트 수", fn=lambda: {g: st["enqueued"] for g, st in reaction_stats.items()}, label="gid")
+METRICS.gauge("rest_queue_depth", "REST 스케줄러 대기 (우선순위별)",
+              fn=lambda: {n: REST.queued(p) for p, n in PRIORITY_NAMES.items()}, label="priority")
+METRICS.gauge("rest_inflight", "보내는 중인 REST 요청", fn=lambda: REST.snapshot()["inflight"])
+METRICS.gauge("expiry_pending", "자동 삭제 대기 메시지", fn=lambda: EXPIRY.pending)
+METRICS.counter("reactions_routed_total", "반응 이벤트 경로별 수 (untracked 는 바로 버린 것)", fn=lambda: reaction_routes, label="route")
+METRICS.counter("messages_routed_total", "on_message 경로별 처리 수", fn=lambda: {r: st["count"] for r, st in message_stats.items()}, label="route")
+METRICS.counter("member_index_hits_total", "멤버 인덱스 적중", fn=lambda: MEMBERS.hits)
+METRICS.counter("member_index_misses_total", "멤버 인덱스 실패", fn=lambda: MEMBERS.misses)
+METRICS.counter("status_line_cache_total", "명단 줄 캐시", fn=lambda: line_stats, label="result")
+METRICS.gauge("member_fetch_cached", "지연 모드로 가져와 둔 멤버 수", fn=MEMBER_FETCH.size)
+METRICS.counter("member_fetch_total", "지연 모드 멤버 가져오기", fn=lambda: MEMBER_FETCH.stats, label="kind")
+REST.observe = lambda kind, prio, secs, outcome: M_REST.observe(secs, kind=kind, priority=prio, result=outcome)
+STORE.on_commit = lambda secs, rows: (M_SAVE.observe(secs), M_SAVE_ROWS.inc(rows))
+metrics_handles = []
+
+# ─── 읽기 전용 명단 API ────────────────────────────────────────────────────────
+# API_PORT 가 있으면 http://API_HOST:API_PORT(+프로세스 번호)/guilds/<gid>/roster (api.py)
+#  메모리의 스냅샷만 읽음 (Discord 요청 없음). ETag = 시작 시각 + 명단 버전 + 이름/닉네임/티어 변경 횟수
+API_BOOT = f"{int(time.time()):x}"
+api_gen = Counter()     # gid → 명단에 있는 사람의 이름/닉네임/티어가 바뀐 횟수
+api_views = {}          # gid → (명단, 키, etag, dict, 텍스트) — 같은 버전이면 다시 만들지 않음
+
+def member_changed(gid, uid=None):
+    # uid 가 None 이면 서버 전체 (역할 변경 등)
+    # 다른 프로세스에서 동기화된 닉네임도 여기로 옴 → 상태 메시지와 API 둘 다 다시 (mark_dirty 가 API.changed 도)
+    data = GUILD_DATA.get(gid)
+    if not data or "roster" not in data or (uid is not None and uid not in data["roster"]):
+        return
+    api_gen[gid] += 1
+    mark_dirty(gid)
+
+def roster_entry(guild, snap, uid):
+    info = MEMBERS.get(guild, uid)
+    left = snap.rounds_left.get(uid, 0)
+    return {
+        "uid": str(uid),
+        "name": info.display_name if info else None,
+        "tier": info.tier if info else NO_TIER,
+        "nickname": user_nicknames.get(str(uid)),
+        "rounds_left": None if left == float('inf') else left,
+        "fixed": left == float('inf'),
+    }
+
+def roster_view(gid):
+    data = GUILD_DATA.get(gid)
+    if not data or "roster" not in data:
+        return None
+    roster = data["roster"]
+    v = api_views.get(gid)
+    if v is not None and v[0] is not roster:
+        # 설정 명령으로 명단을 새로 만들면 버전이 0부터 → ETag 가 겹치지 않게
+        api_gen[gid] += 1
+    snap = roster.snapshot()
+    key = (snap.version, api_gen[gid], bool(data.get("signup_open")), get_current_limit(data))
+    if v is not None and v[1] == key:
+        return v[2:]
+    guild = bot.get_guild(int(gid))
+    body = {
+        "guild_id": gid,
+        "version": snap.version,
+        "signup_open": key[2],
+        "limit": key[3],
+        "participants": [roster_entry(guild, snap, uid) for uid in snap.participants],
+        "waitlist": [roster_entry(guild, snap, uid) for uid in snap.waitlist],
+    }
+    etag = f'"{API_BOOT}-{key[0]}-{key[1]}-{int(key[2])}-{key[3]}"'
+    v = api_views[gid] = (roster, key, etag, body, build_participant_text_fast(data, guild))
+    return v[2:]
+
+API = RosterAPI(roster_view, lambda: list(GUILD_DATA), token=os.getenv("API_TOKEN") or None,
+                min_interval=float(os.getenv("API_SSE_INTERVAL", "0.5")))
+METRICS.counter("api_requests_total", "명단 API 요청 (kind=requests/not_modified/long_polls/sse_sent)",
+                fn=lambda: {k: v for k, v in API.stats.items() if k != "sse_clients"}, label="kind")
+METRICS.gauge("api_sse_clients", "열려 있는 명단 API SSE 연결", fn=lambda: API.stats["sse_clients"])
+
+# ─── 닉네임 미등록 경고 ─────────────────────────────────────────────────────────
+# WARN_WINDOW 동안 모인 사람을 메시지 하나에 멘션, WARN_TTL 뒤 EXPIRY 가 지움
+WARN_WINDOW = float(os.getenv("WARN_WINDOW", "1.0"))
+WARN_TTL = float(os.getenv("WARN_TTL", "5"))
+WARN_MENTIONS = 50      # 메시지 하나에 멘션할 최대 인원 (2000자 제한)
+warn_waiting = defaultdict(set)     # gid → 아직 안 보낸 uid
+warn_tasks = {}
+warned_until = {}                   # uid → 이 시각까지는 다시 멘션 안 함
+
+def warn_unregistered(gid, uid):
+    if warned_until.get(uid, 0) > time.monotonic():
+        return
+    warn_waiting[gid].add(uid)
+    if gid not in warn_tasks or warn_tasks[gid].done():
+        warn_tasks[gid] = asyncio.create_task(warn_flusher(gid))
+
+def clear_warning(uid):
+    # 닉네임 등록하면 아직 안 나간 경고에서 뺌
+    for waiting in warn_waiting.values():
+        waiting.discard(uid)
+    warned_until.pop(uid, None)
+
+async def warn_flusher(gid):
+    # 보내는 동안 들어온 사람은 다음 창에서 (이 태스크가 아직 안 끝났으니 새로 안 만들어짐)
+    while warn_waiting.get(gid):
+        await asyncio.sleep(WARN_WINDOW)
+        uids = sorted(u for u in warn_waiting.pop(gid, ()) if u not in user_nicknames)
+        data = GUILD_DATA.get(gid)
+        ch = bot.get_channel(data["viewer_channel_id"]) if data else None
+        if not uids or not ch:
+            continue
+        now = time.monotonic()
+        for u in [u for u, t in warned_until.items() if t <= now]:
+            del warned_until[u]
+        for u in uids:
+            warned_until[u] = now + WARN_TTL
+        for i in range(0, len(uids), WARN_MENTIONS):
+            text = " ".join(f"<@{u}>" for u in uids[i:i + WARN_MENTIONS]) + " ⚠️ 발로닉네임 등록해주세요! (이 채널에 닉네임#태그 입력)"
+            try:
+                msg = await REST.submit(NOTICE, ("send", ch.id), lambda text=text: ch.send(text), ttl=WARN_TTL)
+            except discord.HTTPException:
+                continue
+            if msg:
+                EXPIRY.schedule(ch.id, msg.id, WARN_TTL)
+
+# ─── 상태 메시지 렌더 스케줄러 ─────────────────────────────────────────────────
+# 변경 시 dirty 표시만 하고, 길드별로 STATUS_EDIT_WINDOW 초에 최대 1번만 edit
+STATUS_EDIT_WINDOW = float(os.getenv("STATUS_EDIT_WINDOW", "1.5"))
+STATUS_RETRIES = 3
+status_dirty = set()
+status_tasks = {}
+status_forced = set()                   # 다음 flush 는 해시 무시하고 전부 edit
+status_waiters = defaultdict(list)      # gid -> 다음 flush 가 끝나길 기다리는 future
+status_hashes = {}   # gid -> {페이지 메시지 id: 마지막으로 올린 텍스트 해시}
+
+def mark_dirty(gid_str):
+    API.changed(gid_str)
+    status_dirty.add(gid_str)
+    t = status_tasks.get(gid_str)
+    if t is None or t.done():
+        status_tasks[gid_str] = asyncio.create_task(status_flusher(gid_str))
+
+async def status_flusher(gid_str):
+    # 첫 변경은 바로 반영, 이후 창 안에 들어온 변경은 한 번으로 묶음
+    # 실패하면 (HTTP 오류, 채널 없음 등) 다음 창에서 다시 — STATUS_RETRIES 번 연달아 실패하면 다음 변경까지 쉼
+    # flush_status 는 여기서만 → 길드마다 한 번에 하나 (겹치면 추가 페이지가 두 번 생김)
+    failures = 0
+    while gid_str in status_dirty:
+        status_dirty.discard(gid_str)
+        force = gid_str in status_forced
+        status_forced.discard(gid_str)
+        waiters = status_waiters.pop(gid_str, [])
+        try:
+            await flush_status(gid_str, force=force)
+            failures = 0
+        except Exception:
+            failures += 1
+            log.exception("상태 메시지 갱신 실패 gid=%s (%d번째)", gid_str, failures)
+            if failures < STATUS_RETRIES:
+                status_dirty.add(gid_str)
+        finally:
+            for fut in waiters:
+                if not fut.done():
+                    fut.set_result(None)
+        await asyncio.sleep(STATUS_EDIT_WINDOW)
+
+def status_page_ids(data):
+    # 첫 페이지는 viewer_status_msg_id, 넘치는 대기열은 status_page_ids 에 이어서
+    return [data["viewer_status_msg_id"], *data.get("status_page_ids", [])]
+
+def drop_status_pages(gid_str):
+    # 상태 메시지를 새로 만들 때 (등록/일반시참/모드변경) 예전 추가 페이지 정리
+    data = GUILD_DATA.get(gid_str)
+    extra = data.pop("status_page_ids", None) if data else None
+    status_hashes.pop(gid_str, None)
+    if extra:
+        delete_messages(data["viewer_channel_id"], extra)
+
+async def flush_status(gid_str, force=False):
+    data = GUILD_DATA.get(gid_str)
+    if not data:
+        return
+    save_data()
+    guild = bot.get_guild(int(gid_str))
+    await ensure_members(data, guild)
+    with M_RENDER.time():
+        pages = build_status_pages(data, guild)
     ch = bot.get_channel(data["viewer_channel_id"])
     if not ch:
-        print(f"[DEBUG] update_status: 채널 없음 (gid={gid_str})")
+        M_EDITS.inc(result="missing")
+        log.debug("update_status: 채널 없음 gid=%s", gid_str)
+        return
+    ids = status_page_ids(data)
+    hashes = status_hashes.setdefault(gid_str, {})
+
+    # 내용이 바뀐 페이지만 edit (PartialMessage 라 fetch 없음, 대기 중인 같은 페이지 edit 은 덮어씀)
+    edits = []
+    for mid, text in zip(ids, pages):
+        h = hash(text)
+        if not force and hashes.get(mid) == h:
+            M_EDITS.inc(result="unchanged")
+            continue
+        fut = REST.submit(ROSTER, ("edit", ch.id), lambda mid=mid, text=text: ch.get_partial_message(mid).edit(content=text),
+                          key=("status", mid))
+        edits.append((mid, h, fut))
+    results = await asyncio.gather(*(f for _, _, f in edits), return_exceptions=True)
+    lost = []
+    for (mid, h, _), r in zip(edits, results):
+        if isinstance(r, discord.NotFound):
+            hashes.pop(mid, None)
+            M_EDITS.inc(result="missing")
+            lost.append(mid)
+        elif isinstance(r, Exception):
+            M_EDITS.inc(result="error")
+            log.warning("update_status 오류 gid=%s msg=%s: %r", gid_str, mid, r)
+        else:
+            hashes[mid] = h
+            M_EDITS.inc(result="edited")
+    if data["viewer_status_msg_id"] in lost:
+        log.debug("update_status: 메시지 없음 gid=%s → 무시", gid_str)
         return
 
-    try:
-        # ✅ 항상 최신 메시지 다시 가져오기 (모드변경 이후 캐시된 객체 무효화 방지)
-        msg = await ch.fetch_message(data["viewer_status_msg_id"])
-        new_text = build_participant_text_fast(data, msg.guild)
-
-        await msg.edit(content=new_text)
+    # 누가 지운 추가 페이지는 빼고, 모자란 페이지는 새로 보내고, 남는 페이지는 지움
+    extra = [mid for mid in ids[1:] if mid not in lost]
+    changed = len(extra) != len(ids) - 1
+    for text in pages[1 + len(extra):]:
+        try:
+            msg = await REST.submit(ROSTER, ("send", ch.id), lambda text=text: ch.send(text))
+        except discord.HTTPException:
+            log.warning("상태 페이지 추가 실패 gid=%s", gid_str, exc_info=True)
+            break
+        extra.append(msg.id)
+        hashes[msg.id] = hash(text)
+        changed = True
+    surplus = extra[len(pages) - 1:]
+    if surplus:
+        extra = extra[:len(pages) - 1]
+        for mid in surplus:
+            hashes.pop(mid, None)
+        delete_messages(ch.id, surplus)
+        changed = True
+    if changed:
+        if extra:
+            data["status_page_ids"] = extra
+        else:
+            data.pop("status_page_ids", None)
+        index_routes()
         save_data()
-        print(f"[DEBUG] update_status 완료: {gid_str}")
+    log.debug("update_status 완료 gid=%s pages=%d edits=%d", gid_str, len(pages), len(edits))
 
-    except discord.errors.NotFound:
-        print(f"[DEBUG] update_status: 메시지 없음 (gid={gid_str}) → 무시")
-    except Exception as e:
-        print(f"[DEBUG] update_status 오류: {e}")
+async def update_status(gid_str, force=False):
+    # force: 해시 무시하고 전부 다시 edit, 그 flush 가 끝날 때까지 기다림 (flusher 를 거침)
+    if force:
+        fut = asyncio.get_running_loop().create_future()
+        status_waiters[gid_str].append(fut)
+        status_forced.add(gid_str)
+        mark_dirty(gid_str)
+        await fut
+    else:
+        mark_dirty(gid_str)
 
 async def adjust_current_participants(gid_str, new_limit):
-    data = GUILD_DATA[gid_str]
-    parts, waits = data["participants"], data["waitlist"]
-    while len(parts) > new_limit:
-        u = parts.pop(); waits.insert(0, u)
-    while len(parts) < new_limit and waits:
-        parts.append(waits.pop(0))
+    await mutate(gid_str, lambda: GUILD_DATA[gid_str]["roster"].resize(new_limit))
     await update_status(gid_str)
 
-def write_backup(path, text):
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(text)
+# ─── 길드 액터 (반응 이벤트 + 명단 변경) ───────────────────────────────────────
+# on_raw_reaction_add → 길드별 asyncio.Queue → 길드별 소비자 태스크 (비어 있으면 대기만 함)
+# 관리자 명령/멤버 이벤트의 명단 변경도 mutate() 로 같은 큐에 → 길드마다 한 곳에서 순서대로 적용 (락 없음)
+# 렌더링/백업/저장은 Roster.snapshot() (버전 붙은 읽기 전용 사본) 만 읽음
+REACTION_QUEUE_MAX = int(os.getenv("REACTION_QUEUE_MAX", "1000"))
+REACTION_BATCH = 50
+reaction_queues = {}
+reaction_workers = {}
+reaction_stats = defaultdict(lambda: {"enqueued": 0, "processed": 0, "batches": 0, "blocked": 0, "max_depth": 0})
+
+def get_reaction_queue(gid):
+    q = reaction_queues.get(gid)
+    if q is None:
+        q = reaction_queues[gid] = asyncio.Queue(maxsize=REACTION_QUEUE_MAX)
+    w = reaction_workers.get(gid)
+    if w is None or w.done():
+        reaction_workers[gid] = asyncio.create_task(reaction_consumer(gid, q))
+    return q
+
+async def enqueue_reaction(gid, etype, payload):
+    q = get_reaction_queue(gid)
+    st = reaction_stats[gid]
+    if q.full():
+        # 큐가 가득 차면 이벤트 핸들러가 자리 날 때까지 대기 (backpressure)
+        st["blocked"] += 1
+    await q.put((etype, payload))
+    st["enqueued"] += 1
+    st["max_depth"] = max(st["max_depth"], q.qsize())
+
+async def mutate(gid, fn):
+    # fn: await 없는 함수 — 액터가 차례가 되면 실행하고 그 결과를 돌려줌
+    fut = asyncio.get_running_loop().create_future()
+    await get_reaction_queue(gid).put(("call", (fn, fut)))
+    return await fut
+
+def clear_reaction_queue(gid):
+    # 쌓인 반응만 버림 (기다리는 명령은 다시 넣음)
+    q = reaction_queues.get(gid)
+    calls = []
+    while q is not None and not q.empty():
+        item = q.get_nowait()
+        if item[0] == "call":
+            calls.append(item)
+    for item in calls:
+        q.put_nowait(item)
+
+async def reaction_consumer(gid, q):
+    while True:
+        batch = [await q.get()]
+        while len(batch) < REACTION_BATCH and not q.empty():
+            batch.append(q.get_nowait())
+        # 반응은 모아서 한 번에, 명령은 그 사이에 들어온 순서대로
+        run = []
+        for etype, payload in batch:
+            if etype != "call":
+                run.append((etype, payload))
+                continue
+            await run_reactions(gid, run)
+            run = []
+            fn, fut = payload
+            try:
+                result = fn()
+            except Exception as e:
+                if not fut.done(): fut.set_exception(e)
+            else:
+                if not fut.done(): fut.set_result(result)
+        await run_reactions(gid, run)
+
+async def run_reactions(gid, batch):
+    if not batch:
+        return
+    st = reaction_stats[gid]
+    st["batches"] += 1
+    st["processed"] += len(batch)
+    M_REACTIONS.inc(len(batch))
+    M_BATCH.observe(len(batch))
+    try:
+        await apply_reactions(gid, batch)
+    except Exception:
+        log.exception("반응 처리 실패 gid=%s", gid)
+
+async def apply_reactions(gid, batch):
+    # ✅ GUILD_DATA 자동 복구 (모드변경 직후 즉시 반응 큐 처리 시 None 방지)
+    if gid not in GUILD_DATA:
+        log.debug("apply_reactions: 데이터 없음 gid=%s → 스킵", gid)
+        return
+    if not GUILD_DATA[gid].get("viewer_msg_id"):
+        log.debug("apply_reactions: viewer_msg_id 없음 gid=%s → 스킵", gid)
+        return
+
+    data = GUILD_DATA.get(gid)
+    if not data:
+        return
+
+    guild = bot.get_guild(int(gid))
+    roster = data["roster"]
+    status_changed = False
 
-@tasks.loop(seconds=0.2)
-async def process_reactions():
-    for gid, q in list(reaction_queues.items()):
-        if not q:
+    for etype, payload in batch:
+
+        # 시청자 이모지 메시지에서만 작동
+        if payload.message_id != data["viewer_msg_id"]:
             continue
 
-        # ✅ GUILD_DATA 자동 복구 (모드변경 직후 즉시 반응 큐 처리 시 None 방지)
-        if gid not in GUILD_DATA:
-            print(f"[DEBUG] process_reactions: {gid} 데이터 없음 → 스킵")
+        info = MEMBERS.get(guild, payload.user_id)
+        if not info:
             continue
-        if not GUILD_DATA[gid].get("viewer_msg_id"):
-            print(f"[DEBUG] process_reactions: viewer_msg_id 없음 → 스킵")
+
+        emo = str(payload.emoji)
+
+        # 일반 참가
+        if etype == "add" and emo in ["3️⃣", "2️⃣", "1️⃣"]:
+            if not data.get("signup_open", False):
+                continue
+            uid = payload.user_id
+            if uid in roster:
+                continue
+            roster.join(uid, LABEL[emo], get_current_limit(data))
+            status_changed = True
             continue
 
-        async with guild_locks[gid]:
-            data = GUILD_DATA.get(gid)
-            if not data:
-                q.clear()
+        # 고정권 참가
+        if etype == "add" and emo == "❤️":
+            if not data.get("signup_open", False):
                 continue
+            if not info.fixed:
+                continue
+            roster.join(payload.user_id, float("inf"), get_current_limit(data))
+            status_changed = True
+            continue
+
+        # 대기자 삭제(🗑️)
+        if etype == "add" and emo == EMOJI_DELETE:
+            uid = payload.user_id
+            if uid in roster.waitlist:
+                roster.remove(uid)
+                # 리액션 정리는 락 밖 백그라운드 작업자에게
+                for e in [*LABEL.keys(), EMOJI_DELETE]:
+                    queue_reaction_removal(data["viewer_channel_id"], data["viewer_msg_id"], e, uid)
+                status_changed = True
+            continue
 
-            guild = bot.get_guild(int(gid))
-            status_changed = False
-
-            while q:
-                etype, payload = q.popleft()
-
-                # 시청자 이모지 메시지에서만 작동
-                if payload.message_id != data["viewer_msg_id"]:
-                    continue
-
-                member = get_member_fast(guild, payload.user_id)
-                if not member:
-                    continue
-
-                emo = str(payload.emoji)
-
-                # 일반 참가
-                if etype == "add" and emo in ["3️⃣", "2️⃣", "1️⃣"]:
-                    if not data.get("signup_open", False):
-                        continue
-                    uid = payload.user_id
-                    parts, waits = data["participants"], data["waitlist"]
-                    if uid in parts or uid in waits:
-                        continue
-                    limit = get_current_limit(data)
-                    (parts if len(parts) < limit else waits).append(uid)
-                    data.setdefault("rounds_left", {})[uid] = LABEL[emo]
-                    status_changed = True
-                    continue
-
-                # 고정권 참가
-                if etype == "add" and emo == "❤️":
-                    if not data.get("signup_open", False):
-                        continue
-                    if "고정룰렛권" not in [r.name for r in member.roles]:
-                        continue
-                    uid = payload.user_id
-                    parts, waits = data["participants"], data["waitlist"]
-                    if uid not in parts and uid not in waits:
-                        (parts if len(parts) < get_current_limit(data) else waits).append(uid)
-                    data["rounds_left"][uid] = float("inf")
-                    status_changed = True
-                    continue
-
-                # 대기자 삭제(🗑️)
-                if etype == "add" and emo == EMOJI_DELETE:
-                    uid = payload.user_id
-                    if uid in data["waitlist"]:
-                        data["waitlist"].remove(uid)
-                        data["rounds_left"].pop(uid, None)
-                        for msg_id in [data["viewer_msg_id"], data["viewer_status_msg_id"]]:
-                            try:
-                                tgt = await bot.get_channel(data["viewer_channel_id"]).fetch_message(msg_id)
-                                mem = get_member_fast(guild, uid)
-                                for e in [*LABEL.keys(), EMOJI_DELETE]:
-                                    await tgt.remove_reaction(e, mem)
-                            except:
-                                pass
-                        status_changed = True
-                    continue
-
-            if status_changed:
-                await update_status(gid)
+    if status_changed:
+        await update_status(gid)
 
 
+# ─── 리액션 정리 ───────────────────────────────────────────────────────────────
+# 한 명씩 지워야 하는 리액션은 REST 스케줄러의 정리(CLEANUP) 우선순위로 — 길드 락 밖에서 처리
+def queue_reaction_removal(channel_id, message_id, emoji, uid):
+    ch = bot.get_channel(channel_id)
+    if not ch: return None
+    # fetch 없이 PartialMessage 로 바로 삭제
+    return REST.submit(CLEANUP, ("reaction", channel_id),
+                       lambda: ch.get_partial_message(message_id).remove_reaction(emoji, discord.Object(id=uid)),
+                       key=("unreact", message_id, str(emoji), uid))
+
+def viewer_emojis(data):
+    # 시청자 메시지에 봇이 달아두는 이모지 (일반시참 / 등록 모드)
+    if data.get("max_participants") == 4:
+        return ["1️⃣", EMOJI_DELETE]
+    return ["1️⃣", "2️⃣", "3️⃣", "❤️", EMOJI_DELETE]
+
 async def background_add_reaction(gid):
     data = GUILD_DATA.get(gid)
     if not data: return
@@ -272,216 +766,310 @@ async def background_add_reaction(gid):
     except:
         pass
 
-@tasks.loop(seconds=10)
-async def auto_update_status():
-    for gid, data in GUILD_DATA.items():
-        try:
-            await update_status(gid)
-        except:
-            logging.exception("자동 새로고침 실패")
-
-async def append_backup(guild_id_str, data):
-    path = os.path.join(BACKUP_DIR, f"backup_{guild_id_str}.txt")
-    text = build_participant_text_fast(data, bot.get_guild(int(guild_id_str)))
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(f"\n====== {datetime.now():%Y-%m-%d %H:%M:%S} ======\n{text}\n")
-
-@tasks.loop(seconds=10)  # 60초마다 백업, 180으로 바꾸면 3분마다
+async def backup_guild(gid, force=False):
+    data = GUILD_DATA.get(gid)
+    if not data: return False
+    guild = bot.get_guild(int(gid))
+    await ensure_members(data, guild)
+    text = build_participant_text_fast(data, guild)
+    return await BACKUPS.snapshot(gid, text, force=force)
+
+# ─── 팀 나누기 ─────────────────────────────────────────────────────────────────
+# 참가자를 티어 가중치 합이 가장 비슷한 2팀으로 (파티는 같은 팀), 결과는 시청자 채널에 공지
+async def post_teams(gid):
+    data = GUILD_DATA.get(gid)
+    if not data: return None
+    guild = bot.get_guild(int(gid))
+    await ensure_members(data, guild)
+    infos = {uid: MEMBERS.get(guild, uid) for uid in data["roster"].snapshot().participants}
+    weights = {uid: TIER_WEIGHT.get(info.tier, NO_TIER_WEIGHT) if info else NO_TIER_WEIGHT for uid, info in infos.items()}
+    if len(weights) < 2: return None
+    split = split_teams(weights, data.get("team_parties") or ())
+    def line(team):
+        return ", ".join(f"{infos[u].display_name if infos[u] else u} [{infos[u].tier if infos[u] else NO_TIER}]" for u in team)
+    text = (f"{EMOJI_TEAMS} 팀 나누기 (티어 합 {split.sum_a} : {split.sum_b})\n"
+            f"🅰️ {line(split.team_a)}\n🅱️ {line(split.team_b)}")
+    if data.get("last_team_msg_id"):
+        delete_message(data["viewer_channel_id"], data["last_team_msg_id"], ANNOUNCE)
+    msg = await announce(bot.get_channel(data["viewer_channel_id"]), text[:1990])
+    data["last_team_msg_id"] = msg.id; save_data()
+    return split
+
+@tasks.loop(seconds=BACKUP_INTERVAL)
 async def periodic_backup():
-    for gid, data in GUILD_DATA.items():
-        path = os.path.join(BACKUP_DIR, f"backup_{gid}.txt")
-        text = build_participant_text_fast(data, bot.get_guild(int(gid)))
-        # 파일 입출력은 blocking이므로 to_thread로 분리 (안 해도 되지만 더 안전)
-        await asyncio.to_thread(
-            lambda: open(path, "a", encoding="utf-8").write(
-                f"\n====== {datetime.now():%Y-%m-%d %H:%M:%S} ======\n{text}\n"
-            )
-        )
+    for gid in list(GUILD_DATA):
+        try:
+            await backup_guild(gid)
+        except Exception:
+            log.exception("자동 백업 실패")
 
 @bot.event
 async def on_ready():
-    logging.info(f"❤️ 봇 온라인: {bot.user}")
+    log.info("❤️ 봇 온라인: %s", bot.user)
 
     # 🔧 중복 실행 방지 (재가동 시 task 중복 실행 문제 해결)
-    if process_reactions.is_running():
-        process_reactions.cancel()
-    if auto_update_status.is_running():
-        auto_update_status.cancel()
     if periodic_backup.is_running():
         periodic_backup.cancel()
 
     # ✅ 태스크 재시작
-    process_reactions.start()
-    auto_update_status.start()
     periodic_backup.start()
 
-    # ✅ 데이터 복구
-    load_data()
-    print("데이터 복구 완료!")
+    # ✅ 데이터 복구 (재연결 때 on_ready 가 또 불려도 메모리 상태는 유지)
+    if not STORE.loaded:
+        load_data()
+        EXPIRY.load(keep=(lambda cid: bot.get_channel(cid) is not None) if SHARDS.sharded else None).start()
+        log.info("데이터 복구 완료 (서버 %d개)", len(GUILD_DATA))
+    # 다른 프로세스에서 등록한 닉네임 가져오기
+    global nickname_sync_task
+    if SHARDS.sharded and (nickname_sync_task is None or nickname_sync_task.done()):
+        nickname_sync_task = asyncio.create_task(user_nicknames.sync_forever(NICKNAME_SYNC_INTERVAL))
+        log.info("[샤딩] %s — 서버 %d개 담당", SHARDS, len(GUILD_DATA))
 
     # ✅ 봇 상태 로그
     for gid, data in GUILD_DATA.items():
         ch = bot.get_channel(data.get("viewer_channel_id"))
         if ch:
-            print(f"[복구됨] 서버ID {gid}, 채널: {ch.name}")
+            log.info("[복구됨] 서버ID %s, 채널: %s", gid, ch.name)
         else:
-            print(f"[주의] 서버ID {gid}의 채널을 찾을 수 없음")
-
-    print("🟢 봇이 완전히 온라인 상태입니다!")
+            log.warning("[주의] 서버ID %s의 채널을 찾을 수 없음", gid)
+        mark_dirty(gid)
+
+    # 지표 내보내기 (한 번만)
+    if not metrics_handles:
+        if os.getenv("METRICS_PORT"):
+            metrics_handles.append(await METRICS.serve(os.getenv("METRICS_HOST", "127.0.0.1"), int(os.getenv("METRICS_PORT"))))
+        if os.getenv("METRICS_FILE"):
+            metrics_handles.append(asyncio.create_task(
+                METRICS.dump_forever(os.getenv("METRICS_FILE"), float(os.getenv("METRICS_INTERVAL", "30")))))
+        if os.getenv("API_PORT"):
+            # 여러 프로세스면 프로세스 번호만큼 포트를 밀어서
+            metrics_handles.append(await API.serve(os.getenv("API_HOST", "127.0.0.1"), int(os.getenv("API_PORT")) + SHARDS.worker))
+
+    log.info("🟢 봇이 완전히 온라인 상태입니다!")
+
+# ─── 메시지/채널 라우팅 인덱스 ───────────────────────────────────────────────────
+# 메시지 id → (gid, 역할). 여기 없는 메시지의 반응은 멤버 조회/REST 없이 바로 버림
+TRACKED_MESSAGES = {}
+VIEWER_CHANNELS = {}    # 시참 채널 id → gid (on_message 닉네임 등록용)
+ROUTE_KEYS = (("viewer_msg_id", "viewer"), ("admin_msg_id", "admin"), ("viewer_status_msg_id", "status"))
+reaction_routes = Counter()
+
+def index_routes():
+    # 등록/관리자/일반시참/모드변경/불러오기 때만 다시 만듦
+    TRACKED_MESSAGES.clear()
+    VIEWER_CHANNELS.clear()
+    for gid, data in GUILD_DATA.items():
+        for k, role in ROUTE_KEYS:
+            if data.get(k):
+                TRACKED_MESSAGES[data[k]] = (gid, role)
+        for mid in data.get("status_page_ids", ()):
+            TRACKED_MESSAGES[mid] = (gid, "status")
+        if data.get("viewer_channel_id"):
+            VIEWER_CHANNELS[data["viewer_channel_id"]] = gid
 
 @bot.event
 async def on_raw_reaction_add(payload):
-    if payload.user_id==bot.user.id: return
-    key = str(payload.guild_id)
+    route = TRACKED_MESSAGES.get(payload.message_id)
+    if route is None:
+        reaction_routes["untracked"] += 1
+        return
+    key, role = route
+    reaction_routes[role] += 1
+    if role == "status" or payload.user_id == bot.user.id: return
     data = GUILD_DATA.get(key)
     guild = bot.get_guild(payload.guild_id)
-    member = guild.get_member(payload.user_id) if guild else None
-    if not member: return
+    # 반응 추가 이벤트에는 Member 가 같이 옴 → 지연 모드에선 이걸 캐시에
+    member = payload.member or (get_member(guild, payload.user_id) if guild else None)
+    if not data or not member: return
+    if LAZY_MEMBERS and payload.member is not None:
+        MEMBER_FETCH.put(member)
+        member_refreshed(member)
     # 시청자 메시지: 닉네임 등록 검사 및 참가 이모지
-    if data and payload.message_id==data.get("viewer_msg_id") and str(payload.emoji) in LABEL:
+    if role == "viewer" and str(payload.emoji) in LABEL:
         if not member.guild_permissions.administrator and str(payload.user_id) not in user_nicknames:
-            await remove_reaction(payload, str(payload.emoji))
-            ch = bot.get_channel(data["viewer_channel_id"])
-            warn = await ch.send(f"{member.mention} ⚠️ 발로닉네임 등록해주세요!", delete_after=2)
-            if payload.user_id in pending_warnings:
-                cid, mid = pending_warnings[payload.user_id]
-                try: await bot.get_channel(cid).fetch_message(mid).delete()
-                except: pass
-            pending_warnings[payload.user_id] = (ch.id, warn.id)
+            remove_reaction(payload, str(payload.emoji))
+            warn_unregistered(key, payload.user_id)
             return
     # === 관리자 메시지 ===
-    if data and payload.message_id==data.get("admin_msg_id") and member.guild_permissions.administrator:
+    if role == "admin" and member.guild_permissions.administrator:
         # 시참시작
         if str(payload.emoji)==EMOJI_OPEN:
-            await remove_reaction(payload, EMOJI_OPEN)
-            data["signup_open"]=True
+            remove_reaction(payload, EMOJI_OPEN)
+            data["signup_open"]=True; save_data()
             ch=bot.get_channel(data["viewer_channel_id"])
-            await ch.send("🟢 시참이 시작되었습니다!", delete_after=2)
+            notify(ch, "🟢 시참이 시작되었습니다!", 2)
             return
         # 시참마감
         if str(payload.emoji)==EMOJI_CLOSE:
-            await remove_reaction(payload, EMOJI_CLOSE)
-            data["signup_open"]=False
+            remove_reaction(payload, EMOJI_CLOSE)
+            data["signup_open"]=False; save_data()
             ch=bot.get_channel(data["viewer_channel_id"])
-            await ch.send("🔴 시참이 마감되었습니다!", delete_after=2)
+            notify(ch, "🔴 시참이 마감되었습니다!", 2)
             return
         # 로테이션
         if str(payload.emoji)==EMOJI_ROTATE:
-            await remove_reaction(payload, EMOJI_ROTATE)
-            # === 이전 상태 백업 ===
-            data["prev_participants"] = data["participants"].copy()
-            data["prev_waitlist"] = data["waitlist"].copy()
-            data["prev_rounds_left"] = data["rounds_left"].copy()
-            # 기존 로테이션 코드 유지
-            old = data["participants"].copy(); new = []
-            rl = data["rounds_left"]
-            for uid in old:
-                left = rl.get(uid, 0)
-                if left==float('inf') or left>1:
-                    if left>1: rl[uid] = left-1
-                    new.append(uid)
-            data["participants"] = new
-            while len(new)<get_current_limit(data) and data["waitlist"]:
-                new.append(data["waitlist"].pop(0))
+            remove_reaction(payload, EMOJI_ROTATE)
+            # === 바뀐 부분만 기록 (되돌리기/다시하기용) ===
+            def rotate():
+                cur = GUILD_DATA[key]
+                limit = get_current_limit(cur)
+                _, undo = cur["roster"].rotate_undoable(limit)
+                HISTORY.record(key, str(payload.user_id), limit, undo)
+            await mutate(key, rotate)
             await update_status(key)
             return
         # 랜덤맵
         if str(payload.emoji)==EMOJI_RANDOM_MAP:
-            await remove_reaction(payload, EMOJI_RANDOM_MAP)
+            remove_reaction(payload, EMOJI_RANDOM_MAP)
             if data.get("last_map_msg_id"):
-                try:
-                    old=await bot.get_channel(data["viewer_channel_id"]).fetch_message(data["last_map_msg_id"])
-                    await old.delete()
-                except: pass
+                delete_message(data["viewer_channel_id"], data["last_map_msg_id"], ANNOUNCE)
             chosen=random.choice(MAP_LIST)
-            msg=await bot.get_channel(data["viewer_channel_id"]).send(f"🎲 이번 내전 맵은 **{chosen}**!")
-            data["last_map_msg_id"]=msg.id
-            return
-    # === 시청자 메시지 이모지(참가/대기자 관련) ===
-    # ✅ 모드변경 직후 새 메시지 ID 싱크 오류 보정 + 디버그 로그 추가
-    if data and str(payload.emoji) in (*LABEL.keys(), EMOJI_DELETE):
-        viewer_id = data.get("viewer_msg_id")
-
-        print(f"[DEBUG] REACT EVENT 감지: emoji={payload.emoji}, msg_id={payload.message_id}, viewer_id={viewer_id}")
-
-        # 정상적인 경우
-        if payload.message_id == viewer_id:
-            print(f"[DEBUG] 정상 일치 → 큐 등록")
-            reaction_queues[str(key)].append(("add", payload))
+            try:
+                msg=await announce(bot.get_channel(data["viewer_channel_id"]), f"🎲 이번 내전 맵은 **{chosen}**!")
+            except: return
+            data["last_map_msg_id"]=msg.id; save_data()
             return
-        else:
-            # 모드변경 직후 ID 불일치 시 같은 채널의 viewer 메시지면 허용
-            ch = bot.get_channel(data["viewer_channel_id"])
+        # 팀 나누기
+        if str(payload.emoji)==EMOJI_TEAMS:
+            remove_reaction(payload, EMOJI_TEAMS)
             try:
-                latest_msg = await ch.fetch_message(viewer_id)
-                print(f"[DEBUG] 불일치 감지: payload={payload.message_id}, 최신 viewer={latest_msg.id}")
-                if payload.message_id == latest_msg.id:
-                    print(f"[DEBUG] 강제 싱크 → 큐 등록 완료")
-                    reaction_queues[str(key)].append(("add", payload))
-                    return
-            except Exception as e:
-                print(f"[DEBUG] 강제 싱크 실패: {e}")
-                pass
+                await post_teams(key)
+            except Exception:
+                log.exception("팀 나누기 실패 gid=%s", key)
+            return
+    # === 시청자 메시지 이모지(참가/대기자 관련) ===
+    # 모드변경으로 메시지가 바뀌면 index_routes() 가 새 id 를 올리므로 다시 불러올 필요 없음
+    if role == "viewer" and str(payload.emoji) in (*LABEL.keys(), EMOJI_DELETE):
+        await enqueue_reaction(key, "add", payload)
 
 @bot.event
 async def on_raw_reaction_remove(payload):
     return
 
-async def remove_reaction(payload, emoji):
-    ch = bot.get_channel(payload.channel_id)
-    if not ch: return
-    try:
-        msg = await ch.fetch_message(payload.message_id)
-    except:
-        return
-    member = ch.guild.get_member(payload.user_id)
-    if not member: return
-    try:
-        await msg.remove_reaction(emoji, member)
-    except:
-        pass
+def remove_reaction(payload, emoji):
+    return queue_reaction_removal(payload.channel_id, payload.message_id, emoji, payload.user_id)
+
+@bot.event
+async def on_member_update(before, after):
+    NAMES.update(after)
+    drop_lines(after.guild.id, after.id)
+    # 닉네임/역할 바뀐 멤버가 명단에 있으면 다시 그림
+    if MEMBERS.update(after):
+        data=GUILD_DATA.get(str(after.guild.id))
+        if data and after.id in data["roster"]:
+            mark_dirty(str(after.guild.id))
+
+@bot.event
+async def on_member_join(member):
+    NAMES.update(member)
+
+@bot.event
+async def on_user_update(before, after):
+    # 전역 이름이 바뀌면 표시 이름도 바뀜
+    for guild in after.mutual_guilds:
+        member=get_member(guild, after.id)
+        if member:
+            await on_member_update(member, member)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    # 티어/고정룰렛권 역할 이름이 바뀌면 그 서버 인덱스 전체 무효화
+    if before.name!=after.name and (MEMBERS.watches(before.name) or MEMBERS.watches(after.name)):
+        MEMBERS.invalidate_guild(after.guild.id)
+        drop_lines(after.guild.id)
+        if str(after.guild.id) in GUILD_DATA:
+            mark_dirty(str(after.guild.id))
+
+@bot.event
+async def on_guild_role_delete(role):
+    if MEMBERS.watches(role.name):
+        MEMBERS.invalidate_guild(role.guild.id)
+        drop_lines(role.guild.id)
+        if str(role.guild.id) in GUILD_DATA:
+            mark_dirty(str(role.guild.id))
 
 @bot.event
 async def on_member_remove(member):
+    MEMBERS.evict(member.guild.id, member.id)
+    MEMBER_FETCH.evict(member.guild.id, member.id)
+    drop_lines(member.guild.id, member.id)
+    NAMES.remove(member.guild.id, member.id)
     key=str(member.guild.id)
     data=GUILD_DATA.get(key)
     if not data: return
-    uid=member.id; parts, waits=data["participants"], data["waitlist"]
-    removed=False
-    if uid in parts:
-        parts.remove(uid); data["rounds_left"].pop(uid,None); removed=True
-    if uid in waits:
-        waits.remove(uid); data["rounds_left"].pop(uid,None); removed=True
-    if removed:
-        while len(parts)<get_current_limit(data) and waits:
-            parts.append(waits.pop(0))
+    def leave():
+        cur=GUILD_DATA[key]; roster=cur["roster"]
+        if not roster.remove(member.id): return False
+        roster.fill(get_current_limit(cur))
+        return True
+    if await mutate(key, leave):
         await update_status(key)
 
+# ─── 메시지 라우터 ───────────────────────────────────────────────────────────────
+# 잡담 채널 메시지는 O(1) 로 버리고, 닉네임 등록은 시참 채널에서만, "!" 로 시작하는 것만 명령 처리
+message_stats = defaultdict(lambda: {"count": 0, "seconds": 0.0})
+
+def count_route(route, t0):
+    st = message_stats[route]
+    st["count"] += 1
+    st["seconds"] += time.perf_counter() - t0
+
+async def route_nickname(message, c):
+    if "#" not in c or len(c) < 3 or str(message.author.id) in user_nicknames:
+        return False
+    delete_message(message.channel.id, message.id)
+    if user_nicknames.owner_conflict(message.author.id, c):
+        notify(message.channel, f"{message.author.mention} ⚠️ `{c}` 는 이미 다른 분이 등록한 닉네임입니다.", 3)
+        return True
+    user_nicknames.set(message.author.id, c)
+    clear_warning(message.author.id)
+    notify(message.channel, f"{message.author.mention} ✅ `{c}` 닉네임이 등록되었습니다! 이제 이모지를 눌러주세요.", 2)
+    return True
+
+async def route_limit(message, m):
+    if not message.guild or not message.author.guild_permissions.administrator:
+        return False
+    num=int(m.group(1)); gid=str(message.guild.id)
+    notify(message.channel, f"✅ 이번 판 참가 최대 인원을 **{num}명**으로 설정하고, 명단을 재조정합니다!", 2)
+    await adjust_current_participants(gid,num)
+    return True
+
+# "!" 뒤 명령어 중 commands 프레임워크 밖에서 처리하는 것들 (route 이름, 정규식, 처리 함수)
+PREFIX_ROUTES = [
+    ("limit", re.compile(r"^!(\d+)명$"), route_limit),
+]
+
 @bot.event
 async def on_message(message):
-    if message.author.bot or not message.guild:
-        return await bot.process_commands(message)
-    data=GUILD_DATA.get(str(message.guild.id))
-    if data:
-        c=message.content.strip()
-        if "#" in c and len(c)>=3 and str(message.author.id) not in user_nicknames:
-            try: await message.delete()
-            except: pass
-            user_nicknames[str(message.author.id)]=c
-            save_user_nicknames()
-            if message.author.id in pending_warnings:
-                cid,mid=pending_warnings.pop(message.author.id)
-                try: await bot.get_channel(cid).fetch_message(mid).delete()
-                except: pass
-            await message.channel.send(f"{message.author.mention} ✅ `{c}` 닉네임이 등록되었습니다! 이제 이모지를 눌러주세요.", delete_after=2)
-            return
-    m=re.match(r"^!(\d+)명$", message.content.strip())
-    if m and message.author.guild_permissions.administrator:
-        num=int(m.group(1)); gid=str(message.guild.id)
-        await message.channel.send(f"✅ 이번 판 참가 최대 인원을 **{num}명**으로 설정하고, 명단을 재조정합니다!", delete_after=2)
-        await adjust_current_participants(gid,num)
-        return
-    await bot.process_commands(message)
+    t0 = time.perf_counter()
+    if message.author.bot:
+        return count_route("bot", t0)
+    c = message.content.strip()
+    if c.startswith("!"):
+        for route, rx, handler in PREFIX_ROUTES:
+            m = rx.match(c)
+            if m and await handler(message, m):
+                return count_route(route, t0)
+        await bot.process_commands(message)
+        return count_route("command", t0)
+    if message.guild and message.channel.id in VIEWER_CHANNELS:
+        if await route_nickname(message, c):
+            return count_route("nickname", t0)
+        return count_route("viewer_chat", t0)
+    count_route("drop", t0)
+
+@bot.command(name="메시지통계")
+@commands.has_permissions(administrator=True)
+async def 메시지통계(ctx):
+    lines = [f"{r}: {st['count']}건, 평균 {st['seconds'] / st['count'] * 1e6:.0f}µs"
+             for r, st in sorted(message_stats.items(), key=lambda kv: -kv[1]["seconds"]) if st["count"]]
+    lines.append(f"자동삭제 대기: {EXPIRY.pending}건")
+    if reaction_routes:
+        lines.append("반응 경로: " + ", ".join(f"{r} {n}건" for r, n in reaction_routes.most_common()))
+    st = reaction_stats.get(str(ctx.guild.id))
+    if st:
+        lines.append(f"반응 큐: {st['enqueued']}건, 가득 차서 기다림 {st['blocked']}번, 최대 {st['max_depth']}/{REACTION_QUEUE_MAX}")
+    notify(ctx.channel, "📊 메시지 처리 비용\n" + "\n".join(lines), 10)
 
 # ─── 채널 분리 명령어 ──────────────────────────────────────────────
 @bot.command(name="등록")
@@ -492,14 +1080,14 @@ async def 등록(ctx, viewer_channel:discord.TextChannel=None):
     for e in ["1️⃣","2️⃣","3️⃣","❤️",EMOJI_DELETE]:
         await reg_msg.add_reaction(e)
     status_msg = await channel.send(f"{CUSTOM_EMOJI} 참가자 목록:\n(아직 없음)")
+    drop_status_pages(str(ctx.guild.id))
+    HISTORY.forget(str(ctx.guild.id))   # 새 명단 — 예전 세션 로테이션은 되돌리지 않음
     GUILD_DATA[str(ctx.guild.id)] = {
         **GUILD_DATA.get(str(ctx.guild.id), {}),
         "viewer_channel_id": channel.id,
         "viewer_msg_id": reg_msg.id,
         "viewer_status_msg_id": status_msg.id,
-        "participants": [],
-        "waitlist": [],
-        "rounds_left": {},
+        "roster": Roster(),
         "max_participants": 9,
         "locked_participants": None,
         "signup_open": False,
@@ -507,19 +1095,23 @@ async def 등록(ctx, viewer_channel:discord.TextChannel=None):
         "party_code": None,
         "party_code_msg_id": None
     }
+    index_routes()
+    save_data()
 
 @bot.command(name="관리자")
 @commands.has_permissions(administrator=True)
 async def 관리자(ctx, admin_channel:discord.TextChannel=None):
     channel = admin_channel or ctx.channel
-    admin_msg = await channel.send("🎮로테이션 ▶️시참시작 🛑시참정지 🎲랜덤맵")
-    for e in [EMOJI_ROTATE, EMOJI_OPEN, EMOJI_CLOSE, EMOJI_RANDOM_MAP]:
+    admin_msg = await channel.send("🎮로테이션 ▶️시참시작 🛑시참정지 🎲랜덤맵 ⚖️팀나누기")
+    for e in [EMOJI_ROTATE, EMOJI_OPEN, EMOJI_CLOSE, EMOJI_RANDOM_MAP, EMOJI_TEAMS]:
         await admin_msg.add_reaction(e)
     GUILD_DATA[str(ctx.guild.id)] = {
         **GUILD_DATA.get(str(ctx.guild.id), {}),
         "admin_channel_id": channel.id,
         "admin_msg_id": admin_msg.id,
     }
+    index_routes()
+    save_data()
 
 # (아래 기존 관리자/유저 커맨드들은 동일, 단 명단 갱신은 viewer 채널 기준)
 
@@ -527,142 +1119,197 @@ async def 관리자(ctx, admin_channel:discord.TextChannel=None):
 @commands.has_permissions(administrator=True)
 async def 명단(ctx):
     data=GUILD_DATA.get(str(ctx.guild.id))
-    if not data: return await ctx.send("❌ 등록된 신청 메시지가 없습니다.", delete_after=2)
+    if not data: return notify(ctx.channel, "❌ 등록된 신청 메시지가 없습니다.", 2)
     guild=ctx.guild
-    await ctx.send(build_participant_text_fast(data, guild))
+    await ensure_members(data, guild)
+    for page in build_status_pages(data, guild):
+        await ctx.send(page)
 
 @bot.command()
 @commands.has_permissions(administrator=True)
 async def 백업(ctx):
     data=GUILD_DATA.get(str(ctx.guild.id))
-    if not data: return await ctx.send("❌ 등록된 신청 메시지가 없습니다.", delete_after=2)
+    if not data: return notify(ctx.channel, "❌ 등록된 신청 메시지가 없습니다.", 2)
     await update_status(str(ctx.guild.id))
-    path=os.path.join(BACKUP_DIR,f"backup_{ctx.guild.id}.txt")
-    with open(path,"a",encoding="utf-8") as f:
-        f.write(f"\n====== {datetime.now():%Y-%m-%d %H:%M:%S} ======\n"+build_participant_text_fast(data,ctx.guild)+"\n")
-    await ctx.send(file=discord.File(path))
-    auto_backup_enabled[str(ctx.guild.id)]=True
-    await ctx.send("✅ 백업이 누적 저장되었습니다.", delete_after=5)
+    await backup_guild(str(ctx.guild.id),force=True)
+    await ctx.send(file=discord.File(BACKUPS.path(ctx.guild.id)))
+    notify(ctx.channel, "✅ 백업이 누적 저장되었습니다.", 5)
+
+@bot.command(name="팀나누기")
+@commands.has_permissions(administrator=True)
+async def 팀나누기(ctx, *파티: str):
+    # !팀나누기 이름,이름 이름,이름,이름 → 쉼표로 묶은 사람들은 같은 팀 (저장해 두고 ⚖️ 에도 씀)
+    # !팀나누기 해제 → 파티 지움, 인자 없으면 저장된 파티로
+    gid=str(ctx.guild.id)
+    data=GUILD_DATA.get(gid)
+    if not data: return notify(ctx.channel,"❌ 등록된 신청 메시지가 없습니다.",2)
+    if 파티==("해제",):
+        data["team_parties"]=[]; save_data()
+        return notify(ctx.channel,"✅ 파티 묶음을 해제했습니다.",2)
+    if 파티:
+        parties=[]
+        for arg in 파티:
+            party=[]
+            for name in filter(None, (n.strip() for n in arg.split(","))):
+                member=await resolve_member(ctx, name)
+                if member is None: return
+                party.append(member.id)
+            if len(party)>1: parties.append(party)
+        data["team_parties"]=parties; save_data()
+    if len(data["roster"].snapshot().participants)<2:
+        return notify(ctx.channel,"⚠️ 참가자가 2명 이상이어야 팀을 나눌 수 있습니다.",2)
+    await post_teams(gid)
 
 @bot.command(name="전체삭제")
 @commands.has_permissions(administrator=True)
 async def 전체삭제(ctx):
     data=GUILD_DATA.get(str(ctx.guild.id))
-    if not data: return await ctx.send("❌ 등록된 신청 메시지가 없습니다.",delete_after=2)
-    data["participants"].clear();data["waitlist"].clear();data["rounds_left"].clear()
-    last=data.get("last_map_msg_id");
-    if last:
-        try: await bot.get_channel(data["viewer_channel_id"]).fetch_message(last).delete()
-        except: pass
-        data["last_map_msg_id"]=None
+    if not data: return notify(ctx.channel,"❌ 등록된 신청 메시지가 없습니다.",2)
+    gid=str(ctx.guild.id)
+    await mutate(gid, lambda: GUILD_DATA[gid]["roster"].clear())
+    for k in ("last_map_msg_id","last_team_msg_id"):
+        if data.get(k):
+            delete_message(data["viewer_channel_id"],data[k],ANNOUNCE)
+            data[k]=None
     ch=bot.get_channel(data["viewer_channel_id"])
     try:
-        reg=await ch.fetch_message(data["viewer_msg_id"])
-        for react in reg.reactions:
-            async for user in react.users():
-                if user.id!=bot.user.id:
-                    try: await reg.remove_reaction(react.emoji,user)
-                    except: pass
+        # 한 번에 전부 지우고 봇 이모지만 다시 달기
+        reg=ch.get_partial_message(data["viewer_msg_id"])
+        await REST.submit(CLEANUP,("reaction",ch.id),lambda: reg.clear_reactions())
+        for e in viewer_emojis(data):
+            REST.submit(CLEANUP,("reaction",ch.id),lambda e=e: reg.add_reaction(e))
+    except discord.Forbidden:
+        # 메시지 관리 권한 없으면 한 명씩 (백그라운드)
+        try:
+            reg=await ch.fetch_message(data["viewer_msg_id"])
+            for react in reg.reactions:
+                async for user in react.users():
+                    if user.id!=bot.user.id:
+                        queue_reaction_removal(ch.id,reg.id,react.emoji,user.id)
+        except: pass
     except: pass
-    await ctx.send("✅ 참가자/대기자 초기화 및 모든 유저 리액션 해제 완료!",delete_after=2)
+    notify(ctx.channel,"✅ 참가자/대기자 초기화 및 모든 유저 리액션 해제 완료!",2)
     await update_status(str(ctx.guild.id))
 
 @bot.command(name="올리기")
 @commands.has_permissions(administrator=True)
 async def 올리기(ctx,member:discord.Member):
     data=GUILD_DATA.get(str(ctx.guild.id))
-    if not data: return await ctx.send("❌ 등록된 신청 메시지가 없습니다.",delete_after=2)
-    uid=member.id;parts,waits=data["participants"],data["waitlist"]
-    if uid not in waits:
-        return await ctx.send(f"⚠️ {member.display_name}님은 대기열에 없습니다.",delete_after=2)
-    max_num=get_current_limit(data)
-    if len(parts)<max_num:
-        waits.remove(uid);parts.append(uid);data["rounds_left"].setdefault(uid,1)
-        await ctx.send(f"✅ {member.display_name}님을 참가자로 올렸습니다!",delete_after=2)
+    if not data: return notify(ctx.channel,"❌ 등록된 신청 메시지가 없습니다.",2)
+    uid=member.id;gid=str(ctx.guild.id)
+    def op():
+        # 차례가 됐을 때의 명단/인원으로 (그 사이 명단이 새로 만들어졌을 수 있음)
+        cur=GUILD_DATA[gid];roster=cur["roster"];max_num=get_current_limit(cur)
+        if uid not in roster.waitlist: return False, None, max_num
+        return True, roster.promote(uid,max_num), max_num
+    ok,last_uid,max_num=await mutate(gid,op)
+    if not ok:
+        return notify(ctx.channel,f"⚠️ {member.display_name}님은 대기열에 없습니다.",2)
+    if last_uid is None:
+        notify(ctx.channel,f"✅ {member.display_name}님을 참가자로 올렸습니다!",2)
         await update_status(str(ctx.guild.id));return
-    last_uid=parts.pop();waits.insert(0,last_uid)
-    waits.remove(uid);parts.append(uid);data["rounds_left"].setdefault(uid,1)
-    removed_member=ctx.guild.get_member(last_uid)
-    await ctx.send(f"🔄 참가자가 이미 {max_num}명이라, **{removed_member.display_name}**님을 대기열 맨 앞으로 이동시키고\n"+
-                   f"✅ **{member.display_name}**님을 참가자로 올렸습니다!",delete_after=3)
+    removed=MEMBERS.get(ctx.guild, last_uid)
+    removed_name=removed.display_name if removed else f"알수없음({last_uid})"
+    notify(ctx.channel,f"🔄 참가자가 이미 {max_num}명이라, **{removed_name}**님을 대기열 맨 앞으로 이동시키고\n"+
+                   f"✅ **{member.display_name}**님을 참가자로 올렸습니다!",3)
     await update_status(str(ctx.guild.id))
 
 @bot.command(name="닉네임삭제")
 async def 닉네임삭제(ctx):
     if str(ctx.author.id) not in user_nicknames:
-        return await ctx.send(f"{ctx.author.mention} ⚠️ 등록된 발로닉네임이 없습니다.",delete_after=2)
-    user_nicknames.pop(str(ctx.author.id),None);save_user_nicknames()
-    await ctx.send(f"{ctx.author.mention} ✅ 발로닉네임이 삭제되었습니다. 다시 닉네임#KR1 형식으로 등록해주세요.",delete_after=2)
+        return notify(ctx.channel,f"{ctx.author.mention} ⚠️ 등록된 발로닉네임이 없습니다.",2)
+    user_nicknames.delete(ctx.author.id)
+    notify(ctx.channel,f"{ctx.author.mention} ✅ 발로닉네임이 삭제되었습니다. 다시 닉네임#KR1 형식으로 등록해주세요.",2)
 
 @bot.command(name="종료합니당")
 @commands.has_permissions(administrator=True)
 async def 종료합니당(ctx):
     await ctx.send("👋 봇을 종료합니다…")
+    await STORE.drain()
+    await user_nicknames.drain()
+    await HISTORY.drain()
+    await EXPIRY.close()
+    # 지표 / 명단 API 서버 정리 (열려 있는 SSE 도 여기서 끝남)
+    for h in metrics_handles:
+        if isinstance(h, asyncio.Task):
+            h.cancel()
+        else:
+            await h.cleanup()
+    metrics_handles.clear()
+    # 마지막으로 REST 작업자 (보내는 중인 요청은 끝까지, 남은 건 버림)
+    await REST.close()
     await bot.close()
 
 @bot.command(name="백업기록")
 @commands.has_permissions(administrator=True)
 async def 백업기록(ctx):
-    path = os.path.join(BACKUP_DIR, "backup_1226441318046109766.txt")  # ← 파일명 고정!
-    if not os.path.exists(path):
-        return await ctx.send("❌ 지정된 백업 파일이 없습니다.", delete_after=2)
-    await ctx.send(file=discord.File(path))
-    await ctx.send("✅ 해당 백업 txt 기록입니다.", delete_after=6)
+    # 이 서버 것만 (다른 서버 기록은 못 받음). 첫 스냅샷 + 이후 바뀐 줄만 모은 기록
+    gid = ctx.guild.id
+    text = await asyncio.to_thread(BACKUPS.history, gid)
+    if not text:
+        return notify(ctx.channel, "❌ 지정된 백업 파일이 없습니다.", 2)
+    await ctx.send(file=discord.File(io.BytesIO(text.encode("utf-8")), filename=f"backup_history_{gid}.txt"))
+    notify(ctx.channel, "✅ 해당 백업 txt 기록입니다.", 6)
 
 @bot.command(name="파티코드",aliases=["파티"])
 async def 파티코드(ctx,*,code:str):
     gid=str(ctx.guild.id);data=GUILD_DATA.get(gid)
-    if not data: return await ctx.send("❌ 먼저 !등록 또는 !일반시참을 실행하세요.",delete_after=2)
+    if not data: return notify(ctx.channel,"❌ 먼저 !등록 또는 !일반시참을 실행하세요.",2)
     if data.get("party_code_msg_id"):
-        try: await bot.get_channel(data["viewer_channel_id"]).fetch_message(data["party_code_msg_id"]).delete()
-        except: pass
+        delete_message(data["viewer_channel_id"],data["party_code_msg_id"],ANNOUNCE)
     ch=bot.get_channel(data["viewer_channel_id"])
-    party=await ch.send(f"# (파티코드: {code.strip()})")
-    data["party_code"]=code.strip();data["party_code_msg_id"]=party.id
-    await ctx.send("✅ 파티코드가 시작버튼 아래에 표시되었습니다!",delete_after=2)
+    party=await announce(ch,f"# (파티코드: {code.strip()})")
+    data["party_code"]=code.strip();data["party_code_msg_id"]=party.id;save_data()
+    notify(ctx.channel,"✅ 파티코드가 시작버튼 아래에 표시되었습니다!",2)
 
 @bot.command(name="고정")
 @commands.has_permissions(administrator=True)
 async def 고정(ctx,*,arg):
     m=re.match(r"(\d+)",arg)
-    if not m: return await ctx.send("숫자를 정확히 입력하세요! 예: !고정7명",delete_after=2)
+    if not m: return notify(ctx.channel,"숫자를 정확히 입력하세요! 예: !고정7명",2)
     n=int(m.group(1));gid=str(ctx.guild.id);data=GUILD_DATA.get(gid)
-    if not data: return await ctx.send("❌ 먼저 !일반시참을 실행해주세요.",delete_after=2)
+    if not data: return notify(ctx.channel,"❌ 먼저 !일반시참을 실행해주세요.",2)
     data["locked_participants"]=n
-    await ctx.send(f"🔒 참가 인원을 **{n}명**으로 고정합니다. 로테 돌려도 계속 {n}명입니다!",delete_after=2)
+    notify(ctx.channel,f"🔒 참가 인원을 **{n}명**으로 고정합니다. 로테 돌려도 계속 {n}명입니다!",2)
     await adjust_current_participants(gid,n)
 
 @bot.command(name="내리기")
 @commands.has_permissions(administrator=True)
 async def 내리기(ctx,*members:discord.Member):
     data=GUILD_DATA.get(str(ctx.guild.id))
-    if not data: return await ctx.send("❌ 등록된 신청 메시지가 없습니다.",delete_after=2)
-    parts,waits=data["participants"],data["waitlist"]
-    moved=[]
-    for m in members:
-        uid=m.id
-        if uid in parts:
-            parts.remove(uid);waits.insert(0,uid);moved.append(m.display_name)
-            while len(parts)<get_current_limit(data) and waits:
-                parts.append(waits.pop(0))
+    if not data: return notify(ctx.channel,"❌ 등록된 신청 메시지가 없습니다.",2)
+    gid=str(ctx.guild.id)
+    def op():
+        cur=GUILD_DATA[gid];roster=cur["roster"]
+        moved=[]
+        for m in members:
+            uid=m.id
+            if uid in roster.participants:
+                roster.demote(uid);moved.append(m.display_name)
+                roster.fill(get_current_limit(cur),skip=uid)
+        return moved
+    moved=await mutate(gid,op)
     if moved:
-        await ctx.send(f"✅ {' ,'.join(moved)}님을 대기열 맨 앞으로 이동!",delete_after=2)
+        notify(ctx.channel,f"✅ {' ,'.join(moved)}님을 대기열 맨 앞으로 이동!",2)
         await update_status(str(ctx.guild.id))
     else:
-        await ctx.send("⚠️ 참가자 명단에 해당 유저가 없습니다.",delete_after=2)
+        notify(ctx.channel,"⚠️ 참가자 명단에 해당 유저가 없습니다.",2)
 
 @bot.command(name="판수변경")
 @commands.has_permissions(administrator=True)
 async def 판수변경(ctx,nickname:str,num:int):
     data=GUILD_DATA.get(str(ctx.guild.id))
-    if not data: return await ctx.send("❌ 등록된 신청 메시지가 없습니다.",delete_after=2)
-    member=find(lambda m:m.display_name==nickname or m.name==nickname,ctx.guild.members)
-    if not member: return await ctx.send(f"⚠️ '{nickname}' 님을 찾을 수 없습니다.",delete_after=2)
-    uid=member.id
-    if uid not in data["participants"] and uid not in data["waitlist"]:
-        return await ctx.send(f"⚠️ {member.display_name}님은 명단에 없습니다.",delete_after=2)
-    data.setdefault("rounds_left",{})[uid]=num
-    await ctx.send(f"✅ {member.display_name}님의 판수를 **{num}판**으로 설정했습니다.",delete_after=2)
+    if not data: return notify(ctx.channel,"❌ 등록된 신청 메시지가 없습니다.",2)
+    member=await resolve_member(ctx,nickname)
+    if not member: return
+    uid=member.id;gid=str(ctx.guild.id)
+    def op():
+        roster=GUILD_DATA[gid]["roster"]
+        if uid not in roster: return False
+        roster.set_rounds(uid,num); return True
+    if not await mutate(gid,op):
+        return notify(ctx.channel,f"⚠️ {member.display_name}님은 명단에 없습니다.",2)
+    notify(ctx.channel,f"✅ {member.display_name}님의 판수를 **{num}판**으로 설정했습니다.",2)
     await update_status(str(ctx.guild.id))
 
 @bot.command(name="일반시참")
@@ -673,14 +1320,14 @@ async def 일반시참(ctx, viewer_channel:discord.TextChannel=None):
     for e in ["1️⃣",EMOJI_DELETE]:
         await reg_msg.add_reaction(e)
     status_msg = await channel.send(f"{CUSTOM_EMOJI} 참가자 목록:\n(아직 없음)")
+    drop_status_pages(str(ctx.guild.id))
+    HISTORY.forget(str(ctx.guild.id))   # 새 명단 — 예전 세션 로테이션은 되돌리지 않음
     GUILD_DATA[str(ctx.guild.id)] = {
         **GUILD_DATA.get(str(ctx.guild.id), {}),
         "viewer_channel_id": channel.id,
         "viewer_msg_id": reg_msg.id,
         "viewer_status_msg_id": status_msg.id,
-        "participants": [],
-        "waitlist": [],
-        "rounds_left": {},
+        "roster": Roster(),
         "max_participants": 4,
         "locked_participants": None,
         "signup_open": False,
@@ -688,134 +1335,200 @@ async def 일반시참(ctx, viewer_channel:discord.TextChannel=None):
         "party_code": None,
         "party_code_msg_id": None
     }
+    index_routes()
+    save_data()
 
 @bot.command(name="참가자삭제")
 @commands.has_permissions(administrator=True)
 async def 참가자삭제(ctx,member:discord.Member):
     data=GUILD_DATA.get(str(ctx.guild.id))
     if not data:
-        return await ctx.send("❌ 등록된 신청 메시지가 없습니다.",delete_after=2)
-    uid=member.id; parts,waits=data["participants"],data["waitlist"]
-    if uid in parts:
-        parts.remove(uid); data["rounds_left"].pop(uid,None)
-        if waits: parts.append(waits.pop(0))
-    elif uid in waits:
-        waits.remove(uid); data["rounds_left"].pop(uid,None)
-    else:
-        return await ctx.send(f"⚠️ {member.display_name}님은 명단에 없습니다.",delete_after=2)
-    await ctx.send("✅ 삭제 완료",delete_after=2)
+        return notify(ctx.channel,"❌ 등록된 신청 메시지가 없습니다.",2)
+    uid=member.id; gid=str(ctx.guild.id)
+    def op():
+        roster=GUILD_DATA[gid]["roster"]
+        if uid in roster.participants:
+            roster.remove(uid); roster.fill(len(roster.participants)+1)
+        elif uid in roster.waitlist:
+            roster.remove(uid)
+        else:
+            return False
+        return True
+    if not await mutate(gid,op):
+        return notify(ctx.channel,f"⚠️ {member.display_name}님은 명단에 없습니다.",2)
+    notify(ctx.channel,"✅ 삭제 완료",2)
     await update_status(str(ctx.guild.id))
 
 @bot.command(name="닉네임수정")
 @commands.has_permissions(administrator=True)
 async def 닉네임수정(ctx, 디코닉: str, 발로닉네임: str):
     # 디스코드 멤버 찾기 (닉네임/이름 모두 지원)
-    member = find(lambda m: m.display_name == 디코닉 or m.name == 디코닉, ctx.guild.members)
+    member = await resolve_member(ctx, 디코닉, delete_after=3)
     if not member:
-        return await ctx.send(f"⚠️ '{디코닉}' 님을 찾을 수 없습니다.", delete_after=3)
-    user_nicknames[str(member.id)] = 발로닉네임
-    save_user_nicknames()
-    await ctx.send(f"✅ {member.display_name}님의 발로란트 닉네임을 `{발로닉네임}`(으)로 변경했습니다.", delete_after=3)
+        return
+    other = user_nicknames.owner_conflict(member.id, 발로닉네임)
+    user_nicknames.set(member.id, 발로닉네임)
+    notify(ctx.channel, f"✅ {member.display_name}님의 발로란트 닉네임을 `{발로닉네임}`(으)로 변경했습니다.", 3)
+    if other:
+        notify(ctx.channel, f"⚠️ 같은 닉네임이 <@{other}> 님에게도 등록되어 있습니다.", 5)
 
 @bot.command(name="참가")
 @commands.has_permissions(administrator=True)
 async def 참가(ctx, 디코닉: str):
     # 1. 디코닉으로 멤버 찾기
-    member = find(lambda m: m.display_name == 디코닉 or m.name == 디코닉, ctx.guild.members)
+    member = await resolve_member(ctx, 디코닉, delete_after=3)
     if not member:
-        return await ctx.send(f"⚠️ '{디코닉}' 님을 찾을 수 없습니다.", delete_after=3)
+        return
     uid = member.id
 
     # 2. 발로닉네임 없으면 출력 x
     valo_nick = user_nicknames.get(str(uid))
     if not valo_nick:
-        return await ctx.send(f"❌ {member.display_name} 님은 발로란트 닉네임이 등록되어 있지 않습니다.", delete_after=3)
+        return notify(ctx.channel, f"❌ {member.display_name} 님은 발로란트 닉네임이 등록되어 있지 않습니다.", 3)
 
     # 3. 명단에 이미 있으면 중복 추가 방지
     data = GUILD_DATA.get(str(ctx.guild.id))
     if not data:
-        return await ctx.send("❌ 등록된 신청 메시지가 없습니다.", delete_after=2)
-    if uid in data["participants"]:
-        return await ctx.send(f"⚠️ 이미 참가자 명단에 있습니다.", delete_after=3)
-    data["participants"].append(uid)
-    data["rounds_left"][uid] = 1
+        return notify(ctx.channel, "❌ 등록된 신청 메시지가 없습니다.", 2)
+    gid = str(ctx.guild.id)
+    def op():
+        roster = GUILD_DATA[gid]["roster"]
+        if uid in roster.participants:
+            return False
+        roster.force_join(uid, 1)
+        return True
+    if not await mutate(gid, op):
+        return notify(ctx.channel, f"⚠️ 이미 참가자 명단에 있습니다.", 3)
 
     # 4. 출력 (매번 새 메시지로!)
-    await ctx.send(build_participant_text_fast(data, ctx.guild))
+    data = GUILD_DATA[gid]
+    await ensure_members(data, ctx.guild)
+    for page in build_status_pages(data, ctx.guild):
+        await ctx.send(page)
+    await update_status(str(ctx.guild.id))
 
 @bot.command(name="되돌리기")
 @commands.has_permissions(administrator=True)
-async def 되돌리기(ctx):
-    data = GUILD_DATA.get(str(ctx.guild.id))
-    if not data or "prev_participants" not in data:
-        return await ctx.send("⛔ 되돌릴 기록이 없습니다.", delete_after=2)
-    # === 복원 ===
-    data["participants"] = data["prev_participants"]
-    data["waitlist"] = data["prev_waitlist"]
-    data["rounds_left"] = data["prev_rounds_left"]
-    # 복원 후 한 번만 복구 되게 제거
-    data.pop("prev_participants", None)
-    data.pop("prev_waitlist", None)
-    data.pop("prev_rounds_left", None)
-    await update_status(str(ctx.guild.id))
-    await ctx.send("✅ 직전 로테이션 상태로 되돌렸습니다!", delete_after=2)
+async def 되돌리기(ctx, 횟수: int = 1):
+    gid = str(ctx.guild.id)
+    data = GUILD_DATA.get(gid)
+    if not data:
+        return notify(ctx.channel, "⛔ 되돌릴 기록이 없습니다.", 2)
+    def op():
+        n = 0
+        while n < max(1, 횟수):
+            e = HISTORY.undo(gid)
+            if e is None:
+                break
+            GUILD_DATA[gid]["roster"].undo_rotation(e.undo)
+            n += 1
+        return n
+    n = await mutate(gid, op)
+    if not n:
+        return notify(ctx.channel, "⛔ 되돌릴 기록이 없습니다.", 2)
+    await update_status(gid)
+    notify(ctx.channel, f"✅ 로테이션 {n}번을 되돌렸습니다! (다시하기 가능: {HISTORY.redo_count(gid)}번)", 3)
+
+@bot.command(name="다시하기")
+@commands.has_permissions(administrator=True)
+async def 다시하기(ctx, 횟수: int = 1):
+    gid = str(ctx.guild.id)
+    data = GUILD_DATA.get(gid)
+    if not data:
+        return notify(ctx.channel, "⛔ 다시 할 로테이션이 없습니다.", 2)
+    def op():
+        n = 0
+        while n < max(1, 횟수):
+            e = HISTORY.peek_redo(gid)
+            if e is None:
+                break
+            _, undo = GUILD_DATA[gid]["roster"].rotate_undoable(e.limit)
+            HISTORY.redo(gid, undo)
+            n += 1
+        return n
+    n = await mutate(gid, op)
+    if not n:
+        return notify(ctx.channel, "⛔ 다시 할 로테이션이 없습니다.", 2)
+    await update_status(gid)
+    notify(ctx.channel, f"✅ 되돌린 로테이션 {n}번을 다시 적용했습니다!", 3)
+
+@bot.command(name="로테기록")
+@commands.has_permissions(administrator=True)
+async def 로테기록(ctx, 개수: int = 10):
+    gid = str(ctx.guild.id)
+    entries = HISTORY.recent(gid, max(1, min(개수, HISTORY.maxlen)))
+    if not entries:
+        return notify(ctx.channel, "📜 로테이션 기록이 없습니다.", 3)
+    guild = ctx.guild
+    def names(uids):
+        out = []
+        for uid in uids:
+            info = MEMBERS.get(guild, uid)
+            out.append(info.display_name if info else str(uid))
+        return ", ".join(out) or "-"
+    lines = [f"📜 최근 로테이션 {len(entries)}개 (1 = 가장 최근, !되돌리기 N 으로 N개 되돌림)"]
+    for i, e in enumerate(entries, 1):
+        who = names([int(e.label)]) if e.label.isdigit() else e.label
+        lines.append(f"{i}. {datetime.fromtimestamp(e.at):%m-%d %H:%M} {who} — 올라옴: {names(e.undo['promoted'])}")
+    if HISTORY.redo_count(gid):
+        lines.append(f"↪️ 다시하기 가능: {HISTORY.redo_count(gid)}번")
+    notify(ctx.channel, "\n".join(lines)[:1900], 15)
 
 @bot.command(name="대기열")
 @commands.has_permissions(administrator=True)
 async def 대기열(ctx, 디코닉: str, 위치: int = 1):
     data = GUILD_DATA.get(str(ctx.guild.id))
     if not data:
-        return await ctx.send("❌ 등록된 신청 메시지가 없습니다.", delete_after=2)
+        return notify(ctx.channel, "❌ 등록된 신청 메시지가 없습니다.", 2)
 
-    member = find(lambda m: m.display_name == 디코닉 or m.name == 디코닉, ctx.guild.members)
+    member = await resolve_member(ctx, 디코닉)
     if not member:
-        return await ctx.send(f"⚠️ '{디코닉}' 님을 찾을 수 없습니다.", delete_after=2)
+        return
 
     uid = member.id
-    parts = data["participants"]
-    waits = data["waitlist"]
-    max_num = get_current_limit(data)
-
-    # 참가자인 경우 -> 대기열로 내리고 지정 위치로 이동
-    if uid in parts:
-        parts.remove(uid)
-        # 위치 보정
-        if 위치 < 1:
-            위치 = 1
-        if 위치 > len(waits) + 1:  # +1: 방금 빠졌으니 자리 생김
-            위치 = len(waits) + 1
-        # 지정 위치에 삽입
-        waits.insert(위치 - 1, uid)
-
-        # 참가자 부족하면 "본인 제외" 대기열 1번을 참가자로 올림
-        msg = ""
-        if len(parts) < max_num and waits:
-            # 본인을 제외한 대기열 1번
-            for idx, candidate_uid in enumerate(waits):
-                if candidate_uid != uid:
-                    올라갈_uid = waits.pop(idx)
-                    parts.append(올라갈_uid)
-                    msg += f"🔼 <@{올라갈_uid}>님을 참가자로 올리고, "
-                    break
-        msg += f"✅ {member.display_name}님을 대기열 {위치}번째로 이동시켰습니다."
-        await ctx.send(msg, delete_after=3)
-        await update_status(str(ctx.guild.id))
-        return
+    gid = str(ctx.guild.id)
 
-    # 이미 대기열에 있는 경우 -> 위치만 이동
-    if uid in waits:
-        waits.remove(uid)
-        if 위치 < 1:
-            위치 = 1
-        if 위치 > len(waits) + 1:
-            위치 = len(waits) + 1
-        waits.insert(위치 - 1, uid)
-        await ctx.send(f"✅ {member.display_name}님을 대기열 {위치}번째로 이동시켰습니다.", delete_after=3)
+    def op():
+        cur = GUILD_DATA[gid]
+        roster = cur["roster"]
+        max_num = get_current_limit(cur)
+        # 참가자인 경우 -> 대기열로 내리고 지정 위치로 이동
+        if uid in roster.participants:
+            # 위치 보정 (+1: 맨 뒤 자리)
+            pos = max(1, min(위치, len(roster.waitlist) + 1))
+            roster.demote(uid, pos - 1)
+            # 참가자 부족하면 "본인 제외" 대기열 1번을 참가자로 올림
+            promoted = roster.fill(min(max_num, len(roster.participants) + 1), skip=uid)
+            if not roster.policy.movable:
+                pos = roster.position(uid)
+            return "demoted", pos, promoted
+        # 이미 대기열에 있는 경우 -> 위치만 이동
+        if uid in roster.waitlist:
+            if not roster.policy.movable:
+                return "fixed", None, []
+            pos = max(1, min(위치, len(roster.waitlist)))
+            if roster.position(uid) == pos:
+                return "same", pos, []
+            roster.move(uid, pos - 1)
+            return "moved", pos, []
+        return "missing", None, []
+
+    kind, pos, promoted = await mutate(gid, op)
+    if kind == "demoted":
+        msg = "".join(f"🔼 <@{u}>님을 참가자로 올리고, " for u in promoted)
+        msg += f"✅ {member.display_name}님을 대기열 {pos}번째로 이동시켰습니다."
+        notify(ctx.channel, msg, 3)
         await update_status(str(ctx.guild.id))
         return
+    if kind == "fixed":
+        return notify(ctx.channel, "⚠️ 우선순위 대기열에서는 순서를 직접 바꿀 수 없습니다. (!올리기 사용)", 3)
+    if kind in ("moved", "same"):
+        if kind == "moved":
+            await update_status(str(ctx.guild.id))
+        return notify(ctx.channel, f"✅ {member.display_name}님을 대기열 {pos}번째로 이동시켰습니다.", 3)
 
     # 참가자/대기자 둘 다 없으면 안내
-    return await ctx.send(f"⚠️ {member.display_name}님은 참가자/대기열에 없습니다.", delete_after=2)
+    return notify(ctx.channel, f"⚠️ {member.display_name}님은 참가자/대기열에 없습니다.", 2)
 
 @bot.command(name="모드변경")
 @commands.has_permissions(administrator=True)
@@ -823,16 +1536,18 @@ async def 모드변경(ctx):
     gid = str(ctx.guild.id)
     data = GUILD_DATA.get(gid)
     if not data:
-        return await ctx.send("❌ 등록된 시참 데이터가 없습니다. 먼저 !등록 또는 !일반시참을 실행해주세요.", delete_after=3)
+        return notify(ctx.channel, "❌ 등록된 시참 데이터가 없습니다. 먼저 !등록 또는 !일반시참을 실행해주세요.", 3)
 
     ch = bot.get_channel(data["viewer_channel_id"])
     if not ch:
-        return await ctx.send("⚠️ 뷰어 채널을 찾을 수 없습니다.", delete_after=3)
+        return notify(ctx.channel, "⚠️ 뷰어 채널을 찾을 수 없습니다.", 3)
 
     # 현재 모드 판별
     current_mode = "등록" if data.get("max_participants", 9) == 9 else "일반"
 
     # 기존 메시지 삭제
+    drop_status_pages(gid)
+    HISTORY.forget(gid)   # 새 명단 — 예전 모드 로테이션은 되돌리지 않음
     for key in ["viewer_msg_id", "viewer_status_msg_id"]:
         try:
             msg = await ch.fetch_message(data[key])
@@ -841,7 +1556,6 @@ async def 모드변경(ctx):
             pass
 
     # ✅ 기존 참가자 데이터 초기화
-    participants, waitlist, rounds_left = [], [], {}
     locked = data.get("locked_participants")
     signup_open = True  # 시참 자동 오픈 유지
 
@@ -870,22 +1584,21 @@ async def 모드변경(ctx):
         "viewer_channel_id": ch.id,
         "viewer_msg_id": reg_msg.id,
         "viewer_status_msg_id": status_msg.id,
-        "participants": participants,
-        "waitlist": waitlist,
-        "rounds_left": rounds_left,
+        "roster": Roster(),
         "max_participants": max_part,
         "locked_participants": locked,
         "signup_open": signup_open,
         "last_map_msg_id": None,
     })
+    index_routes()
 
     # 🔁 반응 큐 초기화
-    reaction_queues[gid].clear()
+    clear_reaction_queue(gid)
 
     # 🔄 상태 메시지 업데이트 (PythonAnywhere에서 안정 대기)
     await asyncio.sleep(3)  # 이벤트 루프 안정 대기
     await update_status(gid, force=True)
-    print(f"[모드변경: PythonAnywhere] 강제 상태 갱신 완료")
+    log.debug("[모드변경] 강제 상태 갱신 완료 gid=%s", gid)
 
     # ✅ 새 viewer 메시지 이벤트 보장
     try:
@@ -899,15 +1612,21 @@ async def 모드변경(ctx):
             for e in ["1️⃣", "2️⃣", "️3️⃣", "❤️", EMOJI_DELETE]:
                 await msg.add_reaction(e)
 
-        print(f"[모드변경] {gid} 새 메시지 이벤트 재연결 완료")
+        log.debug("[모드변경] 새 메시지 이벤트 재연결 완료 gid=%s", gid)
 
-    except Exception as e:
-        print(f"[모드변경] 새 메시지 반응 재연결 실패: {e}")
+    except Exception:
+        log.warning("[모드변경] 새 메시지 반응 재연결 실패 gid=%s", gid, exc_info=True)
 
-    print(f"[모드변경 완료] {gid} 새 viewer_msg_id={reg_msg.id}, status_msg_id={status_msg.id}")
-    await ctx.send(msg_text + " (🟢 시참 자동 오픈, 기존 명단 초기화됨)", delete_after=5)
+    log.info("[모드변경 완료] gid=%s viewer_msg_id=%s status_msg_id=%s", gid, reg_msg.id, status_msg.id)
+    notify(ctx.channel, msg_text + " (🟢 시참 자동 오픈, 기존 명단 초기화됨)", 5)
 
 
 
 # ─── 봇 실행 ────────────────────────────────────────────────────────────────────
-bot.run(os.getenv("DISCORD_TOKEN"))
+# import 만 하면 연결하지 않음 (fakegateway.py / bench.py 에서 오프라인으로 사용)
+def main():
+    # WORKERS=N / --workers N 이면 샤드를 나눠 N 개 프로세스로 실행
+    main_or_launch(lambda: bot.run(os.getenv("DISCORD_TOKEN")))
+
+if __name__ == "__main__":
+    main()
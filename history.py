@@ -0,0 +1,186 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# 로테이션 기록 (여러 단계 되돌리기 / 다시하기)
+#  - 서버별로 최근 maxlen 개의 로테이션만 보관 (오래된 것부터 버림)
+#  - 한 항목은 그 로테이션이 바꾼 것만 (Roster.rotate_undoable 의 undo) — 대기열 전체 복사 없음
+#  - GUILD_DATA 와 따로 history 테이블에 한 줄씩 (스레드에서, 모아서 한 트랜잭션)
+# ────────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    gid TEXT, seq INTEGER, at REAL, label TEXT, lim INTEGER, undo TEXT, done INTEGER,
+    PRIMARY KEY (gid, seq)
+);
+"""
+
+
+class Entry:
+    __slots__ = ("seq", "at", "label", "limit", "undo")
+
+    def __init__(self, seq, at, label, limit, undo):
+        self.seq = seq
+        self.at = at
+        self.label = label
+        self.limit = limit
+        self.undo = undo
+
+
+class _GuildHistory:
+    def __init__(self):
+        self.done = []      # 오래된 것 → 최근 것
+        self.undone = []    # 되돌린 것 (마지막이 가장 먼저 다시하기 됨)
+        self.seq = 0
+
+
+class RosterHistory:
+    def __init__(self, path, maxlen=20):
+        self.path = path
+        self.maxlen = maxlen
+        self._conn = None
+        self._lock = threading.Lock()
+        self._guilds = {}
+        self._ops = []
+        self._task = None
+
+    # ─── 연결 / 불러오기 ──────────────────────────────────────────────────
+    def connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def load(self, owns=None):
+        conn = self.connect()
+        with self._lock:
+            rows = conn.execute("SELECT gid, seq, at, label, lim, undo, done FROM history ORDER BY gid, seq").fetchall()
+        self._guilds = {}
+        for gid, seq, at, label, lim, undo, done in rows:
+            if owns is not None and not owns(gid):
+                continue
+            g = self._guild(gid)
+            e = Entry(seq, at, label, lim, json.loads(undo))
+            (g.done if done else g.undone).append(e)
+            g.seq = max(g.seq, seq)
+        for g in self._guilds.values():
+            # 다시하기는 최근에 되돌린 것부터
+            g.undone.sort(key=lambda e: -e.seq)
+        return self
+
+    def _guild(self, gid):
+        g = self._guilds.get(gid)
+        if g is None:
+            g = self._guilds[gid] = _GuildHistory()
+        return g
+
+    # ─── 기록 / 되돌리기 / 다시하기 ─────────────────────────────────────────
+    def record(self, gid, label, limit, undo):
+        g = self._guild(gid)
+        if g.undone:
+            # 새 로테이션을 하면 되돌려 둔 것은 다시하기 못 함
+            g.undone.clear()
+            self._queue("DELETE FROM history WHERE gid=? AND done=0", (gid,))
+        g.seq += 1
+        e = Entry(g.seq, time.time(), label, limit, undo)
+        g.done.append(e)
+        self._queue("INSERT OR REPLACE INTO history VALUES (?,?,?,?,?,?,1)",
+                    (gid, e.seq, e.at, label, limit, json.dumps(undo)))
+        if len(g.done) > self.maxlen:
+            cut = g.done[-self.maxlen - 1].seq
+            del g.done[:-self.maxlen]
+            self._queue("DELETE FROM history WHERE gid=? AND seq<=? AND done=1", (gid, cut))
+        return e
+
+    def undo(self, gid):
+        g = self._guilds.get(gid)
+        if not g or not g.done:
+            return None
+        e = g.done.pop()
+        g.undone.append(e)
+        self._queue("UPDATE history SET done=0 WHERE gid=? AND seq=?", (gid, e.seq))
+        return e
+
+    def peek_redo(self, gid):
+        g = self._guilds.get(gid)
+        return g.undone[-1] if g and g.undone else None
+
+    def redo(self, gid, undo):
+        # 다시 돌린 로테이션의 새 변경분으로 바꿔서 기록으로 되돌림
+        g = self._guilds.get(gid)
+        if not g or not g.undone:
+            return None
+        e = g.undone.pop()
+        e.undo = undo
+        g.done.append(e)
+        self._queue("UPDATE history SET done=1, undo=? WHERE gid=? AND seq=?", (json.dumps(undo), gid, e.seq))
+        return e
+
+    def recent(self, gid, n=10):
+        g = self._guilds.get(gid)
+        return list(reversed(g.done[-n:])) if g else []
+
+    def redo_count(self, gid):
+        g = self._guilds.get(gid)
+        return len(g.undone) if g else 0
+
+    def forget(self, gid):
+        if self._guilds.pop(gid, None) is not None:
+            self._queue("DELETE FROM history WHERE gid=?", (gid,))
+
+    # ─── 쓰기 (스레드에서 한 트랜잭션) ─────────────────────────────────────
+    def _queue(self, sql, args):
+        self._ops.append((sql, args))
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self.flush_sync()
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._flusher())
+
+    def _commit(self, ops):
+        if not ops:
+            return
+        conn = self.connect()
+        with self._lock:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for sql, args in ops:
+                    conn.execute(sql, args)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    async def _flusher(self):
+        while self._ops:
+            ops, self._ops = self._ops, []
+            try:
+                await asyncio.to_thread(self._commit, ops)
+            except Exception:
+                logging.exception("[기록] 커밋 실패")
+                self._ops = ops + self._ops
+                await asyncio.sleep(1)
+
+    def flush_sync(self):
+        if self._ops:
+            ops, self._ops = self._ops, []
+            self._commit(ops)
+
+    async def drain(self):
+        if self._task is not None and not self._task.done():
+            await self._task
+        self.flush_sync()
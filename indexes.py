@@ -0,0 +1,356 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# 서버별 멤버 인덱스
+#  uid → (표시 이름, 티어, 고정룰렛권 여부)  /  이름 → uid (명령어 멤버 찾기)
+#  - 서버마다 LRU 크기 제한, 적중/실패 카운터
+#  - on_member_update / on_guild_role_update / on_member_remove 에서 갱신
+# ────────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import bisect
+import difflib
+import logging
+import time
+import unicodedata
+from collections import OrderedDict, namedtuple
+
+NO_TIER = "티어 없음"
+
+MemberInfo = namedtuple("MemberInfo", "display_name tier fixed")
+# exact: 이름이 (정규화해서) 그대로 맞은 것 — 아니면 접두어/유사 이름 후보 (한 명이어도 확인 필요)
+NameMatch = namedtuple("NameMatch", "uids exact")
+
+
+class MemberIndex:
+    def __init__(self, tiers, fixed_role, maxsize=2000):
+        self.tiers = set(tiers)
+        self.fixed_role = fixed_role
+        self.maxsize = maxsize
+        self._guilds = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.source = None      # (guild, uid) → Member, 없으면 guild.get_member
+
+    def _make(self, member):
+        tier = NO_TIER
+        fixed = False
+        for r in member.roles:
+            if tier is NO_TIER and r.name in self.tiers:
+                tier = r.name
+            if r.name == self.fixed_role:
+                fixed = True
+        return MemberInfo(member.display_name, tier, fixed)
+
+    def watches(self, role_name):
+        return role_name in self.tiers or role_name == self.fixed_role
+
+    # ─── 조회 ─────────────────────────────────────────────────────────────
+    def get(self, guild, uid):
+        if guild is None:
+            return None
+        cache = self._guilds.get(guild.id)
+        if cache is not None:
+            info = cache.get(uid)
+            if info is not None:
+                cache.move_to_end(uid)
+                self.hits += 1
+                return info
+        self.misses += 1
+        member = self.source(guild, uid) if self.source else guild.get_member(uid)
+        if member is None:
+            return None
+        return self.put(member)
+
+    # ─── 갱신 ─────────────────────────────────────────────────────────────
+    def put(self, member):
+        cache = self._guilds.setdefault(member.guild.id, OrderedDict())
+        info = cache[member.id] = self._make(member)
+        cache.move_to_end(member.id)
+        if len(cache) > self.maxsize:
+            cache.popitem(last=False)
+            self.evictions += 1
+        return info
+
+    def update(self, member):
+        # 이미 올라와 있는 멤버만 새로 고침 (명단과 무관한 멤버로 캐시를 채우지 않음)
+        cache = self._guilds.get(member.guild.id)
+        if cache is None or member.id not in cache:
+            return False
+        old = cache[member.id]
+        return self.put(member) != old
+
+    def evict(self, guild_id, uid):
+        cache = self._guilds.get(guild_id)
+        if cache is not None:
+            cache.pop(uid, None)
+
+    def invalidate_guild(self, guild_id):
+        self._guilds.pop(guild_id, None)
+
+    def stats(self):
+        return {
+            "size": sum(len(c) for c in self._guilds.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 서버별 이름 인덱스 (!판수변경 / !참가 / !대기열 / !닉네임수정 에서 멤버 찾기)
+#  display_name / name → uid 집합
+#  - 정확히 일치 → 대소문자·유니코드(한글 자모 조합 등) 정규화 일치 → 접두어 → 유사 이름
+#  - 처음 찾을 때 guild.members 를 한 번 훑어서 만들고, 이후엔 멤버 이벤트로만 갱신
+# ────────────────────────────────────────────────────────────────────────────────
+
+def normalize_name(name):
+    return unicodedata.normalize("NFKC", name).casefold().strip()
+
+
+class _GuildNames:
+    def __init__(self):
+        self.exact = {}     # 원래 이름 → {uid}
+        self.norm = {}      # 정규화 이름 → {uid}
+        self.keys = []      # 정규화 이름 정렬 목록 (접두어 검색용)
+        self.names = {}     # uid → (display_name, name)
+
+    def _link(self, table, key, uid, sort=False):
+        uids = table.setdefault(key, set())
+        if not uids and sort:
+            bisect.insort(self.keys, key)
+        uids.add(uid)
+
+    def _unlink(self, table, key, uid, sort=False):
+        uids = table.get(key)
+        if not uids:
+            return
+        uids.discard(uid)
+        if not uids:
+            del table[key]
+            if sort:
+                i = bisect.bisect_left(self.keys, key)
+                if i < len(self.keys) and self.keys[i] == key:
+                    del self.keys[i]
+
+    def add(self, uid, display_name, name):
+        self.remove(uid)
+        self.names[uid] = (display_name, name)
+        for n in {display_name, name}:
+            self._link(self.exact, n, uid)
+            self._link(self.norm, normalize_name(n), uid, sort=True)
+
+    def build(self, members):
+        # 처음 만들 때는 다 넣고 한 번에 정렬 (한 명씩 insort 하면 큰 서버에서 O(n²))
+        for m in members:
+            self.names[m.id] = (m.display_name, m.name)
+            for n in {m.display_name, m.name}:
+                self.exact.setdefault(n, set()).add(m.id)
+                self.norm.setdefault(normalize_name(n), set()).add(m.id)
+        self.keys = sorted(self.norm)
+        return self
+
+    def remove(self, uid):
+        old = self.names.pop(uid, None)
+        if old is None:
+            return
+        for n in set(old):
+            self._unlink(self.exact, n, uid)
+            self._unlink(self.norm, normalize_name(n), uid, sort=True)
+
+
+class NameIndex:
+    def __init__(self, max_candidates=10):
+        self.max_candidates = max_candidates
+        self._guilds = {}
+
+    def _ensure(self, guild):
+        g = self._guilds.get(guild.id)
+        if g is None:
+            g = self._guilds[guild.id] = _GuildNames().build(guild.members)
+        return g
+
+    # ─── 멤버 이벤트 (아직 안 만든 서버는 무시, 처음 찾을 때 만듦) ──────────────
+    def update(self, member):
+        g = self._guilds.get(member.guild.id)
+        if g is not None and g.names.get(member.id) != (member.display_name, member.name):
+            g.add(member.id, member.display_name, member.name)
+
+    def remove(self, guild_id, uid):
+        g = self._guilds.get(guild_id)
+        if g is not None:
+            g.remove(uid)
+
+    def invalidate_guild(self, guild_id):
+        self._guilds.pop(guild_id, None)
+
+    # ─── 찾기: NameMatch (exact 이고 1개면 확정, 아니면 후보) ─────────────────────
+    def lookup(self, guild, query):
+        g = self._ensure(guild)
+        uids = g.exact.get(query)
+        if uids:
+            return NameMatch(sorted(uids), True)
+        q = normalize_name(query)
+        if not q:
+            return NameMatch([], False)
+        uids = g.norm.get(q)
+        if uids:
+            return NameMatch(sorted(uids), True)
+
+        found = set()
+        i = bisect.bisect_left(g.keys, q)
+        while i < len(g.keys) and g.keys[i].startswith(q) and len(found) <= self.max_candidates:
+            found |= g.norm[g.keys[i]]
+            i += 1
+        if not found:
+            for key in difflib.get_close_matches(q, g.keys, n=self.max_candidates, cutoff=0.75):
+                found |= g.norm[key]
+        return NameMatch(sorted(found)[:self.max_candidates + 1], False)
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# 멤버 지연 불러오기 (LAZY_MEMBERS=1 — 시작할 때 서버 전체 멤버를 받지 않음)
+#  - 명단에 들어온 사람만 Member 를 가져와 서버마다 LRU 로 보관 (maxsize)
+#  - 요청은 window 초 동안 모아서 query_members(user_ids=…) 100명씩 한 번 (실패하면 fetch_member)
+#  - 없는 사람(나간 멤버)은 miss_ttl 초 동안 다시 묻지 않음, 가져온 멤버는 ttl 초 뒤 다시 가져옴
+# ────────────────────────────────────────────────────────────────────────────────
+
+QUERY_BATCH = 100
+
+
+class MemberFetcher:
+    def __init__(self, maxsize=2000, window=0.05, ttl=600.0, miss_ttl=300.0):
+        self.maxsize = maxsize
+        self.window = window
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self._guilds = {}       # guild id → OrderedDict(uid → (Member, 가져온 시각))
+        self._missing = {}      # (guild id, uid) → 다시 물어볼 시각
+        self._waiting = {}      # guild id → {uid: Future}
+        self._tasks = {}
+        self.on_fetch = None    # Member → None, 게이트웨이에서 새로 받아 올 때마다 (다른 인덱스 갱신용)
+        self.stats = {"hits": 0, "fetched": 0, "queries": 0, "missing": 0, "fallbacks": 0, "evictions": 0}
+
+    # ─── 캐시 ─────────────────────────────────────────────────────────────
+    def get(self, guild, uid):
+        cache = self._guilds.get(guild.id)
+        hit = cache.get(uid) if cache is not None else None
+        if hit is not None:
+            cache.move_to_end(uid)
+            return hit[0]
+        return guild.get_member(uid)
+
+    def _fresh(self, guild_id, uid, now):
+        cache = self._guilds.get(guild_id)
+        hit = cache.get(uid) if cache is not None else None
+        if hit is not None and now - hit[1] < self.ttl:
+            return True
+        return self._missing.get((guild_id, uid), 0) > now
+
+    def put(self, member, now=None):
+        cache = self._guilds.setdefault(member.guild.id, OrderedDict())
+        cache[member.id] = (member, now or time.monotonic())
+        cache.move_to_end(member.id)
+        self._missing.pop((member.guild.id, member.id), None)
+        if len(cache) > self.maxsize:
+            cache.popitem(last=False)
+            self.stats["evictions"] += 1
+        return member
+
+    def evict(self, guild_id, uid):
+        cache = self._guilds.get(guild_id)
+        if cache is not None:
+            cache.pop(uid, None)
+
+    def size(self):
+        return sum(len(c) for c in self._guilds.values())
+
+    # ─── 가져오기 (모아서) ────────────────────────────────────────────────
+    async def fetch(self, guild, uid):
+        member = self.get(guild, uid)
+        if member is not None:
+            self.stats["hits"] += 1
+            return member
+        if self._missing.get((guild.id, uid), 0) > time.monotonic():
+            return None
+        return await self._request(guild, [uid])[0]
+
+    async def ensure(self, guild, uids):
+        # 캐시에 없거나 오래된 uid 만 한 번에 (렌더링 전에 부름)
+        if guild is None:
+            return 0
+        now = time.monotonic()
+        need = [uid for uid in uids if not self._fresh(guild.id, uid, now)]
+        if need:
+            await asyncio.gather(*self._request(guild, need))
+        return len(need)
+
+    def _request(self, guild, uids):
+        loop = asyncio.get_running_loop()
+        waiting = self._waiting.setdefault(guild.id, {})
+        futs = []
+        for uid in uids:
+            fut = waiting.get(uid)
+            if fut is None:
+                fut = waiting[uid] = loop.create_future()
+            futs.append(fut)
+        task = self._tasks.get(guild.id)
+        if task is None or task.done():
+            self._tasks[guild.id] = loop.create_task(self._flusher(guild))
+        return futs
+
+    async def _flusher(self, guild):
+        await asyncio.sleep(self.window)
+        while self._waiting.get(guild.id):
+            waiting = self._waiting.pop(guild.id)
+            uids = list(waiting)
+            found = {}
+            for i in range(0, len(uids), QUERY_BATCH):
+                found.update(await self._query(guild, uids[i:i + QUERY_BATCH]))
+            now = time.monotonic()
+            for uid, fut in waiting.items():
+                member = found.get(uid)
+                if member is not None:
+                    self._got(member, now)
+                    self.stats["fetched"] += 1
+                else:
+                    self._missing[(guild.id, uid)] = now + self.miss_ttl
+                    self.stats["missing"] += 1
+                if not fut.done():
+                    fut.set_result(member)
+
+    async def _query(self, guild, uids):
+        self.stats["queries"] += 1
+        try:
+            members = await guild.query_members(user_ids=uids, limit=len(uids), cache=False)
+            return {m.id: m for m in members}
+        except Exception:
+            # 게이트웨이 요청이 안 되면 REST 로 한 명씩
+            logging.getLogger(__name__).warning("query_members 실패 guild=%s → fetch_member", guild.id, exc_info=True)
+        found = {}
+        for uid in uids:
+            self.stats["fallbacks"] += 1
+            try:
+                found[uid] = await guild.fetch_member(uid)
+            except Exception:
+                pass
+        return found
+
+    async def search(self, guild, query, limit=10):
+        # 이름 앞부분으로 찾기 (명령어 멤버 찾기에서 캐시에 없을 때)
+        self.stats["queries"] += 1
+        try:
+            members = await guild.query_members(query=query, limit=limit, cache=False)
+        except Exception:
+            logging.getLogger(__name__).warning("query_members(query) 실패 guild=%s", guild.id, exc_info=True)
+            return []
+        return [self._got(m) for m in members]
+
+    def _got(self, member, now=None):
+        # 지연 모드에선 on_member_update 가 안 옴 → 다시 가져온 이름/역할을 여기서 알림
+        self.put(member, now)
+        if self.on_fetch is not None:
+            try:
+                self.on_fetch(member)
+            except Exception:
+                logging.getLogger(__name__).exception("on_fetch 실패 uid=%s", member.id)
+        return member
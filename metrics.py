@@ -0,0 +1,235 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# 지표(metrics) / 로그 설정
+#  - Counter / Gauge / Histogram 을 이름+라벨로 모아 두고 Prometheus 텍스트 형식으로 내보냄
+#  - METRICS_PORT 가 있으면 aiohttp 로 http://127.0.0.1:<port>/metrics
+#  - METRICS_FILE 이 있으면 METRICS_INTERVAL 초마다 같은 내용을 파일로 (임시 파일 → 교체)
+#  - 로그는 LOG_LEVEL, LOG_FORMAT=json 이면 한 줄 JSON
+# ────────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _fmt_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help="", fn=None, label=None):
+        # fn: 내보낼 때 불러서 값을 받음 (다른 곳에서 세는 값). label 이 있으면 {라벨 값: 값}
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.label = label
+        self._lock = threading.Lock()   # 저장소 커밋 스레드에서도 기록하므로
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def _values(self):
+        values = dict(self.values)
+        if self.fn is not None:
+            got = self.fn()
+            if self.label:
+                values.update({((self.label, k),): v for k, v in got.items()})
+            else:
+                values[()] = got
+        return values
+
+
+class Counter(_Metric):
+    # 늘기만 하는 값 (fn 으로 받을 때도 누적 값이어야 함 — 줄어드는 값은 Gauge)
+    kind = "counter"
+
+    def __init__(self, name, help="", fn=None, label=None):
+        super().__init__(name, help, fn, label)
+        self.values = {}
+
+    def inc(self, n=1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + n
+
+    def samples(self):
+        return [f"{self.name}{_fmt_labels(k)} {v}" for k, v in sorted(self._values().items())]
+
+
+class Gauge(_Metric):
+    # 오르내리는 값 (큐 길이 같은 것)
+    kind = "gauge"
+
+    def __init__(self, name, help="", fn=None, label=None):
+        super().__init__(name, help, fn, label)
+        self.values = {}
+
+    def set(self, v, **labels):
+        self.values[_labels(labels)] = v
+
+    def samples(self):
+        return [f"{self.name}{_fmt_labels(k)} {v}" for k, v in sorted(self._values().items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help="", buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(buckets)
+        self.values = {}    # 라벨 → [버킷별 개수..., 합계, 개수]
+
+    def observe(self, v, **labels):
+        key = _labels(labels)
+        i = bisect.bisect_left(self.buckets, v)
+        with self._lock:
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                row[i] += 1
+            row[-2] += v
+            row[-1] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def samples(self):
+        out = []
+        for key, row in sorted(self.values.items()):
+            acc = 0
+            for b, n in zip(self.buckets, row):
+                acc += n
+                out.append(f"{self.name}_bucket{_fmt_labels(key, [('le', b)])} {acc}")
+            out.append(f"{self.name}_bucket{_fmt_labels(key, [('le', '+Inf')])} {row[-1]}")
+            out.append(f"{self.name}_sum{_fmt_labels(key)} {row[-2]:.6f}")
+            out.append(f"{self.name}_count{_fmt_labels(key)} {row[-1]}")
+        return out
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "t0")
+
+    def __init__(self, hist, labels):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0, **self.labels)
+
+
+class Registry:
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self._metrics = {}
+
+    def _get(self, cls, name, *args, **kw):
+        name = self.prefix + name
+        m = self._metrics.get(name)
+        if m is None:
+            m = self._metrics[name] = cls(name, *args, **kw)
+        return m
+
+    def counter(self, name, help="", fn=None, label=None):
+        return self._get(Counter, name, help, fn=fn, label=label)
+
+    def gauge(self, name, help="", fn=None, label=None):
+        return self._get(Gauge, name, help, fn=fn, label=label)
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def render(self):
+        lines = []
+        for m in self._metrics.values():
+            try:
+                samples = m.samples()
+            except Exception:
+                logging.getLogger(__name__).exception("metric %s 수집 실패", m.name)
+                continue
+            lines.extend(m.header())
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    # ─── 내보내기 ─────────────────────────────────────────────────────────
+    async def serve(self, host="127.0.0.1", port=9108):
+        from aiohttp import web
+
+        async def handler(request):
+            return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handler)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        logging.getLogger(__name__).info("지표 서버: http://%s:%s/metrics", host, port)
+        return runner
+
+    async def dump_forever(self, path, interval=30.0):
+        while True:
+            await asyncio.sleep(interval)
+            text = self.render()
+            try:
+                await asyncio.to_thread(_write_atomic, path, text)
+            except OSError:
+                logging.getLogger(__name__).exception("metrics 파일 쓰기 실패")
+
+
+def _write_atomic(path, text):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+# ─── 로그 ─────────────────────────────────────────────────────────────────
+class JsonFormatter(logging.Formatter):
+    # extra={"gid": ..} 로 넘긴 값도 같이 기록
+    SKIP = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record):
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k, v in vars(record).items():
+            if k not in self.SKIP:
+                out[k] = v
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+def configure_logging(level=None, fmt=None):
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = fmt or os.getenv("LOG_FORMAT", "text")
+    handler = logging.StreamHandler()
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
@@ -0,0 +1,284 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# 발로란트 닉네임 저장소 (uid → Riot ID)
+#  - 등록/수정/삭제는 그 한 줄만 SQLite 에 upsert/delete (스레드에서, 여러 건은 한 트랜잭션)
+#  - Riot ID → uid 역인덱스로 중복 등록 확인
+#  - 사람이 보는 valo_nicknames_view.json 은 바뀐 뒤 VIEW_DELAY 초 모아서 한 번만 생성
+#  - 예전 valo_nicknames.json 은 처음 한 번만 가져옴
+#  - 여러 프로세스가 같은 파일을 쓰면 seq(변경 번호) 이후 바뀐 줄만 주기적으로 읽어 옴
+# ────────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from indexes import normalize_name
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT);
+CREATE TABLE IF NOT EXISTS nicknames (uid TEXT PRIMARY KEY, riot_id TEXT NOT NULL, seq INTEGER NOT NULL DEFAULT 0);
+"""
+
+# 삭제는 riot_id 를 비운 줄로 남김 (다른 프로세스가 seq 로 알아챌 수 있게)
+UPSERT = "INSERT OR REPLACE INTO nicknames VALUES (?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM nicknames))"
+
+
+class NicknameStore:
+    def __init__(self, path, legacy_json=None, view_path=None, view_delay=30.0):
+        self.path = path
+        self.legacy_json = legacy_json
+        self.view_path = view_path
+        self.view_delay = view_delay
+        self.resolve_name = None    # uid(int) → 표시 이름 (없으면 None), 뷰 만들 때 사용
+        self.on_change = None       # 닉네임이 바뀐 uid(str) 를 받는 콜백 (명단 줄 캐시 비우기)
+        self._conn = None
+        self._lock = threading.Lock()
+        self._nicks = {}            # uid(str) → Riot ID
+        self._owners = {}           # 정규화 Riot ID → {uid(str)}
+        self._pending = {}          # uid(str) → Riot ID (None 이면 삭제)
+        self._seq = 0               # 마지막으로 읽은 변경 번호
+        self._written = {}          # uid(str) → 내가 쓴 줄의 seq (동기화로 되돌아오면 건너뜀)
+        self._task = None
+        self._view_task = None
+        self.stats = {"commits": 0, "rows": 0, "errors": 0, "views": 0}
+
+    # ─── 연결 / 불러오기 ──────────────────────────────────────────────────
+    def connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript(SCHEMA)
+            cols = {r[1] for r in self._conn.execute("PRAGMA table_info(nicknames)")}
+            if "seq" not in cols:
+                self._conn.execute("ALTER TABLE nicknames ADD COLUMN seq INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS nicknames_seq ON nicknames (seq)")
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def load(self):
+        conn = self.connect()
+        with self._lock:
+            migrated = conn.execute("SELECT v FROM meta WHERE k='migrated_nicknames'").fetchone()
+        if not migrated:
+            self._migrate_json()
+        with self._lock:
+            rows = conn.execute("SELECT uid, riot_id, seq FROM nicknames").fetchall()
+        self._nicks = {}
+        self._owners = {}
+        self._seq = 0
+        self._written = {}
+        self._apply(rows)
+        return self
+
+    def _apply(self, rows):
+        for uid, riot_id, seq in rows:
+            self._seq = max(self._seq, seq)
+            if uid in self._pending:
+                continue    # 아직 안 쓴 내 변경이 우선
+            if self._written.pop(uid, None) == seq:
+                continue    # 내가 쓴 줄 — 이미 반영됨
+            if riot_id:
+                self._link(uid, riot_id)
+            else:
+                self._unlink(uid)
+
+    # ─── 다른 프로세스 변경 읽어 오기 ───────────────────────────────────────
+    def _changes(self, since):
+        conn = self.connect()
+        with self._lock:
+            return conn.execute("SELECT uid, riot_id, seq FROM nicknames WHERE seq > ? ORDER BY seq", (since,)).fetchall()
+
+    async def refresh(self):
+        rows = await asyncio.to_thread(self._changes, self._seq)
+        self._apply(rows)
+        return len(rows)
+
+    async def sync_forever(self, interval=1.0):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logging.exception("[닉네임] 동기화 실패")
+            await asyncio.sleep(interval)
+
+    def _migrate_json(self):
+        legacy = {}
+        if self.legacy_json and os.path.exists(self.legacy_json):
+            with open(self.legacy_json, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+        ops = [(UPSERT, (str(u), n)) for u, n in legacy.items() if n]
+        ops.append(("INSERT OR REPLACE INTO meta VALUES ('migrated_nicknames', ?)", (self.legacy_json or "",)))
+        self._commit(ops)
+        if legacy:
+            logging.info(f"[닉네임] {self.legacy_json} → {self.path} 이전 완료 ({len(legacy)}명)")
+
+    # ─── 역인덱스 ─────────────────────────────────────────────────────────
+    def _link(self, uid, riot_id):
+        self._drop(uid)
+        self._nicks[uid] = riot_id
+        self._owners.setdefault(normalize_name(riot_id), set()).add(uid)
+        if self.on_change is not None:
+            self.on_change(uid)
+
+    def _unlink(self, uid):
+        old = self._drop(uid)
+        if old is not None and self.on_change is not None:
+            self.on_change(uid)
+        return old
+
+    def _drop(self, uid):
+        # 인덱스에서만 뺌 (알림은 부르는 쪽에서 한 번)
+        old = self._nicks.pop(uid, None)
+        if old is None:
+            return None
+        key = normalize_name(old)
+        owners = self._owners.get(key)
+        if owners:
+            owners.discard(uid)
+            if not owners:
+                del self._owners[key]
+        return old
+
+    # ─── 조회 (dict 처럼) ─────────────────────────────────────────────────
+    def get(self, uid, default=None):
+        return self._nicks.get(str(uid), default)
+
+    def __contains__(self, uid):
+        return str(uid) in self._nicks
+
+    def __getitem__(self, uid):
+        return self._nicks[str(uid)]
+
+    def __len__(self):
+        return len(self._nicks)
+
+    def items(self):
+        return self._nicks.items()
+
+    def owners(self, riot_id):
+        # 같은 Riot ID 를 쓰는 uid 들 (대소문자·전각 무시)
+        return set(self._owners.get(normalize_name(riot_id), ()))
+
+    def owner_conflict(self, uid, riot_id):
+        # 다른 사람이 이미 쓰고 있으면 그 uid, 아니면 None
+        others = self.owners(riot_id) - {str(uid)}
+        return min(others) if others else None
+
+    # ─── 변경 ─────────────────────────────────────────────────────────────
+    def set(self, uid, riot_id):
+        uid = str(uid)
+        if self._nicks.get(uid) == riot_id:
+            return
+        self._link(uid, riot_id)
+        self._queue(uid, riot_id)
+
+    def delete(self, uid):
+        uid = str(uid)
+        old = self._unlink(uid)
+        if old is not None:
+            self._queue(uid, None)
+        return old
+
+    __setitem__ = set
+
+    def _queue(self, uid, riot_id):
+        self._pending[uid] = riot_id
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self.flush_sync()
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._flusher())
+        if self.view_path and (self._view_task is None or self._view_task.done()):
+            self._view_task = loop.create_task(self._view_later())
+
+    # ─── 쓰기 (스레드에서 한 트랜잭션) ─────────────────────────────────────
+    def _ops(self, pending):
+        ops = []
+        for uid, riot_id in pending.items():
+            ops.append((UPSERT, (uid, riot_id or "")))
+        return ops
+
+    def _commit(self, ops):
+        if not ops:
+            return
+        conn = self.connect()
+        written = {}
+        with self._lock:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for sql, args in ops:
+                    conn.execute(sql, args)
+                    if sql is UPSERT:
+                        written[args[0]] = conn.execute("SELECT seq FROM nicknames WHERE uid=?", (args[0],)).fetchone()[0]
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                self.stats["errors"] += 1
+                raise
+            # 잠금 안에서 기록 — 동기화가 이 줄을 먼저 읽어 가지 않게
+            self._written.update(written)
+        self.stats["commits"] += 1
+        self.stats["rows"] += len(ops)
+
+    async def _flusher(self):
+        while self._pending:
+            pending, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(self._commit, self._ops(pending))
+            except Exception:
+                logging.exception("[닉네임] 커밋 실패")
+                # 그 사이 들어온 새 값이 우선
+                self._pending = {**pending, **self._pending}
+                await asyncio.sleep(1)
+
+    def flush_sync(self):
+        if self._pending:
+            pending, self._pending = self._pending, {}
+            self._commit(self._ops(pending))
+
+    async def drain(self):
+        if self._task is not None and not self._task.done():
+            await self._task
+        self.flush_sync()
+        if self._view_task is not None and not self._view_task.done():
+            self._view_task.cancel()
+            await self.write_view()
+
+    # ─── 보기용 파일 (모아서 한 번) ─────────────────────────────────────────
+    async def _view_later(self):
+        await asyncio.sleep(self.view_delay)
+        await self.write_view()
+
+    def _view(self):
+        view = {}
+        for uid_str, nick in self._nicks.items():
+            name = None
+            if self.resolve_name is not None:
+                try: name = self.resolve_name(int(uid_str))
+                except ValueError: pass
+            view[name or f"알수없음(ID:{uid_str})"] = nick
+        return view
+
+    async def write_view(self):
+        if not self.view_path:
+            return
+        # 이름 찾기는 루프에서, 파일 쓰기는 스레드에서
+        view = self._view()
+        await asyncio.to_thread(self._write_view, view)
+
+    def _write_view(self, view):
+        tmp = self.view_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(view, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.view_path)
+        self.stats["views"] += 1
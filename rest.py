@@ -0,0 +1,217 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# 나가는 Discord REST 요청 스케줄러
+#  - 우선순위: 명단 수정 > 공지(맵/파티코드) > 리액션 정리 > 잠깐 뜨는 안내
+#  - route 별 버킷 (같은 채널에 같은 종류 요청은 최소 간격 유지, 429 오면 그만큼 쉼)
+#  - key 가 같은 요청이 아직 대기 중이면 새 요청으로 덮어씀 (지난 edit 은 보낼 필요 없음)
+#  - 안내는 deadline 이 지나면 보내지 않고 버림
+#  - 끝낼 때는 close() — 작업자를 멈추고 보내는 중인 요청이 끝나기를 기다림, 남은 job 은 버림
+# ────────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import Counter
+
+import discord
+
+ROSTER, ANNOUNCE, CLEANUP, NOTICE = 0, 1, 2, 3
+PRIORITY_NAMES = {ROSTER: "roster", ANNOUNCE: "announce", CLEANUP: "cleanup", NOTICE: "notice"}
+
+# route 종류별 최소 간격(초) — Discord 채널 단위 제한보다 살짝 느리게
+ROUTE_INTERVALS = {
+    "edit": 0.2,
+    "send": 0.2,
+    "delete": 0.2,
+    "reaction": 0.25,
+    "fetch": 0.0,
+}
+
+
+class _Job:
+    __slots__ = ("priority", "route", "factory", "key", "deadline", "future", "tries")
+
+    def __init__(self, priority, route, factory, key, deadline, future):
+        self.priority = priority
+        self.route = route
+        self.factory = factory
+        self.key = key
+        self.deadline = deadline
+        self.future = future
+        self.tries = 0
+
+
+class RestScheduler:
+    def __init__(self, max_inflight=4, notice_backlog=30, max_tries=3):
+        self.max_inflight = max_inflight
+        self.notice_backlog = notice_backlog
+        self.max_tries = max_tries
+        self._heap = []
+        self._seq = itertools.count()
+        self._keyed = {}        # key -> 대기 중 job
+        self._next_ok = {}      # route -> 다음 요청 가능 시각 (monotonic)
+        self._busy = set()      # 지금 요청 중인 route (route 당 하나씩)
+        self._inflight = 0
+        self._wakeup = None
+        self._task = None
+        self._running = set()   # 보내는 중인 _run 태스크
+        self._closed = False
+        self.stats = Counter()
+        self.observe = None     # (종류, 우선순위 이름, 걸린 초, 결과) 를 받는 콜백 (지표용)
+
+    # ─── 넣기 ─────────────────────────────────────────────────────────────
+    def submit(self, priority, route, factory, key=None, ttl=None):
+        # factory: 인자 없이 코루틴을 만드는 함수 (재시도 때 다시 부름)
+        # 반환: 결과 Future (버려지면 None)
+        loop = asyncio.get_running_loop()
+        if self._closed:
+            fut = loop.create_future()
+            fut.set_result(None)
+            return fut
+        if key is not None and key in self._keyed:
+            job = self._keyed[key]
+            job.factory = factory
+            self.stats["superseded"] += 1
+            return job.future
+        if priority == NOTICE and self.queued(NOTICE) >= self.notice_backlog:
+            self.stats["dropped"] += 1
+            fut = loop.create_future()
+            fut.set_result(None)
+            return fut
+        deadline = time.monotonic() + ttl if ttl is not None else None
+        job = _Job(priority, route, factory, key, deadline, loop.create_future())
+        if key is not None:
+            self._keyed[key] = job
+        self._push(job)
+        self.stats["queued"] += 1
+        self._ensure_worker()
+        return job.future
+
+    def _push(self, job):
+        heapq.heappush(self._heap, (job.priority, next(self._seq), job))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _ensure_worker(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._worker())
+
+    def queued(self, priority=None):
+        if priority is None:
+            return len(self._heap)
+        return sum(1 for p, _, _ in self._heap if p == priority)
+
+    def snapshot(self):
+        out = dict(self.stats)
+        out["inflight"] = self._inflight
+        for p, name in PRIORITY_NAMES.items():
+            out[f"queue_{name}"] = self.queued(p)
+        return out
+
+    # ─── 꺼내기 ───────────────────────────────────────────────────────────
+    def _take(self, now):
+        # 우선순위 순으로, route 가 비어 있는 첫 job. 없으면 (None, 가장 빠른 대기 시간)
+        skipped = []
+        found = None
+        wait = None
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            job = item[2]
+            if job.deadline is not None and now > job.deadline:
+                self._finish(job, None)
+                self.stats["dropped"] += 1
+                continue
+            if job.route in self._busy:
+                skipped.append(item)
+                continue
+            ready_at = self._next_ok.get(job.route, 0)
+            if ready_at > now:
+                skipped.append(item)
+                wait = ready_at - now if wait is None else min(wait, ready_at - now)
+                continue
+            found = job
+            break
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+        return found, wait
+
+    def _finish(self, job, result=None, exc=None):
+        if job.key is not None and self._keyed.get(job.key) is job:
+            del self._keyed[job.key]
+        if not job.future.done():
+            if exc is not None:
+                job.future.set_exception(exc)
+                job.future.exception()   # 아무도 await 안 해도 경고 안 뜨게
+            else:
+                job.future.set_result(result)
+
+    async def _worker(self):
+        # wait_for 는 깨어나는 순간 들어온 취소를 삼킬 수 있음 (3.11) → asyncio.timeout, 취소는 그대로 올려 보냄
+        while not self._closed:
+            if self._inflight >= self.max_inflight:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            job, wait = self._take(time.monotonic())
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    async with asyncio.timeout(wait):
+                        await self._wakeup.wait()
+                except TimeoutError:
+                    pass
+                continue
+            # 보내기 시작하면 더 이상 덮어쓰기 대상 아님
+            if job.key is not None and self._keyed.get(job.key) is job:
+                del self._keyed[job.key]
+            self._busy.add(job.route)
+            self._inflight += 1
+            task = asyncio.get_running_loop().create_task(self._run(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def close(self):
+        self._closed = True
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        await asyncio.gather(*([self._task] if self._task else []), *self._running, return_exceptions=True)
+        while self._heap:
+            self._finish(heapq.heappop(self._heap)[2], None)
+
+    async def _run(self, job):
+        kind = job.route[0] if isinstance(job.route, tuple) else job.route
+        t0 = time.monotonic()
+        outcome = "ok"
+        try:
+            job.tries += 1
+            result = await job.factory()
+        except discord.HTTPException as e:
+            outcome = "rate_limited" if e.status == 429 else "error"
+            if e.status == 429 and job.tries < self.max_tries:
+                self.stats["rate_limited"] += 1
+                self._next_ok[job.route] = time.monotonic() + (getattr(e, "retry_after", None) or 1.0)
+                self._push(job)
+            else:
+                if e.status == 429:
+                    self.stats["rate_limited"] += 1
+                self.stats["failed"] += 1
+                self._finish(job, exc=e)
+        except Exception as e:
+            outcome = "error"
+            self.stats["failed"] += 1
+            logging.debug("REST 요청 실패: %s %r", job.route, e)
+            self._finish(job, exc=e)
+        else:
+            self.stats["sent"] += 1
+            self.stats[f"sent_{PRIORITY_NAMES.get(job.priority, job.priority)}"] += 1
+            self._finish(job, result)
+        finally:
+            if self.observe is not None:
+                self.observe(kind, PRIORITY_NAMES.get(job.priority, job.priority), time.monotonic() - t0, outcome)
+            self._busy.discard(job.route)
+            self._next_ok[job.route] = max(self._next_ok.get(job.route, 0),
+                                           time.monotonic() + ROUTE_INTERVALS.get(kind, 0.0))
+            self._inflight -= 1
+            self._wakeup.set()
@@ -0,0 +1,464 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# 참가자/대기자/판수 명단
+#  - 참가자: dict 기반 순서 있는 집합 (포함/삭제/끝 pop O(1))
+#  - 대기자: deque + 지연 삭제 (앞/뒤 O(1), 중간 삭제 O(1), 위치 조회는 캐시된 인덱스)
+#  - rounds_left 키는 항상 int
+#  - 대기열에서 누구를 올릴지는 정책(policy)이 정함: 기본은 줄 선 순서(FifoPolicy),
+#    PriorityPolicy 는 구독 단계·기다린 시간·이미 한 판 수로 점수 매긴 힙 (넣기/올리기 O(log n))
+#  - 바꾸는 메서드마다 version 이 오르고, snapshot() 은 그 버전의 읽기 전용 사본 (버전이 같으면 재사용)
+#    → 렌더링/백업/저장은 스냅샷만 읽음 (바꾸는 쪽은 길드 액터 하나)
+# JSON 으로는 예전과 같은 {"participants": [...], "waitlist": [...], "rounds_left": {...}} 모양
+# ────────────────────────────────────────────────────────────────────────────────
+
+import functools
+import heapq
+import time
+from collections import deque, namedtuple
+from types import MappingProxyType
+
+INF = float("inf")
+
+# waitlist 는 올라갈 순서, rounds_left 는 읽기 전용 dict
+RosterSnapshot = namedtuple("RosterSnapshot", "version participants waitlist rounds_left")
+
+
+def _mutates(fn):
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kw):
+        self.version += 1
+        return fn(self, *args, **kw)
+    return wrapper
+
+
+class Participants:
+    def __init__(self, uids=()):
+        self._d = dict.fromkeys(uids)
+
+    def __contains__(self, uid):
+        return uid in self._d
+
+    def __iter__(self):
+        return iter(self._d)
+
+    def __len__(self):
+        return len(self._d)
+
+    def __bool__(self):
+        return bool(self._d)
+
+    def append(self, uid):
+        self._d[uid] = None
+
+    def remove(self, uid):
+        del self._d[uid]
+
+    def pop(self):
+        uid = next(reversed(self._d))
+        del self._d[uid]
+        return uid
+
+    def clear(self):
+        self._d.clear()
+
+
+class Waitlist:
+    def __init__(self, uids=()):
+        self._dq = deque()
+        self._live = {}      # uid -> 현재 유효한 토큰 (deque 안의 옛 항목은 건너뜀)
+        self._seq = 0
+        self._index = None   # uid -> 0부터 시작하는 위치 (변경되면 버림)
+        self.listener = None # 새로 들어온 uid 를 받는 콜백 (우선순위 정책용)
+        for uid in uids:
+            self.append(uid)
+
+    def _token(self):
+        self._seq += 1
+        return self._seq
+
+    def _alive(self, item):
+        return self._live.get(item[1]) == item[0]
+
+    def _changed(self):
+        self._index = None
+        if len(self._dq) > 2 * len(self._live) + 32:
+            self._dq = deque(item for item in self._dq if self._alive(item))
+
+    def __contains__(self, uid):
+        return uid in self._live
+
+    def __len__(self):
+        return len(self._live)
+
+    def __bool__(self):
+        return bool(self._live)
+
+    def __iter__(self):
+        for item in self._dq:
+            if self._alive(item):
+                yield item[1]
+
+    def append(self, uid):
+        if uid in self._live:
+            return
+        t = self._token()
+        self._dq.append((t, uid))
+        self._live[uid] = t
+        self._changed()
+        if self.listener is not None:
+            self.listener(uid)
+
+    def appendleft(self, uid):
+        if uid in self._live:
+            return
+        t = self._token()
+        self._dq.appendleft((t, uid))
+        self._live[uid] = t
+        self._changed()
+        if self.listener is not None:
+            self.listener(uid)
+
+    def popleft(self):
+        while not self._alive(self._dq[0]):
+            self._dq.popleft()
+        _, uid = self._dq.popleft()
+        del self._live[uid]
+        self._changed()
+        return uid
+
+    def pop(self):
+        while not self._alive(self._dq[-1]):
+            self._dq.pop()
+        _, uid = self._dq.pop()
+        del self._live[uid]
+        self._changed()
+        return uid
+
+    def remove(self, uid):
+        if uid not in self._live:
+            raise ValueError(uid)
+        del self._live[uid]
+        self._changed()
+
+    def index(self, uid):
+        if self._index is None:
+            self._index = {u: i for i, u in enumerate(self)}
+        return self._index[uid]
+
+    def insert(self, pos, uid):
+        # 중간 삽입은 관리자 명령(!대기열)에서만 → 한 번 다시 깔아도 충분
+        items = [u for u in self if u != uid]
+        items.insert(pos, uid)
+        self.clear()
+        for u in items:
+            self.append(u)
+
+    def clear(self):
+        self._dq.clear()
+        self._live.clear()
+        self._index = None
+
+
+# ─── 대기열 정책 ───────────────────────────────────────────────────────────
+class FifoPolicy:
+    # 줄 선 순서 그대로 (관리자가 !대기열 로 순서를 바꿀 수 있음)
+    movable = True
+
+    def attach(self, roster):
+        pass
+
+    def next(self, roster):
+        return roster.waitlist.popleft()
+
+    def order(self, roster):
+        return iter(roster.waitlist)
+
+    def position(self, roster, uid):
+        return roster.waitlist.index(uid) + 1
+
+    def added(self, uid):
+        pass
+
+    def refresh(self, uid):
+        pass
+
+    def forget(self, uid):
+        pass
+
+    def clear(self):
+        pass
+
+
+class PriorityPolicy:
+    # 점수 = 구독 단계 × w_tier + 기다린 분 × w_wait − 이미 한 판 수 × w_played (클수록 먼저, 같으면 먼저 온 사람)
+    # 기다린 시간은 모두에게 똑같이 늘어나므로 넣을 때 한 번 계산한 값으로 순서가 유지됨
+    # 힙 항목은 지연 무효화: 대기열에서 빠졌거나 점수가 바뀌어 새로 넣은 항목이 있으면 건너뜀
+    movable = False
+
+    def __init__(self, w_tier=1.0, w_wait=0.1, w_played=1.0, fixed_tier=4, clock=time.time):
+        self.w_tier = w_tier
+        self.w_wait = w_wait
+        self.w_played = w_played
+        self.fixed_tier = fixed_tier     # ❤️(고정, inf) 은 이 단계로 침
+        self.clock = clock
+        self.roster = None
+        self._heap = []                  # (-점수, 순번, uid) — uid 의 마지막 순번만 유효
+        self._ver = {}                   # uid → 유효한 힙 항목의 순번
+        self._since = {}                 # uid → 대기열에 들어온 시각 (자리 옮김으로는 안 바뀜)
+        self._seq = 0
+
+    def attach(self, roster):
+        self.roster = roster
+        for uid in roster.waitlist:
+            self.added(uid)
+
+    def score(self, uid):
+        r = self.roster
+        tier = r.rounds_left.get(uid, 0)
+        if tier == INF:
+            tier = self.fixed_tier
+        return self.w_tier * tier - self.w_wait * self._since[uid] / 60 - self.w_played * r.played.get(uid, 0)
+
+    def _push(self, uid):
+        self._seq += 1
+        self._ver[uid] = self._seq
+        heapq.heappush(self._heap, (-self.score(uid), self._seq, uid))
+        if len(self._heap) > 2 * len(self.roster.waitlist) + 32:
+            self._heap = [e for e in self._heap if self._valid(e)]
+            heapq.heapify(self._heap)
+
+    def _valid(self, e):
+        return e[2] in self.roster.waitlist and self._ver.get(e[2]) == e[1]
+
+    def added(self, uid):
+        self._since.setdefault(uid, self.clock())
+        self._push(uid)
+
+    def refresh(self, uid):
+        # 판수(구독 단계)가 바뀐 대기자
+        if uid in self.roster.waitlist:
+            self._push(uid)
+
+    def next(self, roster):
+        while self._heap:
+            e = heapq.heappop(self._heap)
+            if self._valid(e):
+                roster.waitlist.remove(e[2])
+                return e[2]
+        return roster.waitlist.popleft()
+
+    def order(self, roster):
+        return (e[2] for e in sorted(e for e in self._heap if self._valid(e)))
+
+    def position(self, roster, uid):
+        for i, u in enumerate(self.order(roster), 1):
+            if u == uid:
+                return i
+        raise ValueError(uid)
+
+    def forget(self, uid):
+        self._since.pop(uid, None)
+        self._ver.pop(uid, None)
+
+    def clear(self):
+        self._heap.clear()
+        self._ver.clear()
+        self._since.clear()
+
+
+class Roster:
+    # 새 명단에 붙일 정책 (god.py 에서 WAITLIST_POLICY 로 바꿈)
+    policy_factory = FifoPolicy
+
+    def __init__(self, participants=(), waitlist=(), rounds_left=None, policy=None):
+        self.participants = Participants(participants)
+        self.waitlist = Waitlist(waitlist)
+        self.rounds_left = {int(u): v for u, v in (rounds_left or {}).items()}
+        self.played = {}     # uid → 로테이션 때 참가자였던 횟수 (메모리에만)
+        self.version = 0
+        self._snap = None
+        self.policy = policy or self.policy_factory()
+        self.policy.attach(self)
+        self.waitlist.listener = self.policy.added
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d.get("participants") or (), d.get("waitlist") or (), d.get("rounds_left"))
+
+    def snapshot(self):
+        snap = self._snap
+        if snap is None or snap.version != self.version:
+            snap = self._snap = RosterSnapshot(self.version, tuple(self.participants), tuple(self.order()),
+                                               MappingProxyType(dict(self.rounds_left)))
+        return snap
+
+    def to_dict(self):
+        snap = self.snapshot()
+        return {
+            "participants": list(snap.participants),
+            "waitlist": list(snap.waitlist),
+            "rounds_left": dict(snap.rounds_left),
+        }
+
+    def copy(self):
+        return Roster(self.participants, self.waitlist, self.rounds_left)
+
+    def __contains__(self, uid):
+        return uid in self.participants or uid in self.waitlist
+
+    # ─── 참가 / 삭제 ──────────────────────────────────────────────────────
+    @_mutates
+    def join(self, uid, rounds, limit):
+        # 이미 명단에 있으면 판수만 바꿈. 들어간 쪽 이름을 돌려줌
+        self.rounds_left[uid] = rounds
+        if uid in self.participants:
+            return "participants"
+        if uid in self.waitlist:
+            self.policy.refresh(uid)
+            return "waitlist"
+        if len(self.participants) < limit:
+            self.participants.append(uid)
+            return "participants"
+        self.waitlist.append(uid)
+        return "waitlist"
+
+    @_mutates
+    def remove(self, uid):
+        if uid in self.participants:
+            self.participants.remove(uid)
+        elif uid in self.waitlist:
+            self.waitlist.remove(uid)
+        else:
+            return False
+        self.rounds_left.pop(uid, None)
+        self.policy.forget(uid)
+        return True
+
+    @_mutates
+    def clear(self):
+        self.participants.clear()
+        self.waitlist.clear()
+        self.rounds_left.clear()
+        self.played.clear()
+        self.policy.clear()
+
+    def order(self):
+        # 대기열을 올라갈 순서대로
+        return self.policy.order(self)
+
+    def set_rounds(self, uid, rounds):
+        self.version += 1
+        self.rounds_left[uid] = rounds
+        self.policy.refresh(uid)
+
+    def force_join(self, uid, rounds=1):
+        # 인원 제한 없이 참가자로 (대기열에 있었으면 빼서)
+        self.version += 1
+        if uid in self.waitlist:
+            self.waitlist.remove(uid)
+            self.policy.forget(uid)
+        self.participants.append(uid)
+        self.rounds_left[uid] = rounds
+
+    # ─── 인원 조정 ────────────────────────────────────────────────────────
+    @_mutates
+    def fill(self, limit, skip=None):
+        # 대기열 앞에서부터 빈자리 채움 (skip 은 제자리에 두고 건너뜀)
+        pos = None
+        if skip is not None and skip in self.waitlist and len(self.participants) < limit:
+            pos = self.waitlist.index(skip)
+            self.waitlist.remove(skip)
+        promoted = []
+        while len(self.participants) < limit and self.waitlist:
+            uid = self.policy.next(self)
+            self.policy.forget(uid)
+            self.participants.append(uid)
+            promoted.append(uid)
+        if pos is not None:
+            # skip 은 대기열을 떠난 게 아님 → forget 안 함 (insert 가 다시 append 하며 들어온 시각은 그대로 힙에 넣음)
+            self.waitlist.insert(pos - min(pos, len(promoted)), skip)
+        return promoted
+
+    @_mutates
+    def resize(self, limit):
+        while len(self.participants) > limit:
+            self.waitlist.appendleft(self.participants.pop())
+        self.fill(limit)
+
+    @_mutates
+    def promote(self, uid, limit):
+        # 대기자 → 참가자. 자리가 없으면 마지막 참가자를 대기열 맨 앞으로 보내고 그 uid 를 돌려줌
+        self.waitlist.remove(uid)
+        self.policy.forget(uid)
+        bumped = None
+        if len(self.participants) >= limit:
+            bumped = self.participants.pop()
+            self.waitlist.appendleft(bumped)
+        self.participants.append(uid)
+        self.rounds_left.setdefault(uid, 1)
+        return bumped
+
+    @_mutates
+    def demote(self, uid, pos=0):
+        self.participants.remove(uid)
+        if pos <= 0:
+            self.waitlist.appendleft(uid)
+        else:
+            self.waitlist.insert(pos, uid)
+
+    def position(self, uid):
+        # 대기열 1번부터 시작하는 순번 (올라갈 순서 기준)
+        return self.policy.position(self, uid)
+
+    @_mutates
+    def move(self, uid, pos):
+        self.waitlist.insert(max(0, min(pos, len(self.waitlist) - 1)), uid)
+
+    @_mutates
+    def rotate(self, limit):
+        # 판수 남은 사람만 남기고 (1판 남았던 사람은 빠짐) 대기열 앞에서 채움
+        rl = self.rounds_left
+        stay = []
+        for uid in self.participants:
+            self.played[uid] = self.played.get(uid, 0) + 1
+            left = rl.get(uid, 0)
+            if left == INF or left > 1:
+                if left > 1:
+                    rl[uid] = left - 1
+                stay.append(uid)
+        self.participants = Participants(stay)
+        return self.fill(limit)
+
+    # ─── 되돌리기용 변경분 ────────────────────────────────────────────────
+    # 로테이션 한 번이 바꾸는 것은 참가자(최대 limit 명), 대기열 앞에서 올라온 사람, 참가자 판수뿐
+    # → 대기열 전체를 복사하지 않고 이것만 남김 (O(바뀐 것))
+    def rotate_undoable(self, limit):
+        before = list(self.participants)
+        rounds = {uid: self.rounds_left.get(uid) for uid in before}
+        promoted = self.rotate(limit)
+        return promoted, {"participants": before, "promoted": promoted, "rounds": rounds}
+
+    @_mutates
+    def undo_rotation(self, undo):
+        # 로테이션 직전 참가자로 되돌리고, 그 뒤에 참가자가 된 사람은 대기열 맨 앞으로
+        # (올라왔던 사람 먼저, 그다음 나중에 들어온 사람)
+        old = list(undo["participants"])
+        old_set = set(old)
+        front = [u for u in undo["promoted"] if u not in old_set and u in self]
+        front_set = set(front)
+        front += [u for u in self.participants if u not in old_set and u not in front_set]
+        for u in old + front:
+            if u in self.waitlist:
+                self.waitlist.remove(u)
+                self.policy.forget(u)
+        for u in reversed(front):
+            self.waitlist.appendleft(u)
+        self.participants = Participants(old)
+        for u in old:
+            if self.played.get(u):
+                self.played[u] -= 1
+        for uid, v in undo["rounds"].items():
+            if v is None:
+                self.rounds_left.pop(int(uid), None)
+            else:
+                self.rounds_left[int(uid)] = v
+
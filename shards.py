@@ -0,0 +1,97 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# 샤딩 / 여러 프로세스 실행
+#  - SHARD_COUNT: 전체 샤드 수, SHARD_IDS: 이 프로세스가 맡는 샤드 ("0,2")
+#  - 서버(guild) 주인은 Discord 와 같은 공식: (guild_id >> 22) % SHARD_COUNT
+#  - WORKERS=N (또는 python god.py --workers N) 이면 샤드를 N 개 프로세스에 나눠서 띄움
+#  - 상태는 같은 SQLite(WAL) 파일을 같이 쓰고, 서버별 데이터는 주인 프로세스만 읽고 씀
+# ────────────────────────────────────────────────────────────────────────────────
+
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+
+def shard_of(guild_id, count):
+    return (int(guild_id) >> 22) % count
+
+
+class ShardConfig:
+    def __init__(self, count=1, ids=None, worker=0):
+        self.count = count
+        self.ids = sorted(ids) if ids is not None else None    # None 이면 전부
+        self.worker = worker
+
+    @classmethod
+    def from_env(cls):
+        count = int(os.getenv("SHARD_COUNT", "1"))
+        raw = os.getenv("SHARD_IDS", "").strip()
+        ids = [int(x) for x in raw.split(",") if x.strip()] if raw else None
+        return cls(count, ids, int(os.getenv("WORKER_INDEX", "0")))
+
+    @property
+    def sharded(self):
+        return self.count > 1
+
+    @property
+    def primary(self):
+        # 서버와 무관한 일(보기용 파일 등)은 첫 번째 프로세스만
+        return self.worker == 0
+
+    def owns(self, guild_id):
+        if self.ids is None:
+            return True
+        return shard_of(guild_id, self.count) in self.ids
+
+    def __repr__(self):
+        return f"ShardConfig(count={self.count}, ids={self.ids}, worker={self.worker})"
+
+
+def assign(shard_count, workers):
+    # 샤드를 프로세스에 돌아가며 배정: 4샤드 2프로세스 → [0,2], [1,3]
+    return [list(range(w, shard_count, workers)) for w in range(workers)]
+
+
+def worker_env(shard_count, shard_ids, worker, base=None):
+    env = dict(os.environ if base is None else base)
+    env.pop("WORKERS", None)
+    env["SHARD_COUNT"] = str(shard_count)
+    env["SHARD_IDS"] = ",".join(map(str, shard_ids))
+    env["WORKER_INDEX"] = str(worker)
+    return env
+
+
+def launch(argv, workers, shard_count=None):
+    # 자식 프로세스를 띄우고 기다림. 하나라도 죽으면 나머지도 정리
+    shard_count = shard_count or workers
+    procs = []
+    for w, ids in enumerate(assign(shard_count, workers)):
+        logging.info(f"[샤딩] worker {w}: shards {ids}/{shard_count}")
+        procs.append(subprocess.Popen(argv, env=worker_env(shard_count, ids, w)))
+
+    def stop(*_):
+        for p in procs:
+            if p.poll() is None:
+                p.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        while all(p.poll() is None for p in procs):
+            time.sleep(1)
+    finally:
+        stop()
+    return max(abs(p.wait()) for p in procs)
+
+
+def main_or_launch(run):
+    # WORKERS / --workers 가 있으면 자식들을 띄우고, 아니면 이 프로세스에서 run()
+    workers = int(os.getenv("WORKERS", "1"))
+    if "--workers" in sys.argv:
+        workers = int(sys.argv[sys.argv.index("--workers") + 1])
+    if workers > 1:
+        count = int(os.getenv("SHARD_COUNT", str(workers)))
+        sys.exit(launch([sys.executable, os.path.abspath(sys.argv[0])], workers, count))
+    run()
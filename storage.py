@@ -0,0 +1,310 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# GUILD_DATA 저장소 (SQLite WAL)
+#  - 바뀐 항목(메타 키 / 명단 사람 / 판수)만 기록
+#  - 명단 행은 uid 가 키, 순서는 ord 값 → 대기열 앞에서 빼고 넣어도 다른 사람 행은 그대로
+#  - 커밋은 스레드에서 한 트랜잭션으로 → 이벤트 루프 안 막고, 중간에 죽어도 파일 안 깨짐
+#  - 예전 session_data.json 은 처음 한 번만 가져옴
+#  - 여러 프로세스가 같은 파일을 쓸 때는 owns(gid) 가 참인 서버만 읽고 씀
+# ────────────────────────────────────────────────────────────────────────────────
+
+import asyncio
+import bisect
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+ROSTER_KEYS = ("participants", "waitlist")
+ROUNDS_KEY = "rounds_left"
+ORD_GAP = 1 << 20       # 새로 매기는 순서 값 간격 (사이에 끼워 넣을 자리)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT);
+CREATE TABLE IF NOT EXISTS guild_meta (gid TEXT, k TEXT, v TEXT, PRIMARY KEY (gid, k));
+CREATE TABLE IF NOT EXISTS lineup (gid TEXT, uid INTEGER, kind TEXT, ord INTEGER, PRIMARY KEY (gid, uid));
+CREATE TABLE IF NOT EXISTS rounds_left (gid TEXT, uid INTEGER, v REAL, PRIMARY KEY (gid, uid));
+"""
+
+
+def _num(v):
+    # REAL 로 읽힌 3.0 → 3 (inf 는 그대로)
+    if isinstance(v, float) and math.isfinite(v) and v.is_integer():
+        return int(v)
+    return v
+
+
+def _snapshot(data):
+    # 메모리에서는 data["roster"] (Roster), 예전 JSON 에서는 리스트 세 개
+    roster = data.get("roster")
+    src = roster.to_dict() if roster is not None else data
+    meta = {k: json.dumps(v, ensure_ascii=False) for k, v in data.items()
+            if k not in ROSTER_KEYS and k != ROUNDS_KEY and k != "roster"}
+    lists = {k: tuple(src.get(k) or ()) for k in ROSTER_KEYS}
+    rl = {int(u): v for u, v in (src.get(ROUNDS_KEY) or {}).items()}
+    return meta, lists, rl
+
+
+def _lis(pairs):
+    # [(자리, ord)] → ord 가 늘어나는 가장 긴 부분열의 자리 집합
+    tails, tail_at, parent = [], [], [None] * len(pairs)
+    for j, (_, o) in enumerate(pairs):
+        k = bisect.bisect_left(tails, o)
+        if k == len(tails):
+            tails.append(o)
+            tail_at.append(j)
+        else:
+            tails[k] = o
+            tail_at[k] = j
+        parent[j] = tail_at[k - 1] if k else None
+    keep = set()
+    j = tail_at[-1] if tail_at else None
+    while j is not None:
+        keep.add(pairs[j][0])
+        j = parent[j]
+    return keep
+
+
+def _order(new, old):
+    # new: uid 목록, old: {uid: ord} (같은 목록에 있던 것) → {uid: ord}
+    # 순서가 그대로인 가장 긴 부분은 ord 를 유지하고, 나머지만 앞뒤 사이 값으로
+    keep = _lis([(i, old[u]) for i, u in enumerate(new) if u in old])
+    out = {}
+    lo = None
+    i, n = 0, len(new)
+    while i < n:
+        if i in keep:
+            lo = out[new[i]] = old[new[i]]
+            i += 1
+            continue
+        j = i
+        while j < n and j not in keep:
+            j += 1
+        hi = old[new[j]] if j < n else None
+        k = j - i
+        if lo is None and hi is None:
+            vals = [ORD_GAP * (m + 1) for m in range(k)]
+        elif lo is None:
+            vals = [hi - ORD_GAP * (k - m) for m in range(k)]
+        elif hi is None:
+            vals = [lo + ORD_GAP * (m + 1) for m in range(k)]
+        elif hi - lo > k:
+            vals = [lo + (hi - lo) * (m + 1) // (k + 1) for m in range(k)]
+        else:
+            # 사이에 자리가 없음 → 전부 다시 매김 (드묾)
+            return {u: ORD_GAP * (m + 1) for m, u in enumerate(new)}
+        out.update(zip(new[i:j], vals))
+        i = j
+    return out
+
+
+def _upgrade(conn):
+    # 예전 roster 표 (자리 번호가 키) → lineup 으로 한 번 옮김
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='roster'").fetchone():
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='roster'").fetchone():
+            conn.execute("INSERT OR IGNORE INTO lineup SELECT gid, uid, kind, (pos + 1) * ? FROM roster "
+                         "ORDER BY gid, kind, pos", (ORD_GAP,))
+            conn.execute("DROP TABLE roster")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+class GuildStore:
+    def __init__(self, path, legacy_json=None, owns=None):
+        self.path = path
+        self.legacy_json = legacy_json
+        self.owns = owns          # gid → 이 프로세스 담당 여부 (None 이면 전부)
+        self._conn = None
+        self._lock = threading.Lock()
+        self._saved = {}       # gid -> 마지막으로 커밋한 (meta, lists, ords, rl), ords: {uid: (kind, ord)}
+        self._removing = set()  # 지우는 중인 서버 (커밋 실패하면 다음에 다시 지움)
+        self._dirty = None
+        self._task = None
+        self.loaded = False
+        self.stats = {"commits": 0, "rows": 0, "bytes": 0, "errors": 0}
+        self.on_commit = None     # (걸린 초, 행 수) 를 받는 콜백 (지표용, 커밋 스레드에서 불림)
+
+    # ─── 연결 ─────────────────────────────────────────────────────────────
+    def connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript(SCHEMA)
+            _upgrade(self._conn)
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ─── 불러오기 ─────────────────────────────────────────────────────────
+    def load(self):
+        conn = self.connect()
+        with self._lock:
+            migrated = conn.execute("SELECT v FROM meta WHERE k='migrated_json'").fetchone()
+        if not migrated:
+            self._migrate_json()
+
+        out = {}
+        ords = {}
+        with self._lock:
+            for gid, k, v in conn.execute("SELECT gid, k, v FROM guild_meta"):
+                out.setdefault(gid, {})[k] = json.loads(v)
+            for gid in list(out):
+                for kind in ROSTER_KEYS:
+                    out[gid][kind] = []
+                out[gid][ROUNDS_KEY] = {}
+            for gid, uid, kind, o in conn.execute("SELECT gid, uid, kind, ord FROM lineup ORDER BY gid, kind, ord"):
+                out.setdefault(gid, {}).setdefault(kind, []).append(uid)
+                ords.setdefault(gid, {})[uid] = (kind, o)
+            for gid, uid, v in conn.execute("SELECT gid, uid, v FROM rounds_left"):
+                out.setdefault(gid, {}).setdefault(ROUNDS_KEY, {})[uid] = _num(v)
+        if self.owns is not None:
+            out = {gid: data for gid, data in out.items() if self.owns(gid)}
+        self._saved = {}
+        for gid, data in out.items():
+            meta, lists, rl = _snapshot(data)
+            self._saved[gid] = (meta, lists, ords.get(gid, {}), rl)
+        self.loaded = True
+        return out
+
+    def _migrate_json(self):
+        legacy = {}
+        if self.legacy_json and os.path.exists(self.legacy_json):
+            with open(self.legacy_json, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+        self._saved = {}
+        # 예전 파일은 모든 서버 것 — 담당과 상관없이 한 번에 옮김
+        owns, self.owns = self.owns, None
+        try:
+            ops = self._diff(legacy)
+        finally:
+            self.owns = owns
+        ops.append(("INSERT OR REPLACE INTO meta VALUES ('migrated_json', ?)", (self.legacy_json or "",)))
+        # 샤드 작업자들이 동시에 시작해도 한 곳만 옮김 (나머지는 트랜잭션 안에서 표시를 보고 그만둠)
+        if not self._commit(ops, once="migrated_json"):
+            self._saved = {}
+            return
+        if legacy:
+            logging.info(f"[저장소] {self.legacy_json} → {self.path} 이전 완료 ({len(legacy)}개 서버)")
+
+    # ─── 변경분 계산 (이벤트 루프에서, 쓰기는 안 함) ──────────────────────────
+    def _diff(self, guild_data):
+        ops = []
+        self._removing |= {gid for gid in self._saved if gid not in guild_data}
+        self._removing -= guild_data.keys()
+        for gid in self._removing:
+            for table in ("guild_meta", "lineup", "rounds_left"):
+                ops.append((f"DELETE FROM {table} WHERE gid=?", (gid,)))
+            self._saved.pop(gid, None)
+
+        for gid, data in guild_data.items():
+            if self.owns is not None and not self.owns(gid):
+                # 다른 프로세스 담당 서버 — 그쪽 행을 덮어쓰지 않음
+                continue
+            meta, lists, rl = _snapshot(data)
+            if gid not in self._saved:
+                # 처음 쓰는 서버(또는 실패 후 재기록)는 남은 행부터 정리
+                for table in ("guild_meta", "lineup", "rounds_left"):
+                    ops.append((f"DELETE FROM {table} WHERE gid=?", (gid,)))
+            old_meta, old_lists, old_ords, old_rl = self._saved.get(gid, ({}, {}, {}, {}))
+
+            for k, v in meta.items():
+                if old_meta.get(k) != v:
+                    ops.append(("INSERT OR REPLACE INTO guild_meta VALUES (?,?,?)", (gid, k, v)))
+            for k in old_meta.keys() - meta.keys():
+                ops.append(("DELETE FROM guild_meta WHERE gid=? AND k=?", (gid, k)))
+
+            ords = old_ords
+            if lists != old_lists:
+                ords = {}
+                for kind in ROSTER_KEYS:
+                    prev = {u: o for u, (k, o) in old_ords.items() if k == kind}
+                    for uid, o in _order(lists[kind], prev).items():
+                        ords.setdefault(uid, (kind, o))    # 두 목록에 다 있으면 (예전 JSON) 참가자 쪽
+                for uid, v in ords.items():
+                    if old_ords.get(uid) != v:
+                        ops.append(("INSERT OR REPLACE INTO lineup VALUES (?,?,?,?)", (gid, uid, *v)))
+                for uid in old_ords.keys() - ords.keys():
+                    ops.append(("DELETE FROM lineup WHERE gid=? AND uid=?", (gid, uid)))
+
+            for uid, v in rl.items():
+                if old_rl.get(uid) != v:
+                    ops.append(("INSERT OR REPLACE INTO rounds_left VALUES (?,?,?)", (gid, uid, v)))
+            for uid in old_rl.keys() - rl.keys():
+                ops.append(("DELETE FROM rounds_left WHERE gid=? AND uid=?", (gid, uid)))
+
+            self._saved[gid] = (meta, lists, ords, rl)
+        return ops
+
+    def _commit(self, ops, once=None):
+        # once: meta 키 — 같은 트랜잭션 안에서 이미 있으면 아무것도 안 쓰고 False
+        if not ops:
+            return True
+        conn = self.connect()
+        t0 = time.perf_counter()
+        with self._lock:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                if once and conn.execute("SELECT 1 FROM meta WHERE k=?", (once,)).fetchone():
+                    conn.execute("ROLLBACK")
+                    return False
+                for sql, args in ops:
+                    conn.execute(sql, args)
+                conn.execute("COMMIT")
+                self._removing.clear()
+            except Exception:
+                conn.execute("ROLLBACK")
+                # 어디까지 반영됐는지 모르니 다음 저장 때 전부 다시 씀 (지우던 서버는 _removing 에 남음)
+                self._saved = {}
+                self.stats["errors"] += 1
+                raise
+        self.stats["commits"] += 1
+        self.stats["rows"] += len(ops)
+        self.stats["bytes"] += sum(len(str(a).encode("utf-8")) for _, args in ops for a in args)
+        if self.on_commit is not None:
+            self.on_commit(time.perf_counter() - t0, len(ops))
+        return True
+
+    # ─── 저장 (여러 번 불려도 한 번에 묶어서 커밋) ──────────────────────────────
+    def save(self, guild_data):
+        self._dirty = guild_data
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self.flush_sync()
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._flusher())
+
+    async def _flusher(self):
+        while self._dirty is not None:
+            guild_data, self._dirty = self._dirty, None
+            ops = self._diff(guild_data)
+            try:
+                await asyncio.to_thread(self._commit, ops)
+            except Exception:
+                logging.exception("[저장소] 커밋 실패")
+                if self._dirty is None:
+                    self._dirty = guild_data
+                await asyncio.sleep(1)
+
+    def flush_sync(self):
+        if self._dirty is not None:
+            guild_data, self._dirty = self._dirty, None
+            self._commit(self._diff(guild_data))
+
+    async def drain(self):
+        if self._task is not None and not self._task.done():
+            await self._task
+        self.flush_sync()
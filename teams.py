@@ -0,0 +1,101 @@
+# ────────────────────────────────────────────────────────────────────────────────
+# 팀 나누기 (티어 가중치 합 차이가 가장 작은 2팀)
+#  - 파티(같이 하는 사람들)는 한 덩어리로 → 덩어리 단위로 나눔
+#  - 인원 수 c 별로 "만들 수 있는 가중치 합" 을 int 비트셋으로 DP: 덩어리 k 개 × c 단계 비트 연산
+#    (2^n 조합을 다 보지 않음 — 10명 ~ 수십 명 로비도 1ms 안팎)
+#  - 같은 명단(uid·가중치·파티)이면 결과를 캐시에서
+# ────────────────────────────────────────────────────────────────────────────────
+
+from collections import OrderedDict, namedtuple
+
+Split = namedtuple("Split", "team_a team_b sum_a sum_b")
+
+CACHE_MAX = 256
+_cache = OrderedDict()
+stats = {"hits": 0, "misses": 0}
+
+
+def _units(weights, parties):
+    # 파티 → 덩어리 (명단에 없는 사람은 빼고, 한 사람이 두 파티면 먼저 나온 쪽)
+    seen = set()
+    units = []
+    for party in parties:
+        members = tuple(uid for uid in party if uid in weights and uid not in seen)
+        if members:
+            seen.update(members)
+            units.append(members)
+    units += [(uid,) for uid in weights if uid not in seen]
+    return units
+
+
+def _solve(units, unit_w):
+    n = sum(len(u) for u in units)
+    total = sum(unit_w)
+    half = n // 2
+    # reach[c]: 덩어리 일부로 c 명을 골랐을 때 가능한 합 (비트 s = 합 s)
+    reach = [0] * (half + 1)
+    reach[0] = 1
+    history = []
+    for unit, w in zip(units, unit_w):
+        history.append(reach[:])
+        k = len(unit)
+        for c in range(half, k - 1, -1):
+            if reach[c - k]:
+                reach[c] |= reach[c - k] << w
+    # 인원이 맞는 쪽(파티 때문에 안 되면 가장 가까운 인원)에서 합이 total/2 에 가장 가까운 것
+    best = None
+    for c in range(half, -1, -1):
+        bits = reach[c]
+        if not bits:
+            continue
+        s = _closest(bits, total / 2)
+        key = (n - 2 * c, abs(total - 2 * s))
+        if best is None or key < best[0]:
+            best = (key, c, s)
+    _, c, s = best
+    # 역추적: 이 덩어리 없이도 (c, s) 가 되면 안 고른 것
+    picked = []
+    for i in range(len(units) - 1, -1, -1):
+        before = history[i]
+        if before[c] >> s & 1:
+            continue
+        picked.append(i)
+        c -= len(units[i])
+        s -= unit_w[i]
+    return set(picked)
+
+
+def _closest(bits, target):
+    # target 이하에서 가장 큰 합, 이상에서 가장 작은 합 중 가까운 쪽
+    t = int(target)
+    low = bits & ((1 << (t + 1)) - 1)
+    lo = low.bit_length() - 1 if low else None
+    high = bits >> (t + 1)
+    hi = t + 1 + ((high & -high).bit_length() - 1) if high else None
+    if lo is None:
+        return hi
+    if hi is None or target - lo <= hi - target:
+        return lo
+    return hi
+
+
+def split_teams(weights, parties=()):
+    # weights: {uid: 가중치(int)}, parties: [[uid, ...], ...] → Split (A팀이 합이 크거나 같음)
+    key = (tuple(sorted(weights.items())), tuple(tuple(sorted(p)) for p in parties))
+    hit = _cache.get(key)
+    if hit is not None:
+        _cache.move_to_end(key)
+        stats["hits"] += 1
+        return hit
+    stats["misses"] += 1
+    units = _units(weights, parties)
+    unit_w = [sum(weights[uid] for uid in u) for u in units]
+    picked = _solve(units, unit_w) if units else set()
+    a = tuple(uid for i, u in enumerate(units) if i in picked for uid in u)
+    b = tuple(uid for i, u in enumerate(units) if i not in picked for uid in u)
+    sa, sb = sum(weights[u] for u in a), sum(weights[u] for u in b)
+    result = Split(a, b, sa, sb) if sa >= sb else Split(b, a, sb, sa)
+    _cache[key] = result
+    if len(_cache) > CACHE_MAX:
+        _cache.popitem(last=False)
+    return result